@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tours.instrumentation.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,8 +73,16 @@ TEMPLATES = [
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'tours.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Upper bound for ?page_size= on list endpoints
+API_MAX_PAGE_SIZE = 500
+
+# Upper bound on the number of items in one bulk write (POST <list>/bulk/)
+BULK_MAX_ITEMS = 1000
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Tour Operator API',
     'DESCRIPTION': 'API for managing tours and clients',
@@ -89,10 +99,32 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'tours', 'db.sqlite3'),
+        # A file rather than SQLite's in-memory default, so tests can use
+        # several connections at once (concurrent booking tests).
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'tour_operator_test.sqlite3')},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Report responses are keyed on per-model change counters (see tours/cache.py).
+# LocMem is per process: use a shared backend such as Redis or Memcached when
+# running several workers, so a write seen by one worker invalidates all.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tour-operator',
+    }
+}
+
+REPORT_CACHE_TIMEOUT = 60 * 60
+
+# Tour search facets are cached for a filter combination from its n-th request on
+SEARCH_FACET_CACHE_MIN_HITS = 2
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -111,15 +143,24 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Queries slower than the threshold are logged as JSON (view, normalised SQL,
+# duration) to tours.slow_sql, for the given fraction of them. Query counts and
+# DB time of every request go to the Server-Timing header instead of logging
+# each statement.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_SAMPLE_RATE = 1.0
+
 LOGGING = {
     'version': 1,
+    'disable_existing_loggers': False,
     'handlers': {
         'console': {'class': 'logging.StreamHandler'},
     },
     'loggers': {
-        'django.db.backends': {
-            'level': 'DEBUG',
+        'tours.slow_sql': {
+            'level': 'WARNING',
             'handlers': ['console'],
+            'propagate': False,
         }
     }
 }
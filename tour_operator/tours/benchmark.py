@@ -0,0 +1,485 @@
+# tours/benchmark.py
+import asyncio
+import random
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from wsgiref.util import setup_testing_defaults
+
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min
+from django.test import Client as HttpClient
+from django.urls import URLPattern
+
+from .bulk import explicit_auto_dates
+from .capacity import recount_seats
+from .cotravel import rebuild_co_travellers
+from .models import (
+    Booking, BookingsVisa, ChinaCity, ChinaRegion, ChineseGuide, Client, ClientSummary, CoTraveller, Employee,
+    Excursion, Festival, Hotel, HotelOccupancy, Insurance, Payment, Review, Tour, TourAgency, TourExcursion,
+    TourFestival, TourHotel, TourRegion, TourSimilarity, TourStats, TourToAgency, TourTransport, TransportProvider,
+    Visa, VisaType,
+)
+from .occupancy import rebuild_occupancy
+from .recommend import rebuild_recommendations
+from .summary import rebuild_summaries
+from .tourstats import rebuild_tour_stats
+
+
+# Rows per table at scale factor 1; scale factor 100 gives 10^6 bookings.
+# Reference tables marked False keep their size at every scale.
+BASE_ROWS = {
+    ChinaRegion: (12, False),
+    ChinaCity: (60, False),
+    VisaType: (6, False),
+    TransportProvider: (20, False),
+    Insurance: (10, False),
+    TourAgency: (25, False),
+    Festival: (40, False),
+    Hotel: (150, True),
+    Excursion: (200, True),
+    ChineseGuide: (100, True),
+    Employee: (50, True),
+    Client: (2000, True),
+    Tour: (200, True),
+    Visa: (1500, True),
+    Booking: (10000, True),
+    Payment: (15000, True),
+    Review: (3000, True),
+    BookingsVisa: (1000, True),
+    TourExcursion: (600, True),
+    TourFestival: (100, True),
+    TourHotel: (400, True),
+    TourRegion: (300, True),
+    TourToAgency: (200, True),
+    TourTransport: (400, True),
+}
+
+BATCH_SIZE = 2000
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+TOUR_THEMES = ['History', 'Nature', 'Food', 'Culture', 'Adventure', 'Wellness']
+TOUR_CATEGORIES = ['Adventure', 'Cultural', 'VIP', 'Family']
+SEASONS = ['High', 'Low', 'Shoulder']
+LANGUAGES = ['Russian', 'English', 'Chinese']
+
+
+def row_counts(scale):
+    return {
+        model: max(1, round(rows * scale)) if scales else rows
+        for model, (rows, scales) in BASE_ROWS.items()
+    }
+
+
+def _bulk_insert(model, objects):
+    """``bulk_create`` from a generator, one batch in memory at a time."""
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def _id_range(model):
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    return bounds['low'], bounds['high']
+
+
+def _pairs(rng, left, right, count):
+    """``count`` distinct (left id, right id) pairs, for unique-together tables."""
+    (left_low, left_high), (right_low, right_high) = left, right
+    right_size = right_high - right_low + 1
+    per_left = max(1, min(right_size, -(-count // (left_high - left_low + 1))))
+    made = 0
+    for left_id in range(left_low, left_high + 1):
+        for right_id in rng.sample(range(right_low, right_high + 1), per_left):
+            if made == count:
+                return
+            yield left_id, right_id
+            made += 1
+
+
+def seed(scale=1.0, random_seed=0):
+    """
+    Fill empty tours tables with ``row_counts(scale)`` rows of synthetic data.
+
+    Rows are generated and inserted batch by batch, so memory stays flat at
+    any scale; the tables must be empty since foreign keys are drawn from
+    contiguous primary-key ranges. Returns the row count per model.
+    """
+    rng = random.Random(random_seed)
+    counts = row_counts(scale)
+
+    def moment(days=730):
+        return EPOCH + timedelta(seconds=rng.randrange(days * 86400))
+
+    def money(low, high):
+        return Decimal(rng.randrange(low * 100, high * 100)) / 100
+
+    with transaction.atomic(), explicit_auto_dates(Client, Booking):
+        _bulk_insert(ChinaRegion, (
+            ChinaRegion(name=f'Region {n}', description='') for n in range(counts[ChinaRegion])
+        ))
+        regions = _id_range(ChinaRegion)
+        _bulk_insert(ChinaCity, (
+            ChinaCity(name=f'City {n}', region_id=rng.randint(*regions)) for n in range(counts[ChinaCity])
+        ))
+        cities = _id_range(ChinaCity)
+        _bulk_insert(VisaType, (
+            VisaType(name=f'Visa type {n}', processing_days=rng.randint(3, 30), validity_months=rng.choice([3, 6, 12]),
+                     entries_allowed=rng.randint(1, 3), price=money(30, 300))
+            for n in range(counts[VisaType])
+        ))
+        _bulk_insert(TransportProvider, (
+            TransportProvider(name=f'Carrier {n}', contact_person=f'Contact {n}', contact_phone='+860000000',
+                              contact_email=f'carrier{n}@example.com', service_type=rng.choice(['Air', 'Rail', 'Bus']))
+            for n in range(counts[TransportProvider])
+        ))
+        _bulk_insert(Insurance, (
+            Insurance(provider_name=f'Insurer {n}', coverage_description='', price_per_day=money(1, 20))
+            for n in range(counts[Insurance])
+        ))
+        _bulk_insert(TourAgency, (
+            TourAgency(name=f'Agency {n}', comission_percent=money(5, 20), contact_phone='+70000000000',
+                       email=f'agency{n}@example.com', specialization=rng.choice(TOUR_CATEGORIES))
+            for n in range(counts[TourAgency])
+        ))
+        _bulk_insert(Festival, (
+            Festival(name=f'Festival {n}', date_start=(start := moment().date()), date_end=start + timedelta(days=3),
+                     location=f'City {n}', popularity=rng.randint(1, 10), description='')
+            for n in range(counts[Festival])
+        ))
+        _bulk_insert(Hotel, (
+            Hotel(name=f'Hotel {n}', address='', city_id=rng.randint(*cities), star_rating=rng.randint(2, 5),
+                  contact_phone='+860000000', email=f'hotel{n}@example.com')
+            for n in range(counts[Hotel])
+        ))
+        _bulk_insert(Excursion, (
+            Excursion(name=f'Excursion {n}', description='', duration_hours=rng.randint(1, 8),
+                      guide_language=rng.choice(LANGUAGES), price=money(10, 200), location_id=rng.randint(*cities))
+            for n in range(counts[Excursion])
+        ))
+        _bulk_insert(ChineseGuide, (
+            ChineseGuide(first_name=f'Guide{n}', last_name='Bench', languages=rng.choice(LANGUAGES),
+                         city_id=rng.randint(*cities), hourly_rate=money(10, 60))
+            for n in range(counts[ChineseGuide])
+        ))
+        _bulk_insert(Employee, (
+            Employee(first_name=f'Employee{n}', last_name='Bench', position='Agent' if n % 5 else 'Manager',
+                     email=f'employee{n}@example.com', phone='+70000000000', hire_date=moment().date())
+            for n in range(counts[Employee])
+        ))
+        _bulk_insert(Client, (
+            Client(first_name=f'Client{n}', last_name='Bench', email=f'client{n}@example.com', phone='+70000000000',
+                   passport_data=f'{n:010d}', registration_date=moment().date(), preferred_language=rng.choice(LANGUAGES))
+            for n in range(counts[Client])
+        ))
+        _bulk_insert(Tour, (
+            Tour(name=f'Tour {n}', description='', start_date=(start := moment().date()),
+                 end_date=start + timedelta(days=(days := rng.randint(3, 14))), duration_days=days,
+                 max_participants=rng.randint(10, 40), price=money(500, 5000), category=rng.choice(TOUR_CATEGORIES),
+                 season=rng.choice(SEASONS), difficulty_level=rng.randint(1, 5), theme=rng.choice(TOUR_THEMES))
+            for n in range(counts[Tour])
+        ))
+        clients, tours, employees = _id_range(Client), _id_range(Tour), _id_range(Employee)
+        visa_types = _id_range(VisaType)
+
+        _bulk_insert(Visa, (
+            Visa(client_id=rng.randint(*clients), visa_type_id=rng.randint(*visa_types),
+                 status=rng.choice(['Processing', 'Approved', 'Collected']), application_date=moment().date())
+            for _ in range(counts[Visa])
+        ))
+        _bulk_insert(Booking, (
+            Booking(client_id=rng.randint(*clients), tour_id=rng.randint(*tours),
+                    employee_id=rng.randint(*employees) if rng.random() < 0.9 else None, booking_date=moment(),
+                    status=rng.choice(['Pending', 'Confirmed', 'Confirmed', 'Completed', 'Cancelled']),
+                    total_price=money(500, 5000), payment_status=rng.choice(['Unpaid', 'Partial', 'Paid']))
+            for _ in range(counts[Booking])
+        ))
+        bookings, visas = _id_range(Booking), _id_range(Visa)
+        excursions, guides, hotels = _id_range(Excursion), _id_range(ChineseGuide), _id_range(Hotel)
+        festivals, agencies, carriers = _id_range(Festival), _id_range(TourAgency), _id_range(TransportProvider)
+        _bulk_insert(Payment, (
+            Payment(booking_id=rng.randint(*bookings), amount=money(50, 2500), payment_date=moment(),
+                    method=rng.choice(Payment.PAYMENT_METHODS)[0], is_deposit=rng.random() < 0.4)
+            for _ in range(counts[Payment])
+        ))
+        _bulk_insert(Review, (
+            Review(client_id=rng.randint(*clients), tour_id=rng.randint(*tours), rating=rng.randint(1, 5),
+                   comment='', review_date=moment().date(), is_approved=rng.random() < 0.8)
+            for _ in range(counts[Review])
+        ))
+        _bulk_insert(BookingsVisa, (
+            BookingsVisa(booking_id=booking_id, visa_id=visa_id)
+            for booking_id, visa_id in _pairs(rng, bookings, visas, counts[BookingsVisa])
+        ))
+        _bulk_insert(TourExcursion, (
+            TourExcursion(tour_id=rng.randint(*tours), excursion_id=rng.randint(*excursions),
+                          guide_id=rng.randint(*guides), schedule_datetime=moment(),
+                          included_in_price=rng.random() < 0.5)
+            for _ in range(counts[TourExcursion])
+        ))
+        _bulk_insert(TourFestival, (
+            TourFestival(tour_id=tour_id, festival_id=festival_id)
+            for tour_id, festival_id in _pairs(rng, tours, festivals, counts[TourFestival])
+        ))
+        _bulk_insert(TourHotel, (
+            TourHotel(tour_id=rng.randint(*tours), hotel_id=rng.randint(*hotels),
+                      check_in_date=(day := moment().date()), check_out_date=day + timedelta(days=rng.randint(1, 5)),
+                      room_type=rng.choice(TourHotel.ROOM_TYPES)[0], meals_included=rng.choice(TourHotel.MEALS)[0])
+            for _ in range(counts[TourHotel])
+        ))
+        _bulk_insert(TourRegion, (
+            TourRegion(tour_id=tour_id, region_id=region_id, days_spent=rng.randint(1, 5))
+            for tour_id, region_id in _pairs(rng, tours, regions, counts[TourRegion])
+        ))
+        _bulk_insert(TourToAgency, (
+            TourToAgency(tour_id=tour_id, agency_id=agency_id, contract_start_date=moment().date())
+            for tour_id, agency_id in _pairs(rng, tours, agencies, counts[TourToAgency])
+        ))
+        _bulk_insert(TourTransport, (
+            TourTransport(tour_id=rng.randint(*tours), company_id=rng.randint(*carriers),
+                          direction_type=rng.choice(TourTransport.DIRECTION_TYPES)[0],
+                          departure_city_id=rng.randint(*cities), arrival_city_id=rng.randint(*cities),
+                          departure_datetime=(departure := moment()),
+                          arrival_datetime=departure + timedelta(hours=rng.randint(1, 12)))
+            for _ in range(counts[TourTransport])
+        ))
+
+        # bulk_create() maintains neither counters nor rollups, and the
+        # recommendations are a batch job anyway
+        recount_seats(Tour, Booking)
+        rebuild_occupancy(HotelOccupancy, TourHotel)
+        rebuild_co_travellers(CoTraveller, Booking)
+        rebuild_summaries(ClientSummary, Booking, Review)
+        rebuild_tour_stats(TourStats, Booking, Review, TourExcursion)
+        rebuild_recommendations(TourSimilarity, Booking, Review)
+
+    return {model: model.objects.count() for model in counts}
+
+
+# Endpoints that need a query string to answer 200.
+QUERY_STRINGS = {
+    'search/': 'q=tour',
+}
+
+
+def _guide_availability_query():
+    city = _mid_pk(ChinaCity)
+    start = EPOCH + timedelta(days=365)
+    return f'city={city}&start={start:%Y-%m-%dT%H:%MZ}&end={start + timedelta(hours=4):%Y-%m-%dT%H:%MZ}'
+
+
+# Extra actions that need a query string to answer 200, by (prefix, url_path).
+ACTION_QUERIES = {
+    ('guides', 'available'): _guide_availability_query,
+}
+
+
+def _mid_pk(model):
+    pks = model.objects.order_by('pk').values_list('pk', flat=True)
+    count = pks.count()
+    return pks[count // 2] if count else None
+
+
+def endpoints():
+    """
+    Every GET endpoint of tours/urls.py, with a mid-table row for detail
+    routes. The viewsets' extra actions are taken from get_extra_actions().
+    """
+    from .urls import router, urlpatterns
+
+    paths = []
+    for prefix, viewset, _ in router.registry:
+        pk = _mid_pk(viewset.queryset.model)
+        paths.append(f'/api/{prefix}/')
+        if pk is not None:
+            paths.append(f'/api/{prefix}/{pk}/')
+        for action in viewset.get_extra_actions():
+            if 'get' not in action.mapping or (action.detail and pk is None):
+                continue
+            path = f'/api/{prefix}/{pk}/{action.url_path}/' if action.detail else f'/api/{prefix}/{action.url_path}/'
+            query = ACTION_QUERIES.get((prefix, action.url_path))
+            paths.append(path + (f'?{query()}' if query else ''))
+    for pattern in urlpatterns:
+        if isinstance(pattern, URLPattern):
+            query = QUERY_STRINGS.get(str(pattern.pattern))
+            paths.append(f'/api/{pattern.pattern}' + (f'?{query}' if query else ''))
+    return paths
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+
+class _QueryCounter:
+    """
+    Execute wrapper appending each query's SQL to ``queries``. Rather than the
+    query log, since the async views carry the request's wrappers over to the
+    connections they run queries on (see gather_queries()).
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+def run_endpoints(paths, repeat=10, warm=False):
+    """
+    Time ``repeat`` in-process GETs of each path (after one warm-up request).
+
+    Unless ``warm``, the cache is cleared before every request so cached
+    reports are measured computing. Peak Python memory is taken from one
+    extra request under tracemalloc, kept apart from the timed runs.
+    """
+    http = HttpClient()
+    results = []
+    for path in paths:
+        cache.clear()
+        http.get(path)
+
+        timings = []
+        for _ in range(repeat):
+            if not warm:
+                cache.clear()
+            queries = []
+            with connection.execute_wrapper(_QueryCounter(queries)):
+                started = time.perf_counter()
+                response = http.get(path)
+                timings.append(time.perf_counter() - started)
+            query_count = len(queries)
+
+        if not warm:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            http.get(path)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        results.append({
+            'endpoint': path,
+            'status': response.status_code,
+            'queries': query_count,
+            'bytes': len(response.content),
+            'p50_ms': round(_percentile(timings, 0.5) * 1000, 3),
+            'p95_ms': round(_percentile(timings, 0.95) * 1000, 3),
+            'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+            'peak_memory_kb': round(peak / 1024, 1),
+        })
+    return results
+
+
+def _load_result(server, path, statuses, timings, elapsed):
+    return {
+        'server': server,
+        'endpoint': path,
+        # the worst status seen, so a single failure shows
+        'status': max(statuses),
+        'requests_per_sec': round(len(timings) / elapsed, 1),
+        'p50_ms': round(_percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(_percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(timings, 0.99) * 1000, 3),
+    }
+
+
+def run_wsgi_load(path, requests=200, concurrency=16):
+    """
+    Send ``requests`` GETs of ``path`` through the WSGI handler from
+    ``concurrency`` threads at once, as a threaded WSGI server would, and
+    time them. In process: no sockets, so the handler is all that is timed.
+    """
+    from django.core.handlers.wsgi import WSGIHandler
+
+    application = WSGIHandler()
+    path, _, query = path.partition('?')
+
+    def request():
+        environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': 'testserver'}
+        setup_testing_defaults(environ)
+        statuses = []
+        started = time.perf_counter()
+        response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            response.close()  # sends request_finished
+        return int(statuses[0][:3]), time.perf_counter() - started
+
+    def worker(count):
+        try:
+            return [request() for _ in range(count)]
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = [row for rows in pool.map(worker, _shares(requests, concurrency)) for row in rows]
+    elapsed = time.perf_counter() - started
+    return _load_result('wsgi', path, [status for status, _ in results], [took for _, took in results], elapsed)
+
+
+def run_asgi_load(path, requests=200, concurrency=16):
+    """
+    ``run_wsgi_load()`` through the ASGI handler: ``concurrency`` requests
+    in flight at once on one event loop, as an ASGI server would run them.
+    """
+    from django.core.handlers.asgi import ASGIHandler
+
+    application = ASGIHandler()
+    path, _, query = path.partition('?')
+
+    async def request():
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        statuses = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # the client stays connected; Django stops listening once it has answered
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        started = time.perf_counter()
+        await application(scope, receive, send)
+        return statuses[0], time.perf_counter() - started
+
+    async def worker(count):
+        return [await request() for _ in range(count)]
+
+    async def load():
+        return await asyncio.gather(*(worker(count) for count in _shares(requests, concurrency)))
+
+    started = time.perf_counter()
+    # On a thread of its own, as under a server: the event loop must not
+    # inherit this thread's database connections.
+    with ThreadPoolExecutor(1) as pool:
+        results = [row for rows in pool.submit(asyncio.run, load()).result() for row in rows]
+    elapsed = time.perf_counter() - started
+    return _load_result('asgi', path, [status for status, _ in results], [took for _, took in results], elapsed)
+
+
+def _shares(total, parts):
+    """``total`` split into ``parts`` near-equal counts."""
+    return [total // parts + (n < total % parts) for n in range(parts)]
@@ -0,0 +1,235 @@
+# tours/bulk.py
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.validators import UniqueTogetherValidator
+
+from .cache import bump_versions
+
+
+class PrefetchedPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """
+    Resolves the pk against ``context['prefetched'][model]`` when the caller
+    has already loaded the related rows, instead of one query per value.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.get_queryset().model)
+        if prefetched is None:
+            return super().to_internal_value(data)
+
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        key = _pk_value(self.get_queryset().model, data)
+        if key is None:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if key not in prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return prefetched[key]
+
+
+@contextmanager
+def explicit_auto_dates(*models):
+    """
+    Let ``bulk_create()`` keep the values set on ``auto_now`` /
+    ``auto_now_add`` fields of ``models`` instead of stamping the current
+    time, for loading rows that already carry their dates.
+    """
+    saved = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in saved:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _pk_value(model, value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return model._meta.pk.to_python(value)
+    except (DjangoValidationError, TypeError, ValueError):
+        return None
+
+
+class BulkWriteMixin:
+    """
+    ``POST <list>/bulk/`` with a JSON list of objects.
+
+    Items carrying the primary key update that row (partially); the others
+    are created. Related pks are resolved with one ``IN`` query per related
+    model and unique-together sets are checked in one query per constraint.
+    Nothing is written unless every item is valid, in which case the rows
+    are written with ``bulk_create`` / ``bulk_update`` in one transaction.
+    Serializers see ``context['bulk']`` and can leave checks that need a
+    query per item to ``before_bulk_write``, which gets the whole batch;
+    ``after_bulk_write`` sees it written.
+    The error report is a list aligned with the payload, ``{}`` for valid
+    items.
+    """
+    _bulk_serializer_classes = {}
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return Response({'detail': 'Expected a list of objects.'}, status=status.HTTP_400_BAD_REQUEST)
+        max_items = getattr(settings, 'BULK_MAX_ITEMS', 1000)
+        if len(items) > max_items:
+            return Response(
+                {'detail': f'At most {max_items} items can be written in one request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        model = self.get_queryset().model
+        pk_name = model._meta.pk.name
+        errors = [{} for _ in items]
+
+        update_pks = {}
+        for index, item in enumerate(items):
+            if item.get(pk_name) is not None:
+                key = _pk_value(model, item[pk_name])
+                if key is None:
+                    errors[index][pk_name] = ['Incorrect type.']
+                else:
+                    update_pks[index] = key
+        existing = model._default_manager.in_bulk(set(update_pks.values()))
+
+        context = self.get_serializer_context()
+        context['prefetched'] = self._prefetch_related(model, items)
+        context['bulk'] = True
+        serializer_class = self._get_bulk_serializer_class()
+
+        to_create, to_update, update_fields = [], [], set()
+        instances = [None] * len(items)
+        for index, item in enumerate(items):
+            if errors[index]:
+                continue
+            instance = None
+            if index in update_pks:
+                instance = existing.get(update_pks[index])
+                if instance is None:
+                    errors[index][pk_name] = [f'Object with {pk_name}={item[pk_name]} does not exist.']
+                    continue
+
+            serializer = serializer_class(instance, data=item, partial=instance is not None, context=context)
+            serializer.validators = [
+                validator for validator in serializer.validators
+                if not isinstance(validator, UniqueTogetherValidator)
+            ]
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+                continue
+
+            if instance is None:
+                instance = model(**serializer.validated_data)
+                to_create.append(instance)
+            else:
+                for name, value in serializer.validated_data.items():
+                    setattr(instance, name, value)
+                update_fields.update(serializer.validated_data)
+                to_update.append(instance)
+            instances[index] = instance
+
+        self._check_unique_together(model, instances, errors)
+
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                self.before_bulk_write(to_create, to_update)
+                model._default_manager.bulk_create(to_create)
+                if to_update and update_fields:
+                    model._default_manager.bulk_update(to_update, sorted(update_fields))
+                self.after_bulk_write(to_create, to_update)
+                bump_versions(model)
+                transaction.on_commit(lambda: bump_versions(model))
+        except IntegrityError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = self.get_serializer(instances, many=True).data
+        return Response(
+            {'created': len(to_create), 'updated': len(to_update), 'results': data},
+            status=status.HTTP_200_OK
+        )
+
+    def before_bulk_write(self, created, updated):
+        """
+        Hook run in the write transaction before the rows are saved, e.g. to
+        keep counters in step; raising a ValidationError rejects the batch.
+        """
+
+    def after_bulk_write(self, created, updated):
+        """
+        Hook run in the write transaction once the rows are saved, for work
+        that needs their primary keys or auto dates.
+        """
+
+    def _get_bulk_serializer_class(self):
+        serializer_class = self.get_serializer_class()
+        if serializer_class not in self._bulk_serializer_classes:
+            self._bulk_serializer_classes[serializer_class] = type(
+                f'Bulk{serializer_class.__name__}',
+                (serializer_class,),
+                {'serializer_related_field': PrefetchedPrimaryKeyRelatedField}
+            )
+        return self._bulk_serializer_classes[serializer_class]
+
+    @staticmethod
+    def _prefetch_related(model, items):
+        wanted = defaultdict(set)
+        for field in model._meta.concrete_fields:
+            if not field.is_relation:
+                continue
+            related = field.related_model
+            wanted[related]
+            for item in items:
+                key = _pk_value(related, item.get(field.name))
+                if key is not None:
+                    wanted[related].add(key)
+        return {
+            related: related._default_manager.in_bulk(keys)
+            for related, keys in wanted.items()
+        }
+
+    @staticmethod
+    def _check_unique_together(model, instances, errors):
+        for names in model._meta.unique_together:
+            fields = [model._meta.get_field(name) for name in names]
+            attnames = [field.attname for field in fields]
+            message = 'The fields {} must make a unique set.'.format(', '.join(names))
+
+            seen = {}
+            for index, instance in enumerate(instances):
+                if instance is None:
+                    continue
+                key = tuple(getattr(instance, attname) for attname in attnames)
+                if key in seen:
+                    errors[index].setdefault('non_field_errors', []).append(message)
+                else:
+                    seen[key] = index
+            if not seen:
+                continue
+
+            lookup = {
+                f'{attname}__in': {key[position] for key in seen}
+                for position, attname in enumerate(attnames)
+            }
+            for row in model._default_manager.filter(**lookup).values_list('pk', *attnames):
+                index = seen.get(tuple(row[1:]))
+                if index is not None and instances[index].pk != row[0]:
+                    errors[index].setdefault('non_field_errors', []).append(message)
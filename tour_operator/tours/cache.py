@@ -0,0 +1,202 @@
+# tours/cache.py
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+
+VERSION_KEY = 'model-version:{}'
+
+
+def _version_key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def get_versions(models):
+    """
+    Current change counter of each model, in the order given.
+
+    A counter that is missing (first use, or evicted) is seeded from the clock
+    rather than from zero, so it never repeats a value an older cache entry
+    may still be keyed on.
+    """
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns())
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(models):
+    """``get_versions()`` through the cache's async API."""
+    keys = [_version_key(model) for model in models]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns())
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*models):
+    """
+    Mark the given models as changed.
+
+    post_save / post_delete call this for single-row writes; code that writes
+    through ``QuerySet.update()`` or ``bulk_create()`` must call it itself.
+    """
+    for model in models:
+        key = _version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns())
+
+
+def versions_etag(scope, request, versions):
+    """
+    Weak ETag for a response that depends only on the given model versions.
+
+    It covers the view, the path and query string and the negotiated media
+    type, so it can be computed and compared before any query is run.
+    """
+    digest = hashlib.md5(usedforsecurity=False)
+    for part in (scope, request.path, _sorted_query(request),
+                 getattr(request, 'accepted_media_type', '') or ''):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    digest.update('.'.join(str(version) for version in versions).encode('ascii'))
+    return f'W/"{digest.hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(tag.removeprefix('W/') == opaque for tag in parse_etags(header))
+
+
+def not_modified(etag):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = etag
+    return response
+
+
+def _sorted_query(request):
+    return urlencode(sorted(request.GET.lists()), doseq=True)
+
+
+def _report_key(scope, request, versions):
+    query = hashlib.md5(_sorted_query(request).encode('utf-8'), usedforsecurity=False).hexdigest()
+    return 'report:{}:{}:{}'.format(scope, query, '.'.join(str(version) for version in versions))
+
+
+def cached_report(*models):
+    """
+    Cache the data of a report view's ``get`` until one of ``models`` changes.
+
+    The key is made of the view name, the query string and the current
+    version of every model the report reads, so a write to any of them makes
+    the next request miss and recompute. The same versions give the response
+    its ETag, and a matching If-None-Match is answered with 304 straight away.
+    """
+    def decorator(get):
+        @wraps(get)
+        def wrapper(self, request, *args, **kwargs):
+            versions = get_versions(models)
+            etag = versions_etag(type(self).__name__, request, versions)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            key = _report_key(type(self).__name__, request, versions)
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = get(self, request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response.data, getattr(settings, 'REPORT_CACHE_TIMEOUT', 3600))
+
+            if response.status_code == 200:
+                response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
+
+
+def async_cached_report(*models):
+    """
+    ``cached_report()`` for the ``async def get`` of a plain Django view: the
+    rendered body is cached, and a matching If-None-Match is answered with
+    304 the same way. The cache is used through its async API, so a
+    network backend does not block the event loop.
+    """
+    def decorator(get):
+        @wraps(get)
+        async def wrapper(self, request, *args, **kwargs):
+            versions = await aget_versions(models)
+            etag = versions_etag(type(self).__name__, request, versions)
+            if etag_matches(request, etag):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+            key = _report_key(type(self).__name__, request, versions)
+            cached = await cache.aget(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = await get(self, request, *args, **kwargs)
+                if response.status_code == 200:
+                    await cache.aset(key, (response.content, response['Content-Type']),
+                                     getattr(settings, 'REPORT_CACHE_TIMEOUT', 3600))
+
+            if response.status_code == 200:
+                response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
+
+
+class ConditionalGetMixin:
+    """
+    ETag / If-None-Match support for ``list`` and ``retrieve`` on a viewset.
+
+    The ETag is built from the change counters of ``etag_models`` (the
+    queryset's model by default), so a matching If-None-Match returns 304
+    without touching the database or the serializer.
+    """
+    etag_models = None
+
+    def get_etag_models(self):
+        return self.etag_models or (self.get_queryset().model,)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, handler, request, *args, etag_models=None, **kwargs):
+        """Run ``handler`` unless the client's copy is still current."""
+        models = etag_models or self.get_etag_models()
+        etag = versions_etag(type(self).__name__, request, get_versions(models))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
@@ -0,0 +1,88 @@
+# tours/capacity.py
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .cache import bump_versions
+
+
+# Booking statuses that hold a seat on the tour.
+SEAT_STATUSES = frozenset({'Pending', 'Confirmed', 'Completed'})
+
+
+class TourFullError(Exception):
+    def __init__(self, tour_id, seats=1):
+        self.tour_id = tour_id
+        self.seats = seats
+        super().__init__(
+            f'Tour {tour_id} has no {"seat" if seats == 1 else f"{seats} seats"} left.'
+        )
+
+
+def holds_seat(status):
+    return status in SEAT_STATUSES
+
+
+def seat_deltas(changes):
+    """
+    ``{tour_id: change in seats taken}`` for ``(before, after)`` pairs of
+    ``(tour_id, status)`` booking states, ``None`` for a missing side.
+    """
+    deltas = Counter()
+    for before, after in changes:
+        if before is not None and holds_seat(before[1]):
+            deltas[before[0]] -= 1
+        if after is not None and holds_seat(after[1]):
+            deltas[after[0]] += 1
+    return {tour_id: delta for tour_id, delta in deltas.items() if delta}
+
+
+def apply_seat_deltas(tour_model, deltas, using=None):
+    """
+    Move the ``seats_taken`` counters by ``deltas`` with one conditional
+    ``UPDATE`` per tour, raising TourFullError if a tour would go over
+    ``max_participants``.
+
+    The check and the increment are the same statement, so concurrent writers
+    cannot both take the last seat. Call it inside the transaction that
+    writes the bookings; tours are updated in id order so that writers lock
+    rows in the same order.
+    """
+    if not deltas:
+        return
+    tours = tour_model._base_manager.using(using)
+    for tour_id in sorted(deltas):
+        delta = deltas[tour_id]
+        if delta > 0:
+            updated = tours.filter(
+                pk=tour_id, seats_taken__lte=F('max_participants') - delta
+            ).update(seats_taken=F('seats_taken') + delta)
+            if not updated and tours.filter(pk=tour_id).exists():
+                raise TourFullError(tour_id, delta)
+        else:
+            tours.filter(pk=tour_id, seats_taken__gte=-delta).update(seats_taken=F('seats_taken') + delta)
+
+    # QuerySet.update() sends no post_save.
+    bump_versions(tour_model)
+    transaction.on_commit(lambda: bump_versions(tour_model), using=using)
+
+
+def recount_seats(tour_model, booking_model, using=None):
+    """Reset every ``seats_taken`` counter from the bookings; returns the tours fixed."""
+    fixed = []
+    with transaction.atomic(using=using):
+        tours = list(tour_model._base_manager.using(using).select_for_update().only('pk', 'seats_taken'))
+        taken = Counter(dict(
+            booking_model._base_manager.using(using).filter(status__in=SEAT_STATUSES)
+            .values_list('tour_id').annotate(seats=Count('pk')).order_by()
+        ))
+        for tour in tours:
+            if tour.seats_taken != taken[tour.pk]:
+                tour.seats_taken = taken[tour.pk]
+                fixed.append(tour)
+        tour_model._base_manager.using(using).bulk_update(fixed, ['seats_taken'])
+        if fixed:
+            bump_versions(tour_model)
+            transaction.on_commit(lambda: bump_versions(tour_model), using=using)
+    return [tour.pk for tour in fixed]
@@ -0,0 +1,184 @@
+# tours/cotravel.py
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, Q
+
+from .cache import bump_versions
+from .capacity import SEAT_STATUSES, holds_seat
+
+
+MAX_DEPTH = 3
+
+
+def pair_deltas(booking_model, changes, using=None):
+    """
+    ``{(client_id, other_id): change in tours shared}``, both directions, for
+    ``(before, after)`` pairs of ``(client_id, tour_id, status)`` booking
+    states, ``None`` for a missing side. Call it before the bookings are
+    written: two clients share a tour while both hold a seat on it, whatever
+    the number of bookings each has there.
+    """
+    seats = Counter()
+    for before, after in changes:
+        if before is not None and holds_seat(before[2]):
+            seats[before[0], before[1]] -= 1
+        if after is not None and holds_seat(after[2]):
+            seats[after[0], after[1]] += 1
+    seats = {key: delta for key, delta in seats.items() if delta}
+    if not seats:
+        return {}
+
+    stored = defaultdict(Counter)
+    for tour_id, client_id, count in booking_model._base_manager.using(using).filter(
+        tour_id__in={tour_id for _, tour_id in seats}, status__in=SEAT_STATUSES
+    ).values_list('tour_id', 'client_id').annotate(count=Count('pk')).order_by():
+        stored[tour_id][client_id] = count
+
+    changed = defaultdict(dict)
+    for (client_id, tour_id), delta in seats.items():
+        count = stored[tour_id][client_id]
+        if (count > 0) != (count + delta > 0):
+            changed[tour_id][client_id] = count + delta > 0
+
+    deltas = Counter()
+    for tour_id, members in changed.items():
+        before = {client_id for client_id, count in stored[tour_id].items() if count > 0}
+        after = {client_id for client_id in before if members.get(client_id, True)}
+        after.update(client_id for client_id, joined in members.items() if joined)
+        for client_id in members:
+            for other_id in (before | after) - {client_id}:
+                if other_id in members and other_id < client_id:
+                    continue  # counted from the other side
+                delta = ((client_id in after and other_id in after)
+                         - (client_id in before and other_id in before))
+                if delta:
+                    deltas[client_id, other_id] += delta
+                    deltas[other_id, client_id] += delta
+    return {pair: delta for pair, delta in deltas.items() if delta}
+
+
+def apply_pair_deltas(co_traveller_model, deltas, using=None):
+    """
+    Apply ``pair_deltas()`` to the adjacency rows: the rows concerned are
+    read under lock in one query, then written with one ``bulk_update``,
+    ``bulk_create`` and ``DELETE`` each.
+    """
+    if not deltas:
+        return
+    rows = co_traveller_model._base_manager.using(using)
+    existing = {
+        (row.client_id, row.other_id): row
+        for row in rows.select_for_update().filter(
+            client_id__in={client_id for client_id, _ in deltas},
+            other_id__in={other_id for _, other_id in deltas},
+        ).only('pk', 'client_id', 'other_id', 'shared_tours')
+        if (row.client_id, row.other_id) in deltas
+    }
+    updated, created, emptied = [], [], []
+    for pair in sorted(deltas):
+        row = existing.get(pair)
+        if row is None:
+            if deltas[pair] > 0:
+                created.append(co_traveller_model(client_id=pair[0], other_id=pair[1], shared_tours=deltas[pair]))
+            # else the client was deleted, and its rows with it
+        elif row.shared_tours + deltas[pair] > 0:
+            row.shared_tours += deltas[pair]
+            updated.append(row)
+        else:
+            emptied.append(row.pk)
+    rows.bulk_update(updated, ['shared_tours'], batch_size=1000)
+    rows.bulk_create(created, batch_size=1000)
+    if emptied:
+        rows.filter(pk__in=emptied).delete()
+
+    # bulk_update() and bulk_create() send no post_save.
+    bump_versions(co_traveller_model)
+    transaction.on_commit(lambda: bump_versions(co_traveller_model), using=using)
+
+
+def refresh_clients(co_traveller_model, booking_model, client_ids, using=None):
+    """
+    Bring the rows of ``client_ids`` (both directions) back in line with the
+    stored bookings. For deletes, where ``pair_deltas()`` cannot be used:
+    several bookings of a tour may go in one statement before any signal
+    is sent.
+    """
+    bookings = booking_model._base_manager.using(using).filter(status__in=SEAT_STATUSES)
+    members = defaultdict(set)
+    for tour_id, client_id in bookings.filter(
+        tour_id__in=bookings.filter(client_id__in=client_ids).values('tour_id')
+    ).values_list('tour_id', 'client_id').distinct().order_by():
+        members[tour_id].add(client_id)
+
+    wanted = Counter()
+    for clients in members.values():
+        for client_id in clients & set(client_ids):
+            for other_id in clients - {client_id}:
+                wanted[client_id, other_id] += 1
+                if other_id not in client_ids:
+                    wanted[other_id, client_id] += 1
+
+    deltas = Counter(wanted)
+    for client_id, other_id, shared_tours in co_traveller_model._base_manager.using(using).filter(
+        Q(client_id__in=client_ids) | Q(other_id__in=client_ids)
+    ).values_list('client_id', 'other_id', 'shared_tours'):
+        deltas[client_id, other_id] -= shared_tours
+    apply_pair_deltas(co_traveller_model, {pair: delta for pair, delta in deltas.items() if delta}, using)
+
+
+def rebuild_co_travellers(co_traveller_model, booking_model, using=DEFAULT_DB_ALIAS):
+    """
+    Recompute every adjacency row from the seat-holding bookings, grouped by
+    tour. Returns the number of rows (two per pair of clients).
+    """
+    members = defaultdict(set)
+    for tour_id, client_id in booking_model._base_manager.using(using).filter(
+        status__in=SEAT_STATUSES
+    ).values_list('tour_id', 'client_id').distinct().order_by():
+        members[tour_id].add(client_id)
+
+    shared = Counter()
+    for clients in members.values():
+        for client_id, other_id in combinations(sorted(clients), 2):
+            shared[client_id, other_id] += 1
+
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        # one statement, without loading the rows for delete signals
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(co_traveller_model._meta.db_table)}')
+        co_traveller_model._base_manager.using(using).bulk_create((
+            co_traveller_model(client_id=a, other_id=b, shared_tours=count)
+            for (client_id, other_id), count in sorted(shared.items())
+            for a, b in ((client_id, other_id), (other_id, client_id))
+        ), batch_size=1000)
+        bump_versions(co_traveller_model)
+        transaction.on_commit(lambda: bump_versions(co_traveller_model), using=using)
+    return 2 * len(shared)
+
+
+def co_travellers(co_traveller_model, client_id, depth=1, using=None):
+    """
+    Clients within ``depth`` hops of ``client_id`` in the co-traveller graph,
+    as ``(client_id, hops, shared_tours)`` nearest first, then by tours
+    shared with the clients one hop closer (the client itself at one hop).
+    One query per hop over the adjacency rows.
+    """
+    rows = co_traveller_model._base_manager.using(using)
+    seen = {client_id}
+    frontier = {client_id}
+    found = []
+    for hops in range(1, depth + 1):
+        shared = Counter()
+        for other_id, count in rows.filter(client_id__in=frontier).values_list('other_id', 'shared_tours'):
+            if other_id not in seen:
+                shared[other_id] += count
+        if not shared:
+            break
+        found += sorted(((other_id, hops, count) for other_id, count in shared.items()),
+                        key=lambda item: (-item[2], item[0]))
+        seen.update(shared)
+        frontier = set(shared)
+    return found
@@ -0,0 +1,144 @@
+# tours/facets.py
+import hashlib
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .cache import get_versions
+from .models import ChinaRegion, Tour, TourRegion
+
+
+# Facet -> query parameter that filters on it.
+FACETS = {
+    'category': 'category',
+    'season': 'season',
+    'theme': 'theme',
+    'difficulty_level': 'difficulty',
+    'region': 'region',
+}
+
+FACET_MODELS = (Tour, TourRegion, ChinaRegion)
+
+
+def base_tours(params):
+    """Active tours within the date window, price range and availability asked for."""
+    tours = Tour.objects.filter(is_active=True)
+    if params.get('date_from'):
+        tours = tours.filter(start_date__gte=params['date_from'])
+    if params.get('date_to'):
+        tours = tours.filter(end_date__lte=params['date_to'])
+    if params.get('price_min') is not None:
+        tours = tours.filter(price__gte=params['price_min'])
+    if params.get('price_max') is not None:
+        tours = tours.filter(price__lte=params['price_max'])
+    if params.get('available'):
+        tours = tours.filter(seats_taken__lt=F('max_participants'))
+    return tours
+
+
+def search_tours(params):
+    """``base_tours()`` narrowed by every facet filter."""
+    tours = base_tours(params)
+    for facet, param in FACETS.items():
+        values = params.get(param)
+        if not values:
+            continue
+        if facet == 'region':
+            tours = tours.filter(
+                pk__in=TourRegion.objects.filter(region_id__in=values).values('tour_id')
+            )
+        else:
+            tours = tours.filter(**{f'{facet}__in': values})
+    return tours
+
+
+def tour_facets(params):
+    """
+    Counts per category, season, theme, difficulty and region.
+
+    Each facet is counted over the tours matching every filter except its
+    own, so selecting a value does not hide the alternatives. All of them
+    come from one pass over the tours of ``base_tours()`` and their regions,
+    two queries whatever the number of facets.
+    """
+    tours = base_tours(params)
+    rows = tours.values_list('tour_id', 'category', 'season', 'theme', 'difficulty_level')
+    regions = defaultdict(set)
+    region_names = {}
+    for tour_id, region_id, name in TourRegion.objects.filter(tour__in=tours).values_list(
+        'tour_id', 'region_id', 'region__name'
+    ):
+        regions[tour_id].add(region_id)
+        region_names[region_id] = name
+
+    wanted = {
+        facet: set(params[param]) for facet, param in FACETS.items() if params.get(param)
+    }
+    counts = {facet: Counter() for facet in FACETS}
+    for tour_id, *columns in rows:
+        values = dict(zip(('category', 'season', 'theme', 'difficulty_level'), columns))
+        values['region'] = regions.get(tour_id, set())
+        matches = {
+            facet: (bool(values['region'] & allowed) if facet == 'region' else values[facet] in allowed)
+            for facet, allowed in wanted.items()
+        }
+        failed = [facet for facet, ok in matches.items() if not ok]
+        if len(failed) > 1:
+            continue
+        for facet in FACETS:
+            if failed and failed[0] != facet:
+                continue
+            if facet == 'region':
+                counts[facet].update(values['region'])
+            else:
+                counts[facet][values[facet]] += 1
+
+    facets = {}
+    for facet, counter in counts.items():
+        entries = sorted(counter.items(), key=lambda item: (-item[1], str(item[0])))
+        if facet == 'region':
+            facets[facet] = [
+                {'value': value, 'name': region_names[value], 'count': count} for value, count in entries
+            ]
+        else:
+            facets[facet] = [{'value': value, 'count': count} for value, count in entries]
+    return facets
+
+
+def cached_tour_facets(params):
+    """
+    ``tour_facets()`` cached per filter combination once it has been asked
+    for ``SEARCH_FACET_CACHE_MIN_HITS`` times, until a tour or region changes.
+    """
+    combination = hashlib.md5(
+        json.dumps(_normalized(params), sort_keys=True, default=str).encode('utf-8'),
+        usedforsecurity=False
+    ).hexdigest()
+    versions = '.'.join(str(version) for version in get_versions(FACET_MODELS))
+    key = f'tour-facets:{combination}:{versions}'
+    facets = cache.get(key)
+    if facets is not None:
+        return facets
+
+    timeout = getattr(settings, 'REPORT_CACHE_TIMEOUT', 3600)
+    hits_key = f'tour-facets-hits:{combination}'
+    cache.add(hits_key, 0, timeout)
+    try:
+        hits = cache.incr(hits_key)
+    except ValueError:
+        hits = 1
+
+    facets = tour_facets(params)
+    if hits >= getattr(settings, 'SEARCH_FACET_CACHE_MIN_HITS', 2):
+        cache.set(key, facets, timeout)
+    return facets
+
+
+def _normalized(params):
+    return {
+        key: sorted(value) if isinstance(value, list) else value
+        for key, value in params.items() if value not in (None, '', [])
+    }
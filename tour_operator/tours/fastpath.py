@@ -0,0 +1,184 @@
+# tours/fastpath.py
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601
+from rest_framework import fields as drf_fields
+from rest_framework import relations
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+from rest_framework.settings import api_settings
+
+
+# DRF fields whose to_representation() returns what the database driver
+# already hands back (int, str, bool), so the value can be used as is.
+IDENTITY_FIELDS = (
+    drf_fields.IntegerField,
+    drf_fields.CharField,
+    drf_fields.BooleanField,
+    drf_fields.ReadOnlyField,
+)
+
+# The to_representation() the shortcuts below stand in for; a subclass
+# overriding it is rendered through its own.
+BUILTIN_REPRESENTATIONS = {
+    field_class.to_representation
+    for field_class in IDENTITY_FIELDS + (drf_fields.ChoiceField, drf_fields.DateTimeField)
+}
+
+# Fields that are not a plain column of the serialized model.
+UNSUPPORTED_FIELDS = (
+    BaseSerializer,
+    relations.ManyRelatedField,
+    drf_fields.SerializerMethodField,
+    drf_fields.HiddenField,
+    drf_fields.ListField,
+    drf_fields.DictField,
+    drf_fields.JSONField,
+    drf_fields.ModelField,
+)
+
+
+class RowRenderer:
+    """
+    Renders ``values()`` rows exactly as a ModelSerializer renders instances.
+
+    Built once per serializer field set: each readable field is mapped to its
+    column and to a converter, ``None`` where DRF would return the database
+    value unchanged, or the field's own ``to_representation`` (decimals,
+    dates, times) so the output stays byte-identical.
+    """
+
+    def __init__(self, columns, plan):
+        self.columns = columns
+        self.plan = plan
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        """The renderer for ``serializer``, or None if it needs the full path."""
+        model = serializer.Meta.model
+        columns, plan = [], []
+        for field in serializer._readable_fields:
+            column = _column_for(model, field)
+            if column is None:
+                return None
+            columns.append(column)
+            plan.append((field.field_name, column, _converter_for(field)))
+        return cls(columns, plan)
+
+    @classmethod
+    def for_rows(cls, serializer):
+        """
+        The renderer for ``serializer`` over dict rows keyed by its fields'
+        sources, as the reports build them, or None if it needs the full path.
+        """
+        columns, plan = [], []
+        for field in serializer._readable_fields:
+            if isinstance(field, (relations.RelatedField,) + UNSUPPORTED_FIELDS) or len(field.source_attrs) != 1:
+                return None
+            # DRF leaves a missing optional key out; render() would not
+            if field.default is not drf_fields.empty or not (field.required or field.read_only):
+                return None
+            columns.append(field.source)
+            plan.append((field.field_name, field.source, _converter_for(field)))
+        return cls(columns, plan)
+
+    def render(self, rows):
+        plan = self.plan
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in plan:
+                value = row[column]
+                if value is None or convert is None:
+                    item[name] = value
+                else:
+                    item[name] = convert(value)
+            data.append(item)
+        return data
+
+
+def _column_for(model, field):
+    if isinstance(field, relations.RelatedField):
+        if not isinstance(field, relations.PrimaryKeyRelatedField) or field.pk_field is not None:
+            return None
+    elif isinstance(field, UNSUPPORTED_FIELDS):
+        return None
+    if len(field.source_attrs) != 1:
+        return None
+
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete:
+        return None
+    if model_field.is_relation != isinstance(field, relations.PrimaryKeyRelatedField):
+        return None
+    return model_field.attname
+
+
+def _converter_for(field):
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        return None
+    if type(field).to_representation not in BUILTIN_REPRESENTATIONS:
+        return field.to_representation
+    if isinstance(field, drf_fields.ChoiceField):
+        if all(isinstance(key, str) for key in field.choice_strings_to_values.values()):
+            return None
+        return field.to_representation
+    if isinstance(field, drf_fields.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, IDENTITY_FIELDS):
+        return None
+    return field.to_representation
+
+
+def _datetime_converter(field):
+    # DateTimeField.to_representation() looks the current time zone up for
+    # every value; resolve it once per renderer for the common ISO 8601 case.
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if not timezone.is_aware(value):
+            return field.to_representation(value)
+        text = value.astimezone(field_timezone).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return convert
+
+
+def render_rows(serializer_class, rows):
+    """``serializer_class(rows, many=True).data``, through a RowRenderer where it can."""
+    renderer = RowRenderer.for_rows(serializer_class())
+    if renderer is None:
+        return serializer_class(rows, many=True).data
+    return renderer.render(rows)
+
+
+class FastListMixin:
+    """
+    ``list`` through ``values()`` and a precompiled RowRenderer instead of a
+    model instance and a serializer call per row. Falls back to the regular
+    path for serializers with computed, nested or custom fields (including
+    ``?expand=``).
+    """
+
+    def list(self, request, *args, **kwargs):
+        renderer = RowRenderer.for_serializer(self.get_serializer())
+        if renderer is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        model = queryset.model
+        columns = set(renderer.columns)
+        for key in list(getattr(self, 'ordering', None) or ()) + list(getattr(self, 'ordering_fields', None) or ()):
+            columns.add(model._meta.get_field(key.lstrip('-')).attname)
+        columns.add(model._meta.pk.attname)
+        queryset = queryset.values(*columns)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(renderer.render(page))
+        return Response(renderer.render(queryset))
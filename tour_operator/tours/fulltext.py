@@ -0,0 +1,128 @@
+# tours/fulltext.py
+import html
+import re
+
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, transaction
+
+
+SEARCH_TABLE = 'tours_search'
+
+# Index rows are keyed ``object id * ROWID_STRIDE + kind code``: one row per
+# source row, found by rowid when the source row changes. Migration 0005
+# creates the table and the triggers keeping it in step with the sources.
+ROWID_STRIDE = 8
+
+# kind -> (code, model label, title field, body field)
+SOURCES = {
+    'tour': (1, 'tours.Tour', 'name', 'description'),
+    'excursion': (2, 'tours.Excursion', 'name', 'description'),
+    'festival': (3, 'tours.Festival', 'name', 'description'),
+    'hotel': (4, 'tours.Hotel', 'name', 'address'),
+}
+
+# bm25() weights of the title and body columns.
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+SNIPPET_TOKENS = 12
+MAX_TERMS = 16
+
+_TERM = re.compile(r'\w+')
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+
+def _rebuild_sql(quote, code, model, title_field, body_field):
+    """The statement refilling the index rows of one source table."""
+    table = quote(model._meta.db_table)
+    pk = quote(model._meta.pk.column)
+    title = quote(model._meta.get_field(title_field).column)
+    body = quote(model._meta.get_field(body_field).column)
+    return (
+        f'INSERT INTO {SEARCH_TABLE}(rowid, title, body) '
+        f'SELECT {table}.{pk} * {ROWID_STRIDE} + {code}, {title}, coalesce({body}, \'\') FROM {table}'
+    )
+
+
+def _sources(get_model):
+    for kind, (code, label, title_field, body_field) in SOURCES.items():
+        yield kind, code, get_model(*label.split('.')), title_field, body_field
+
+
+def rebuild_search_index(get_model, using=DEFAULT_DB_ALIAS):
+    """
+    Refill the index from the source tables, one ``INSERT ... SELECT`` per
+    source, and merge its b-trees. Returns ``{kind: rows indexed}``.
+    """
+    connection = connections[using]
+    _check_backend(connection)
+    counts = {}
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        for kind, *source in _sources(get_model):
+            cursor.execute(_rebuild_sql(connection.ops.quote_name, *source))
+            counts[kind] = cursor.rowcount
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return counts
+
+
+def match_expression(query):
+    """
+    FTS5 MATCH expression for free text: every word must appear, the last one
+    as a prefix. Operators and quotes typed by the user are taken as text.
+    """
+    terms = _TERM.findall(query)[:MAX_TERMS]
+    if not terms:
+        return ''
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+def search(query, kinds=None, limit=20, offset=0, using=DEFAULT_DB_ALIAS):
+    """
+    Ranked matches of ``query`` across every source, best first, as
+    ``{'type', 'id', 'title', 'snippet', 'score'}`` dicts.
+
+    Title hits weigh more than body hits. The snippet is HTML-escaped with
+    the matched words wrapped in ``<mark>``.
+    """
+    connection = connections[using]
+    _check_backend(connection)
+    match = match_expression(query)
+    if not match:
+        return []
+
+    codes = {code: kind for kind, (code, *_) in SOURCES.items()}
+    sql = (
+        f'SELECT rowid, title, snippet({SEARCH_TABLE}, -1, %s, %s, %s, {SNIPPET_TOKENS}), '
+        f'bm25({SEARCH_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score '
+        f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+    )
+    params = [_MARK_START, _MARK_END, '…', match]
+    if kinds:
+        wanted = [SOURCES[kind][0] for kind in kinds]
+        sql += f' AND rowid %% {ROWID_STRIDE} IN ({", ".join(["%s"] * len(wanted))})'
+        params += wanted
+    sql += ' ORDER BY score, rowid LIMIT %s OFFSET %s'
+    params += [limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [
+        {
+            'type': codes[rowid % ROWID_STRIDE],
+            'id': rowid // ROWID_STRIDE,
+            'title': title,
+            'snippet': _highlight(snippet),
+            'score': round(-score, 4),
+        }
+        for rowid, title, snippet, score in rows
+    ]
+
+
+def _highlight(snippet):
+    return html.escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def _check_backend(connection):
+    if connection.vendor != 'sqlite':
+        raise NotSupportedError('Full-text search needs the SQLite FTS5 index.')
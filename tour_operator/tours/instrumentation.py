@@ -0,0 +1,137 @@
+# tours/instrumentation.py
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+
+slow_query_logger = logging.getLogger('tours.slow_sql')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """
+    SQL with every literal and placeholder replaced by ``?`` and ``IN`` lists
+    folded, so statements that differ only in their parameters group together.
+    """
+    sql = sql.replace('%s', '?')
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """
+    ``connection.execute_wrapper()`` hook counting the queries of one request
+    and their time, and handing the slow ones to the slow-query log. The
+    async views may run a request's queries on several threads at once
+    (see gather_queries()), so the counters are updated under a lock.
+    """
+
+    def __init__(self, view_name=None):
+        self.view_name = view_name
+        self.count = 0
+        self.duration = 0.0
+        self.threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100) / 1000
+        self.sample_rate = getattr(settings, 'SLOW_QUERY_SAMPLE_RATE', 1.0)
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self.lock:
+                self.count += 1
+                self.duration += duration
+            if duration >= self.threshold and random.random() < self.sample_rate:
+                self.log_slow_query(sql, duration, many, context)
+
+    def log_slow_query(self, sql, duration, many, context):
+        slow_query_logger.warning(json.dumps({
+            'view': self.view_name,
+            'alias': context['connection'].alias,
+            'duration_ms': round(duration * 1000, 3),
+            'many': many,
+            'sql': normalize_sql(sql),
+        }))
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Counts the SQL queries of every request and their total time and reports
+    them, with the time spent in the view, in a ``Server-Timing`` header:
+
+        Server-Timing: db;dur=3.2;desc="4 queries", app;dur=11.8
+
+    Queries slower than ``SLOW_QUERY_THRESHOLD_MS`` are written to the
+    ``tours.slow_sql`` logger as JSON for a ``SLOW_QUERY_SAMPLE_RATE``
+    fraction of them.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            # Under ASGI: a sync-only middleware would run every view,
+            # async ones included, in a thread of its own.
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = self.start(request)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        return self.finish(response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = self.start(request)
+        started = time.perf_counter()
+        # Connections are created in the thread that runs the request's ORM
+        # calls, never on the event loop: Django refuses to use them from
+        # another thread.
+        request_connections = await sync_to_async(connections.all)()
+        with ExitStack() as stack:
+            for connection in request_connections:
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = await self.get_response(request)
+        return self.finish(response, recorder, started)
+
+    @staticmethod
+    def start(request):
+        recorder = QueryRecorder()
+        request.query_recorder = recorder
+        return recorder
+
+    @staticmethod
+    def finish(response, recorder, started):
+        total = time.perf_counter() - started
+        response['Server-Timing'] = 'db;dur={:.1f};desc="{} quer{}", app;dur={:.1f}'.format(
+            recorder.duration * 1000, recorder.count, 'y' if recorder.count == 1 else 'ies', total * 1000
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = getattr(request, 'query_recorder', None)
+        if recorder is not None:
+            match = request.resolver_match
+            recorder.view_name = (match.view_name or match._func_path) if match else view_func.__name__
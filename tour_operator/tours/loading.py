@@ -0,0 +1,241 @@
+# tours/loading.py
+import bz2
+import gzip
+import json
+import lzma
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers import base
+from django.core.serializers.python import Deserializer as PythonDeserializer
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .bulk import explicit_auto_dates
+from .cache import bump_versions
+from .capacity import recount_seats
+from .cotravel import rebuild_co_travellers
+from .models import (
+    Booking, ClientSummary, CoTraveller, HotelOccupancy, Review, Tour, TourExcursion, TourHotel, TourStats,
+)
+from .occupancy import rebuild_occupancy
+from .summary import rebuild_summaries
+from .tourstats import rebuild_tour_stats
+
+
+OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open,
+}
+
+# Fixture formats iter_records() reads, tried in this order for a name
+# given without one, as loaddata tries its serializers.
+FORMATS = ('.json', '.jsonl')
+
+CHUNK_SIZE = 1 << 16
+
+# What the save() overrides and signals keep current and bulk_create()
+# skips: (name, models it is computed from, rebuild). The recommendations
+# are left out, being a batch job anyway.
+REBUILDS = [
+    ('seats', {Tour, Booking}, lambda using: recount_seats(Tour, Booking, using=using)),
+    ('hotel occupancy', {Tour, TourHotel, Booking},
+     lambda using: rebuild_occupancy(HotelOccupancy, TourHotel, using=using)),
+    ('co-travellers', {Booking}, lambda using: rebuild_co_travellers(CoTraveller, Booking, using=using)),
+    ('client summaries', {Booking, Review},
+     lambda using: rebuild_summaries(ClientSummary, Booking, Review, using=using)),
+    ('tour stats', {Booking, Review, TourExcursion},
+     lambda using: rebuild_tour_stats(TourStats, Booking, Review, TourExcursion, using=using)),
+]
+
+
+def _open(path):
+    for suffix, opener in OPENERS.items():
+        if path.endswith(suffix):
+            return opener(path, 'rt', encoding='utf-8'), path.removesuffix(suffix)
+    return open(path, encoding='utf-8'), path
+
+
+def iter_records(path):
+    """
+    Yield the records of a JSON (``[{...}, ...]``) or JSON Lines fixture one
+    at a time, reading the file in chunks, so memory does not grow with it.
+    """
+    fh, name = _open(path)
+    with fh:
+        if name.endswith('.jsonl'):
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        yield from _iter_array(fh)
+
+
+def _iter_array(fh):
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def skip(chars):
+        nonlocal buffer, pos, eof
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            buffer, pos = fh.read(CHUNK_SIZE), 0
+            eof = not buffer
+
+    skip(' \t\r\n')
+    if buffer[pos:pos + 1] != '[':
+        raise base.DeserializationError('A JSON fixture must be a list of objects.')
+    pos += 1
+
+    while True:
+        skip(' \t\r\n,')
+        if eof:
+            raise base.DeserializationError('Unexpected end of fixture.')
+        if buffer[pos] == ']':
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The object runs past the buffer: read more and retry.
+            chunk = fh.read(CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield record
+        pos = end
+
+
+def dependency_levels(models):
+    """
+    ``{model: level}`` where every model a model points to (foreign keys and
+    many-to-many targets) has a lower level.
+    """
+    levels = {}
+
+    def level(model, path):
+        if model not in levels:
+            related = {
+                field.related_model for field in model._meta.get_fields()
+                if (field.many_to_one or field.one_to_one or field.many_to_many)
+                and field.concrete and field.related_model not in (None, model)
+            }
+            levels[model] = 1 + max(
+                (level(other, path | {model}) for other in related if other not in path), default=-1
+            )
+        return levels[model]
+
+    for model in models:
+        level(model, frozenset())
+    return levels
+
+
+class StreamingLoader:
+    """
+    Loads fixtures record by record instead of parsing them whole.
+
+    Records are inserted level by level in dependency order (one pass over
+    the files per level present), ``batch_size`` at a time with
+    ``bulk_create``, rows whose primary key already exists being overwritten
+    as ``loaddata`` does. Everything runs in one transaction.
+
+    ``bulk_create`` skips the ``save()`` overrides that keep the counters
+    and rollups current, so those computed from the models loaded are
+    rebuilt at the end, in the same transaction (see REBUILDS); their names
+    are left in ``rebuilt``.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, batch_size=1000, ignorenonexistent=False):
+        self.using = using
+        self.batch_size = batch_size
+        self.ignorenonexistent = ignorenonexistent
+        self.levels = dependency_levels(apps.get_models())
+        self.counts = defaultdict(int)
+        self.rebuilt = []
+        self._models = {}
+
+    def load(self, paths):
+        started = time.perf_counter()
+        connection = connections[self.using]
+        with transaction.atomic(using=self.using):
+            pending = self._load_level(paths, 0)
+            for level in sorted(pending):
+                self._load_level(paths, level)
+
+            if self.counts:
+                models = list(self.counts)
+                with connection.cursor() as cursor:
+                    for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                        cursor.execute(sql)
+                bump_versions(*models)
+                transaction.on_commit(lambda: bump_versions(*models), using=self.using)
+
+            for name, sources, rebuild in REBUILDS:
+                if sources.intersection(self.counts):
+                    rebuild(self.using)
+                    self.rebuilt.append(name)
+        return dict(self.counts), time.perf_counter() - started
+
+    def _load_level(self, paths, level):
+        """Insert the records at ``level``; return the higher levels seen."""
+        batches = defaultdict(list)
+        higher = set()
+        for path in paths:
+            for index, record in enumerate(iter_records(path)):
+                model = self._model(record, path, index)
+                model_level = self.levels[model]
+                if model_level != level:
+                    if model_level > level:
+                        higher.add(model_level)
+                    continue
+                batch = batches[model]
+                batch.append(self._deserialize(record, path, index))
+                if len(batch) >= self.batch_size:
+                    self._insert(model, batch)
+                    batch.clear()
+        for model, batch in batches.items():
+            if batch:
+                self._insert(model, batch)
+        return higher
+
+    def _model(self, record, path, index):
+        try:
+            label = record['model']
+            if label not in self._models:
+                self._models[label] = apps.get_model(label)
+            return self._models[label]
+        except (KeyError, TypeError, LookupError, ValueError):
+            raise base.DeserializationError(
+                f'{path}, record {index}: invalid model identifier {record.get("model")!r}'
+                if isinstance(record, dict) else f'{path}, record {index}: not an object'
+            )
+
+    def _deserialize(self, record, path, index):
+        try:
+            return next(PythonDeserializer([record], using=self.using, ignorenonexistent=self.ignorenonexistent))
+        except base.DeserializationError as exc:
+            raise base.DeserializationError(f'{path}, record {index}: {exc}')
+
+    def _insert(self, model, batch):
+        objects = [item.object for item in batch]
+        update_fields = [
+            field.name for field in model._meta.concrete_fields if not field.primary_key
+        ]
+        with explicit_auto_dates(model):
+            if update_fields and all(obj.pk is not None for obj in objects):
+                model._base_manager.using(self.using).bulk_create(
+                    objects, update_conflicts=True,
+                    unique_fields=[model._meta.pk.name], update_fields=update_fields,
+                )
+            else:
+                model._base_manager.using(self.using).bulk_create(objects)
+        for item in batch:
+            for accessor, values in (item.m2m_data or {}).items():
+                getattr(item.object, accessor).set(values)
+        self.counts[model] += len(objects)
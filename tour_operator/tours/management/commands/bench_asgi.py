@@ -0,0 +1,80 @@
+# tours/management/commands/bench_asgi.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client as HttpClient
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from tours.benchmark import run_asgi_load, run_wsgi_load, seed
+
+
+REPORTS = [
+    '/api/pavel-friends/', '/api/tours-with-paid-excursions/', '/api/festivals-tours-price-comparison',
+    '/api/employee-ratings/', '/api/monthly-stats/', '/api/payment-analytics/', '/api/employees-performance/',
+    '/api/clients-with-details/', '/api/tour-theme-analysis/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and put the reports under concurrent load, in-process: '
+        'the sync views through the WSGI and the ASGI handler, '
+        'and the async views (/api/async/...) through the ASGI handler. Reports throughput '
+        'and p50/p95/p99 latency of each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Scale factor; 1 is 10,000 bookings, 100 is 10^6.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and server.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data.')
+        parser.add_argument('--endpoint', action='append', default=[],
+                            help=f'Sync report path to compare (repeatable; default {", ".join(REPORTS)}).')
+        parser.add_argument('--warm', action='store_true',
+                            help='Serve the reports from the cache instead of timing them computed.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be at least 1.')
+        paths = options['endpoint'] or REPORTS
+
+        # Never seed the configured database; the test database is a file,
+        # so the concurrent requests each get a connection to it.
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seed(options['scale'], options['seed'])
+            results = []
+            overrides = {'SLOW_QUERY_SAMPLE_RATE': 0.0}
+            if not options['warm']:
+                overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+            with override_settings(**overrides):
+                for path in paths:
+                    async_path = path.replace('/api/', '/api/async/', 1)
+                    http = HttpClient()
+                    sync_body, async_body = http.get(path).content, http.get(async_path).content
+                    # page links point back at the view that served them
+                    if sync_body != async_body.replace(b'/api/async/', b'/api/'):
+                        raise CommandError(f'{path} and {async_path} answered different bodies.')
+                    # the requests must not share this thread's connection
+                    connections.close_all()
+                    for load, view_path in ((run_wsgi_load, path), (run_asgi_load, path),
+                                            (run_asgi_load, async_path)):
+                        row = load(view_path, options['requests'], options['concurrency'])
+                        if row['status'] != 200:
+                            raise CommandError(f'{view_path} answered {row["status"]} under {row["server"]}.')
+                        results.append(row)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(
+            f'{"endpoint":<44} {"server":>6} {"req/s":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}'
+        )
+        for row in results:
+            self.stdout.write(
+                f'{row["endpoint"]:<44} {row["server"]:>6} {row["requests_per_sec"]:>8.1f} '
+                f'{row["p50_ms"]:>9.1f} {row["p95_ms"]:>9.1f} {row["p99_ms"]:>9.1f}'
+            )
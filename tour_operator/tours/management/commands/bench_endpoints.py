@@ -0,0 +1,119 @@
+# tours/management/commands/bench_endpoints.py
+import json
+import platform
+import sqlite3
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tours.benchmark import endpoints, run_endpoints, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database at a scale factor and time every GET endpoint '
+        'of the tours API in-process: query count, p50/p95 latency, peak memory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Scale factor; 1 is 10,000 bookings, 100 is 10^6.')
+        parser.add_argument('--repeat', type=int, default=10, help='Timed requests per endpoint.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data.')
+        parser.add_argument('--endpoint', action='append', default=[],
+                            help='Only endpoints containing this text (repeatable).')
+        parser.add_argument('--warm', action='store_true',
+                            help='Keep the cache between requests instead of timing cold reports.')
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Reuse the test database's data if it exists (needs a TEST NAME).")
+        parser.add_argument('--output', default=None,
+                            help='JSON results file (default: benchmark-sf<scale>.json).')
+        parser.add_argument('--baseline', default=None,
+                            help='Earlier results file to compare p50 latencies against.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+        scale = options['scale']
+
+        # Never seed the configured database: run against the test database,
+        # created (and migrated) the same way the test runner does it.
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False)
+        try:
+            started = time.perf_counter()
+            from tours.models import Booking
+            if options['keepdb'] and Booking.objects.exists():
+                rows = None
+                self.stdout.write('Reusing the seeded test database.')
+            else:
+                rows = seed(scale, options['seed'])
+                self.stdout.write('Seeded {:,} rows in {:.1f}s.'.format(
+                    sum(rows.values()), time.perf_counter() - started
+                ))
+
+            paths = [
+                path for path in endpoints()
+                if not options['endpoint'] or any(text in path for text in options['endpoint'])
+            ]
+            results = run_endpoints(paths, repeat=options['repeat'], warm=options['warm'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'scale': scale,
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'warm': options['warm'],
+                'revision': self._revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'sqlite': sqlite3.sqlite_version if connection.vendor == 'sqlite' else None,
+                'rows': {model._meta.label: count for model, count in rows.items()} if rows else None,
+            },
+            'results': results,
+        }
+        output = options['output'] or f'benchmark-sf{scale:g}.json'
+        with open(output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+        baseline = self._load_baseline(options['baseline'])
+        self.stdout.write(f'{"endpoint":<48} {"status":>6} {"queries":>7} {"p50 ms":>9} {"p95 ms":>9} {"peak KB":>9}')
+        for row in results:
+            line = '{endpoint:<48} {status:>6} {queries:>7} {p50_ms:>9.1f} {p95_ms:>9.1f} {peak_memory_kb:>9.0f}'.format(**row)
+            before = baseline.get(row['endpoint'])
+            if before:
+                line += '  x{:.2f}'.format(row['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf'))
+            self.stdout.write(line)
+        self.stdout.write(f'Results written to {output}.')
+
+    @staticmethod
+    def _revision():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def _load_baseline(path):
+        if not path:
+            return {}
+        try:
+            with open(path) as fh:
+                return {row['endpoint']: row for row in json.load(fh)['results']}
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Cannot read baseline {path}: {exc}')
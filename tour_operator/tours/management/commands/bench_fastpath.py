@@ -0,0 +1,64 @@
+# tours/management/commands/bench_fastpath.py
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from tours.fastpath import RowRenderer
+from tours.models import Booking, Client, Tour
+from tours.serializers import BookingSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of the serializer and the values() list paths on bookings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Bookings to render per run.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per path; the best one is reported.')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        # The seed rows are rolled back, the database is left as it was.
+        with transaction.atomic():
+            self._seed(rows)
+            queryset = Booking.objects.order_by('booking_id')[:rows]
+            renderer = RowRenderer.for_serializer(BookingSerializer())
+
+            def serializer_path():
+                return JSONRenderer().render(BookingSerializer(queryset, many=True).data)
+
+            def fast_path():
+                return JSONRenderer().render(renderer.render(queryset.values(*renderer.columns)))
+
+            if serializer_path() != fast_path():
+                raise CommandError('The two paths rendered different JSON.')
+
+            for name, path in (('serializer', serializer_path), ('values()', fast_path)):
+                best = min(self._time(path) for _ in range(repeat))
+                self.stdout.write(f'{name:<12} {rows / best:>12,.0f} rows/sec  ({best * 1000:.1f} ms)')
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _time(path):
+        started = time.perf_counter()
+        path()
+        return time.perf_counter() - started
+
+    @staticmethod
+    def _seed(rows):
+        client = Client.objects.create(
+            first_name='Bench', last_name='Client', email='bench@example.com',
+            phone='+70000000000', passport_data='0000 000000'
+        )
+        tour = Tour.objects.create(
+            name='Bench tour', description='', start_date=date(2024, 1, 1), end_date=date(2024, 1, 10),
+            duration_days=10, max_participants=rows, price=Decimal('1000.00'),
+            category='Cultural', season='High', difficulty_level=1, theme='Bench',
+        )
+        Booking.objects.bulk_create(
+            Booking(client=client, tour=tour, total_price=Decimal('1000.00') + n % 100)
+            for n in range(rows)
+        )
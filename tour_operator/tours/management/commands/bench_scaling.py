@@ -0,0 +1,66 @@
+# tours/management/commands/bench_scaling.py
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tours.benchmark import run_endpoints, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database at growing scale factors and time the same endpoints '
+        'at each, to see how their cost grows with the data: an exponent near 1 between '
+        'two scales is linear, near 2 quadratic (e.g. a fan-out join).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, action='append', default=[],
+                            help='Scale factor to measure (repeatable; default 0.25, 0.5 and 1).')
+        parser.add_argument('--endpoint', action='append', default=[],
+                            help='Endpoint path to time (repeatable; default /api/employee-ratings/).')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per endpoint and scale.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data.')
+        parser.add_argument('--max-exponent', type=float, default=None,
+                            help='Fail if an endpoint grows faster than bookings**N between two scales.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+        scales = sorted(set(options['scale'] or [0.25, 0.5, 1.0]))
+        paths = options['endpoint'] or ['/api/employee-ratings/']
+
+        from tours.models import Booking
+        timings = {path: [] for path in paths}
+        for scale in scales:
+            # Never seed the configured database; a fresh test database per scale.
+            setup_test_environment(debug=False)
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                seed(scale, options['seed'])
+                bookings = Booking.objects.count()
+                for row in run_endpoints(paths, repeat=options['repeat']):
+                    if row['status'] != 200:
+                        raise CommandError(f'{row["endpoint"]} answered {row["status"]} at scale {scale:g}.')
+                    timings[row['endpoint']].append((scale, bookings, row['queries'], row['p50_ms']))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        failures = []
+        self.stdout.write(f'{"endpoint":<40} {"scale":>6} {"bookings":>9} {"queries":>7} {"p50 ms":>9} {"exponent":>8}')
+        for path, rows in timings.items():
+            previous = None
+            for scale, bookings, queries, p50 in rows:
+                exponent = None
+                if previous and previous[1] != bookings and previous[3] > 0 and p50 > 0:
+                    exponent = math.log(p50 / previous[3]) / math.log(bookings / previous[1])
+                shown = f'{exponent:>8.2f}' if exponent is not None else f'{"":>8}'
+                self.stdout.write(f'{path:<40} {scale:>6g} {bookings:>9,} {queries:>7} {p50:>9.1f} {shown}')
+                if exponent is not None and options['max_exponent'] is not None and exponent > options['max_exponent']:
+                    failures.append(f'{path} grew as bookings**{exponent:.2f} from scale {previous[0]:g} to {scale:g}')
+                previous = (scale, bookings, queries, p50)
+        if failures:
+            raise CommandError('; '.join(failures) + '.')
@@ -0,0 +1,21 @@
+# tours/management/commands/rebuild_client_summaries.py
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from tours.models import Booking, ClientSummary, Review
+from tours.summary import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the client summaries from the bookings and reviews, e.g. after '
+        'loading data with bulkloaddata or writing with QuerySet.update().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the summaries in.')
+
+    def handle(self, *args, **options):
+        rows = rebuild_summaries(ClientSummary, Booking, Review, using=options['database'])
+        if options['verbosity'] >= 1:
+            self.stdout.write(f'Rebuilt {rows:,} client summary row(s).')
@@ -0,0 +1,21 @@
+# tours/management/commands/rebuild_co_travellers.py
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from tours.cotravel import rebuild_co_travellers
+from tours.models import Booking, CoTraveller
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the co-traveller adjacency index from the bookings, e.g. after '
+        'loading data with bulkloaddata or writing with QuerySet.update().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the index in.')
+
+    def handle(self, *args, **options):
+        rows = rebuild_co_travellers(CoTraveller, Booking, using=options['database'])
+        if options['verbosity'] >= 1:
+            self.stdout.write(f'Rebuilt {rows:,} co-traveller row(s).')
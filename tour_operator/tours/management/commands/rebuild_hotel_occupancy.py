@@ -0,0 +1,21 @@
+# tours/management/commands/rebuild_hotel_occupancy.py
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from tours.models import HotelOccupancy, TourHotel
+from tours.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the hotel occupancy rollup from stays and bookings, e.g. after '
+        'loading data with bulkloaddata or writing with QuerySet.update().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the rollup in.')
+
+    def handle(self, *args, **options):
+        rows = rebuild_occupancy(HotelOccupancy, TourHotel, using=options['database'])
+        if options['verbosity'] >= 1:
+            self.stdout.write(f'Rebuilt {rows:,} hotel occupancy row(s).')
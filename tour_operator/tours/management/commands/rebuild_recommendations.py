@@ -0,0 +1,21 @@
+# tours/management/commands/rebuild_recommendations.py
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from tours.models import Booking, Review, TourSimilarity
+from tours.recommend import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the similar-tours table behind the recommendation endpoints from '
+        'the bookings and reviews. Meant to run as a periodic batch job.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the table in.')
+
+    def handle(self, *args, **options):
+        rows = rebuild_recommendations(TourSimilarity, Booking, Review, using=options['database'])
+        if options['verbosity'] >= 1:
+            self.stdout.write(f'Rebuilt {rows:,} similar-tour row(s).')
@@ -0,0 +1,29 @@
+# tours/management/commands/rebuild_search_index.py
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError
+
+from tours.cache import bump_versions
+from tours.fulltext import SOURCES, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the full-text search index from the tours, excursions, festivals '
+        'and hotels tables in bulk, e.g. after restoring a database dump.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the index in.')
+
+    def handle(self, *args, **options):
+        try:
+            counts = rebuild_search_index(apps.get_model, using=options['database'])
+        except NotSupportedError as exc:
+            raise CommandError(str(exc))
+        # Cached search results may predate the rebuild.
+        bump_versions(*(apps.get_model(label) for _, label, *_ in SOURCES.values()))
+        if options['verbosity'] >= 1:
+            for kind, count in counts.items():
+                self.stdout.write(f'  {kind}: {count:,}')
+            self.stdout.write(f'Indexed {sum(counts.values()):,} row(s).')
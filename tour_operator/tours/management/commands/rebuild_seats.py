@@ -0,0 +1,21 @@
+# tours/management/commands/rebuild_seats.py
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from tours.capacity import recount_seats
+from tours.models import Booking, Tour
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount the seats taken on every tour from the bookings holding a seat, e.g. after '
+        'loading data with loaddata or writing with QuerySet.update().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to recount the seats in.')
+
+    def handle(self, *args, **options):
+        fixed = recount_seats(Tour, Booking, using=options['database'])
+        if options['verbosity'] >= 1:
+            self.stdout.write(f'Recounted seats, {len(fixed):,} tour(s) fixed.')
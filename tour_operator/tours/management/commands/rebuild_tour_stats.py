@@ -0,0 +1,37 @@
+# tours/management/commands/rebuild_tour_stats.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from tours.models import Booking, Review, TourExcursion, TourStats
+from tours.tourstats import check_tour_stats, rebuild_tour_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the per-tour stats from the bookings, reviews and excursions, e.g. after '
+        'loading data with bulkloaddata or writing with QuerySet.update(). With --check, '
+        'only report the tours whose stats have drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild the stats in.')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Compare the stats with the source tables without writing; fail if any tour drifted.'
+        )
+
+    def handle(self, *args, **options):
+        models = (TourStats, Booking, Review, TourExcursion)
+        if options['check']:
+            drifted = check_tour_stats(*models, using=options['database'])
+            if drifted:
+                shown = ', '.join(str(tour_id) for tour_id in drifted[:20])
+                more = f' and {len(drifted) - 20:,} more' if len(drifted) > 20 else ''
+                raise CommandError(f'Stats of {len(drifted):,} tour(s) drifted: {shown}{more}.')
+            if options['verbosity'] >= 1:
+                self.stdout.write('Tour stats are consistent.')
+            return
+
+        rows = rebuild_tour_stats(*models, using=options['database'])
+        if options['verbosity'] >= 1:
+            self.stdout.write(f'Rebuilt {rows:,} tour stats row(s).')
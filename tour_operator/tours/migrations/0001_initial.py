@@ -0,0 +1,316 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotelOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.CharField(max_length=7)),
+                ('season', models.CharField(max_length=50)),
+                ('bookings', models.IntegerField()),
+                ('avg_tour_difficulty', models.DecimalField(decimal_places=2, max_digits=5)),
+            ],
+            options={
+                'db_table': 'HotelOccupancy',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ChinaRegion',
+            fields=[
+                ('region_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Client',
+            fields=[
+                ('client_id', models.AutoField(primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('phone', models.CharField(max_length=20)),
+                ('passport_data', models.CharField(max_length=50)),
+                ('registration_date', models.DateField(auto_now_add=True)),
+                ('preferred_language', models.CharField(default='Russian', max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Employee',
+            fields=[
+                ('employee_id', models.AutoField(primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('position', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('phone', models.CharField(max_length=20)),
+                ('hire_date', models.DateField()),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Festival',
+            fields=[
+                ('festival_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('date_start', models.DateField()),
+                ('date_end', models.DateField()),
+                ('location', models.CharField(max_length=255)),
+                ('popularity', models.IntegerField()),
+                ('description', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Insurance',
+            fields=[
+                ('insurance_id', models.AutoField(primary_key=True, serialize=False)),
+                ('provider_name', models.CharField(max_length=255)),
+                ('coverage_description', models.TextField()),
+                ('price_per_day', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tour',
+            fields=[
+                ('tour_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('duration_days', models.IntegerField()),
+                ('max_participants', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('category', models.CharField(max_length=50)),
+                ('season', models.CharField(max_length=50)),
+                ('difficulty_level', models.IntegerField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('theme', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TourAgency',
+            fields=[
+                ('agency_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('comission_percent', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('contact_phone', models.CharField(max_length=20)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('specialization', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransportProvider',
+            fields=[
+                ('company_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('contact_person', models.CharField(max_length=100)),
+                ('contact_phone', models.CharField(max_length=20)),
+                ('contact_email', models.EmailField(max_length=254)),
+                ('service_type', models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VisaType',
+            fields=[
+                ('visa_type_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('processing_days', models.IntegerField()),
+                ('validity_months', models.IntegerField()),
+                ('entries_allowed', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChinaCity',
+            fields=[
+                ('city_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.chinaregion')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChineseGuide',
+            fields=[
+                ('guide_id', models.AutoField(primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('languages', models.CharField(max_length=255)),
+                ('hourly_rate', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.chinacity')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Booking',
+            fields=[
+                ('booking_id', models.AutoField(primary_key=True, serialize=False)),
+                ('booking_date', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Confirmed', 'Confirmed'), ('Cancelled', 'Cancelled'), ('Completed', 'Completed')], default='Pending', max_length=20)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('payment_status', models.CharField(choices=[('Unpaid', 'Unpaid'), ('Partial', 'Partial'), ('Paid', 'Paid')], default='Unpaid', max_length=20)),
+                ('special_requests', models.TextField(blank=True, null=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.client')),
+                ('employee', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='tours.employee')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.tour')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Excursion',
+            fields=[
+                ('excursion_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('duration_hours', models.IntegerField()),
+                ('guide_language', models.CharField(max_length=50)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('location', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='tours.chinacity')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Hotel',
+            fields=[
+                ('hotel_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('address', models.TextField()),
+                ('star_rating', models.IntegerField()),
+                ('contact_phone', models.CharField(max_length=20)),
+                ('email', models.EmailField(max_length=254)),
+                ('is_active', models.BooleanField(default=True)),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.chinacity')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('payment_id', models.AutoField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_date', models.DateTimeField()),
+                ('method', models.CharField(choices=[('Bank Transfer', 'Bank Transfer'), ('Card', 'Card'), ('Online Payment', 'Online Payment'), ('Cash', 'Cash')], max_length=50)),
+                ('transaction_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('is_deposit', models.BooleanField(default=False)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.booking')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Review',
+            fields=[
+                ('review_id', models.AutoField(primary_key=True, serialize=False)),
+                ('rating', models.IntegerField()),
+                ('comment', models.TextField()),
+                ('review_date', models.DateField()),
+                ('is_approved', models.BooleanField(default=False)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.client')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.tour')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TourExcursion',
+            fields=[
+                ('tour_excursion_id', models.AutoField(primary_key=True, serialize=False)),
+                ('schedule_datetime', models.DateTimeField()),
+                ('included_in_price', models.BooleanField(default=False)),
+                ('excursion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.excursion')),
+                ('guide', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.chineseguide')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.tour')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TourHotel',
+            fields=[
+                ('tour_hotel_id', models.AutoField(primary_key=True, serialize=False)),
+                ('check_in_date', models.DateField()),
+                ('check_out_date', models.DateField()),
+                ('room_type', models.CharField(choices=[('Standard', 'Standard'), ('Deluxe', 'Deluxe'), ('Suite', 'Suite')], max_length=50)),
+                ('meals_included', models.CharField(choices=[('Breakfast', 'Breakfast'), ('Half Board', 'Half Board'), ('Full Board', 'Full Board')], max_length=50)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.hotel')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.tour')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TourTransport',
+            fields=[
+                ('tour_transport_id', models.AutoField(primary_key=True, serialize=False)),
+                ('direction_type', models.CharField(choices=[('Departure', 'Departure'), ('Arrival', 'Arrival'), ('Intercity', 'Intercity')], max_length=50)),
+                ('departure_datetime', models.DateTimeField()),
+                ('arrival_datetime', models.DateTimeField()),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('arrival_city', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='arrival_transports', to='tours.chinacity')),
+                ('departure_city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='departure_transports', to='tours.chinacity')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.tour')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.transportprovider')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Visa',
+            fields=[
+                ('visa_id', models.AutoField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('Application', 'Application'), ('Processing', 'Processing'), ('Approved', 'Approved'), ('Rejected', 'Rejected'), ('Collected', 'Collected')], max_length=20)),
+                ('application_date', models.DateField()),
+                ('approval_date', models.DateField(blank=True, null=True)),
+                ('expiry_date', models.DateField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.client')),
+                ('visa_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.visatype')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TourFestival',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('festival', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.festival')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.tour')),
+            ],
+            options={
+                'unique_together': {('tour', 'festival')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TourRegion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('days_spent', models.IntegerField()),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.chinaregion')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.tour')),
+            ],
+            options={
+                'unique_together': {('tour', 'region')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TourToAgency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contract_start_date', models.DateField()),
+                ('contract_end_date', models.DateField(blank=True, null=True)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.touragency')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.tour')),
+            ],
+            options={
+                'unique_together': {('tour', 'agency')},
+            },
+        ),
+        migrations.CreateModel(
+            name='BookingsVisa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.booking')),
+                ('visa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.visa')),
+            ],
+            options={
+                'unique_together': {('booking', 'visa')},
+            },
+        ),
+    ]
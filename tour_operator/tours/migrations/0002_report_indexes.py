@@ -0,0 +1,80 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='client',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='tours.client'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='employee',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='tours.employee'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='tour',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='tours.tour'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='client',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='tours.client'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='tour',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='tours.tour'),
+        ),
+        migrations.AlterField(
+            model_name='tourexcursion',
+            name='tour',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='tours.tour'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['client', 'booking_date'], name='booking_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['employee', 'status'], name='booking_employee_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['tour', 'status'], name='booking_tour_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_date', 'booking_id'], name='booking_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date', 'is_deposit', 'amount'], name='payment_date_deposit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['client', 'review_date'], name='review_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['tour', 'rating'], name='review_tour_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['theme'], name='tour_theme_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tourexcursion',
+            index=models.Index(fields=['tour', 'included_in_price'], name='tourexcursion_tour_paid_idx'),
+        ),
+    ]
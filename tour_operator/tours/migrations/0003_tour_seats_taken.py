@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_seats(apps, schema_editor):
+    Tour = apps.get_model('tours', 'Tour')
+    Booking = apps.get_model('tours', 'Booking')
+    seats = Booking.objects.filter(
+        tour=OuterRef('pk'), status__in=['Pending', 'Confirmed', 'Completed']
+    ).values('tour').annotate(seats=Count('pk')).values('seats')
+    Tour.objects.update(seats_taken=Coalesce(Subquery(seats), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0002_report_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tour',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:20
+
+from django.db import migrations
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    """RunSQL that only runs on SQLite: the FTS5 index has no counterpart elsewhere."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+# Index rows are keyed ``object id * 8 + kind code`` (tours.fulltext.ROWID_STRIDE):
+# 1 tour, 2 excursion, 3 festival, 4 hotel.
+CREATE_INDEX = [
+    "CREATE VIRTUAL TABLE tours_search USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 2')",
+
+    'CREATE TRIGGER tours_search_tour_ai AFTER INSERT ON "tours_tour" BEGIN '
+    'INSERT INTO tours_search(rowid, title, body) '
+    'VALUES (new."tour_id" * 8 + 1, new."name", coalesce(new."description", \'\')); END',
+    'CREATE TRIGGER tours_search_tour_ad AFTER DELETE ON "tours_tour" BEGIN '
+    'DELETE FROM tours_search WHERE rowid = old."tour_id" * 8 + 1; END',
+    'CREATE TRIGGER tours_search_tour_au AFTER UPDATE OF "tour_id", "name", "description" ON "tours_tour" BEGIN '
+    'DELETE FROM tours_search WHERE rowid = old."tour_id" * 8 + 1; '
+    'INSERT INTO tours_search(rowid, title, body) '
+    'VALUES (new."tour_id" * 8 + 1, new."name", coalesce(new."description", \'\')); END',
+    'INSERT INTO tours_search(rowid, title, body) '
+    'SELECT "tours_tour"."tour_id" * 8 + 1, "name", coalesce("description", \'\') FROM "tours_tour"',
+
+    'CREATE TRIGGER tours_search_excursion_ai AFTER INSERT ON "tours_excursion" BEGIN '
+    'INSERT INTO tours_search(rowid, title, body) '
+    'VALUES (new."excursion_id" * 8 + 2, new."name", coalesce(new."description", \'\')); END',
+    'CREATE TRIGGER tours_search_excursion_ad AFTER DELETE ON "tours_excursion" BEGIN '
+    'DELETE FROM tours_search WHERE rowid = old."excursion_id" * 8 + 2; END',
+    'CREATE TRIGGER tours_search_excursion_au AFTER UPDATE OF "excursion_id", "name", "description" '
+    'ON "tours_excursion" BEGIN '
+    'DELETE FROM tours_search WHERE rowid = old."excursion_id" * 8 + 2; '
+    'INSERT INTO tours_search(rowid, title, body) '
+    'VALUES (new."excursion_id" * 8 + 2, new."name", coalesce(new."description", \'\')); END',
+    'INSERT INTO tours_search(rowid, title, body) '
+    'SELECT "tours_excursion"."excursion_id" * 8 + 2, "name", coalesce("description", \'\') FROM "tours_excursion"',
+
+    'CREATE TRIGGER tours_search_festival_ai AFTER INSERT ON "tours_festival" BEGIN '
+    'INSERT INTO tours_search(rowid, title, body) '
+    'VALUES (new."festival_id" * 8 + 3, new."name", coalesce(new."description", \'\')); END',
+    'CREATE TRIGGER tours_search_festival_ad AFTER DELETE ON "tours_festival" BEGIN '
+    'DELETE FROM tours_search WHERE rowid = old."festival_id" * 8 + 3; END',
+    'CREATE TRIGGER tours_search_festival_au AFTER UPDATE OF "festival_id", "name", "description" '
+    'ON "tours_festival" BEGIN '
+    'DELETE FROM tours_search WHERE rowid = old."festival_id" * 8 + 3; '
+    'INSERT INTO tours_search(rowid, title, body) '
+    'VALUES (new."festival_id" * 8 + 3, new."name", coalesce(new."description", \'\')); END',
+    'INSERT INTO tours_search(rowid, title, body) '
+    'SELECT "tours_festival"."festival_id" * 8 + 3, "name", coalesce("description", \'\') FROM "tours_festival"',
+
+    'CREATE TRIGGER tours_search_hotel_ai AFTER INSERT ON "tours_hotel" BEGIN '
+    'INSERT INTO tours_search(rowid, title, body) '
+    'VALUES (new."hotel_id" * 8 + 4, new."name", coalesce(new."address", \'\')); END',
+    'CREATE TRIGGER tours_search_hotel_ad AFTER DELETE ON "tours_hotel" BEGIN '
+    'DELETE FROM tours_search WHERE rowid = old."hotel_id" * 8 + 4; END',
+    'CREATE TRIGGER tours_search_hotel_au AFTER UPDATE OF "hotel_id", "name", "address" ON "tours_hotel" BEGIN '
+    'DELETE FROM tours_search WHERE rowid = old."hotel_id" * 8 + 4; '
+    'INSERT INTO tours_search(rowid, title, body) '
+    'VALUES (new."hotel_id" * 8 + 4, new."name", coalesce(new."address", \'\')); END',
+    'INSERT INTO tours_search(rowid, title, body) '
+    'SELECT "tours_hotel"."hotel_id" * 8 + 4, "name", coalesce("address", \'\') FROM "tours_hotel"',
+]
+
+DROP_INDEX = [
+    f'DROP TRIGGER IF EXISTS tours_search_{kind}_{suffix}'
+    for kind in ('tour', 'excursion', 'festival', 'hotel') for suffix in ('ai', 'ad', 'au')
+] + ['DROP TABLE IF EXISTS tours_search']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0004_tour_search_indexes'),
+    ]
+
+    operations = [
+        SQLiteRunSQL(CREATE_INDEX, DROP_INDEX),
+    ]
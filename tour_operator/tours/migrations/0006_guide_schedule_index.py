@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tourexcursion',
+            index=models.Index(fields=['guide', 'schedule_datetime'], name='tourexcursion_guide_time_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:25
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+SEASONS = {
+    12: 'Winter', 1: 'Winter', 2: 'Winter',
+    3: 'Spring', 4: 'Spring', 5: 'Spring',
+    6: 'Summer', 7: 'Summer', 8: 'Summer',
+    9: 'Autumn', 10: 'Autumn', 11: 'Autumn',
+}
+
+
+def fill_occupancy(apps, schema_editor):
+    HotelOccupancy = apps.get_model('tours', 'HotelOccupancy')
+    TourHotel = apps.get_model('tours', 'TourHotel')
+    seats = Q(tour__booking__status__in=['Pending', 'Confirmed', 'Completed'])
+    totals = {}
+    for hotel_id, check_in, bookings, difficulty in TourHotel.objects.values_list(
+        'hotel_id', 'check_in_date'
+    ).annotate(
+        bookings=Count('tour__booking', filter=seats),
+        difficulty=Sum('tour__difficulty_level', filter=seats),
+    ).order_by():
+        total = totals.setdefault((hotel_id, f'{check_in.year:04d}-{check_in.month:02d}'), [0, 0])
+        total[0] += bookings
+        total[1] += difficulty or 0
+    HotelOccupancy.objects.bulk_create([
+        HotelOccupancy(
+            hotel_id=hotel_id, month=month, season=SEASONS[int(month[5:])], bookings=bookings,
+            difficulty_total=difficulty,
+            avg_tour_difficulty=(Decimal(difficulty) / bookings).quantize(Decimal('0.01')),
+        )
+        for (hotel_id, month), (bookings, difficulty) in sorted(totals.items()) if bookings
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0006_guide_schedule_index'),
+    ]
+
+    operations = [
+        # The unmanaged model had no table; replace it with a managed one.
+        migrations.DeleteModel(
+            name='HotelOccupancy',
+        ),
+        migrations.CreateModel(
+            name='HotelOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.CharField(max_length=7)),
+                ('season', models.CharField(max_length=50)),
+                ('bookings', models.IntegerField(default=0)),
+                ('difficulty_total', models.IntegerField(default=0)),
+                ('avg_tour_difficulty', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('hotel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tours.hotel')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'hotel'], name='hoteloccupancy_month_idx')],
+                'unique_together': {('hotel', 'month')},
+            },
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
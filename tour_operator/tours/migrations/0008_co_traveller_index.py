@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:26
+
+from collections import Counter, defaultdict
+from itertools import combinations
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_co_travellers(apps, schema_editor):
+    Booking = apps.get_model('tours', 'Booking')
+    CoTraveller = apps.get_model('tours', 'CoTraveller')
+    members = defaultdict(set)
+    for tour_id, client_id in Booking.objects.filter(
+        status__in=['Pending', 'Confirmed', 'Completed']
+    ).values_list('tour_id', 'client_id').distinct().order_by():
+        members[tour_id].add(client_id)
+    shared = Counter()
+    for clients in members.values():
+        for pair in combinations(sorted(clients), 2):
+            shared[pair] += 1
+    CoTraveller.objects.bulk_create((
+        CoTraveller(client_id=a, other_id=b, shared_tours=count)
+        for (client_id, other_id), count in sorted(shared.items())
+        for a, b in ((client_id, other_id), (other_id, client_id))
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0007_hotel_occupancy_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoTraveller',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shared_tours', models.PositiveIntegerField()),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_travellers', to='tours.client')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tours.client')),
+            ],
+            options={
+                'unique_together': {('client', 'other')},
+            },
+        ),
+        migrations.RunPython(fill_co_travellers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0008_co_traveller_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TourSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tours.tour')),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_tours', to='tours.tour')),
+            ],
+            options={
+                'unique_together': {('tour', 'other')},
+            },
+        ),
+    ]
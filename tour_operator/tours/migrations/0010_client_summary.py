@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_client_summaries(apps, schema_editor):
+    Booking = apps.get_model('tours', 'Booking')
+    Review = apps.get_model('tours', 'Review')
+    ClientSummary = apps.get_model('tours', 'ClientSummary')
+    rows = {}
+    for client_id, booking_date, tour_id in Booking.objects.order_by(
+        'client_id', '-booking_date', '-pk'
+    ).values_list('client_id', 'booking_date', 'tour_id'):
+        if client_id in rows:
+            rows[client_id].total_bookings += 1
+        else:
+            rows[client_id] = ClientSummary(
+                client_id=client_id, total_bookings=1, last_booking_date=booking_date, last_tour_id=tour_id,
+            )
+    for client_id, review_id, review_date in Review.objects.order_by(
+        'client_id', '-review_date', '-pk'
+    ).values_list('client_id', 'pk', 'review_date'):
+        row = rows.get(client_id)
+        if row is not None and row.last_review_id is None:
+            row.last_review_id = review_id
+            row.last_review_date = review_date
+    ClientSummary.objects.bulk_create([rows[client_id] for client_id in sorted(rows)], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0009_tour_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientSummary',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='tours.client')),
+                ('total_bookings', models.PositiveIntegerField()),
+                ('last_booking_date', models.DateTimeField()),
+                ('last_review_date', models.DateField(null=True)),
+                ('last_review', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tours.review')),
+                ('last_tour', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tours.tour')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_booking_date', 'client'], name='clientsummary_last_booking_idx'), models.Index(fields=['total_bookings', 'client'], name='clientsummary_bookings_idx')],
+            },
+        ),
+        migrations.RunPython(fill_client_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_tour_stats(apps, schema_editor):
+    Booking = apps.get_model('tours', 'Booking')
+    Review = apps.get_model('tours', 'Review')
+    TourExcursion = apps.get_model('tours', 'TourExcursion')
+    TourStats = apps.get_model('tours', 'TourStats')
+    stats = {}
+    for tour_id, bookings, revenue in Booking.objects.filter(
+        status__in=['Pending', 'Confirmed', 'Completed']
+    ).values_list('tour_id').annotate(bookings=Count('pk'), revenue=Sum('total_price')).order_by():
+        stats.setdefault(tour_id, {}).update(bookings=bookings, revenue=revenue)
+    for tour_id, reviews, rating_total in Review.objects.values_list('tour_id').annotate(
+        reviews=Count('pk'), rating_total=Sum('rating')
+    ).order_by():
+        stats.setdefault(tour_id, {}).update(reviews=reviews, rating_total=rating_total)
+    for tour_id, total, paid in TourExcursion.objects.values_list('tour_id').annotate(
+        total=Count('pk'), paid=Count('pk', filter=Q(included_in_price=False))
+    ).order_by():
+        stats.setdefault(tour_id, {}).update(total_excursions=total, paid_excursions=paid)
+    TourStats.objects.bulk_create(
+        [TourStats(tour_id=tour_id, **fields) for tour_id, fields in sorted(stats.items())], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0010_client_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TourStats',
+            fields=[
+                ('tour', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='tours.tour')),
+                ('bookings', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('reviews', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.IntegerField(default=0)),
+                ('total_excursions', models.PositiveIntegerField(default=0)),
+                ('paid_excursions', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_tour_stats, migrations.RunPython.noop),
+    ]
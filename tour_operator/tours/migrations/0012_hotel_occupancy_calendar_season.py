@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0011_tour_stats'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='hoteloccupancy',
+            old_name='season',
+            new_name='calendar_season',
+        ),
+    ]
@@ -1,5 +1,11 @@
 # tours/models.py
-from django.db import models
+from django.db import models, router, transaction
+
+from .capacity import apply_seat_deltas, seat_deltas
+from .cotravel import apply_pair_deltas, pair_deltas
+from .occupancy import apply_occupancy_deltas, booking_deltas, difficulty_deltas, stay_deltas
+from .summary import record_booking, record_review, refresh_summaries
+from .tourstats import apply_stat_deltas, booking_stat_deltas, excursion_stat_deltas, review_stat_deltas
 
 
 class Client(models.Model):
@@ -38,6 +44,8 @@ class Tour(models.Model):
     end_date = models.DateField()
     duration_days = models.IntegerField()
     max_participants = models.IntegerField()
+    # Bookings holding a seat, kept by tours.capacity as bookings change.
+    seats_taken = models.PositiveIntegerField(default=0, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=50)  # Adventure, Cultural, VIP etc.
     season = models.CharField(max_length=50)
@@ -45,9 +53,48 @@ class Tour(models.Model):
     is_active = models.BooleanField(default=True)
     theme = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['theme'], name='tour_theme_idx'),
+            # tour search: active tours by date window or price, keyset order
+            models.Index(
+                fields=['start_date', 'tour_id'], condition=models.Q(is_active=True), name='tour_active_start_idx'
+            ),
+            models.Index(
+                fields=['price', 'tour_id'], condition=models.Q(is_active=True), name='tour_active_price_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        # seats_taken is moved by tours.capacity under the row lock; writing
+        # back the value held here would undo the bookings since it was read.
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        kwargs['update_fields'] = [name for name in update_fields if name != 'seats_taken']
+        if 'difficulty_level' not in kwargs['update_fields']:
+            return super().save(*args, **kwargs)
+
+        # Hotel occupancy averages the difficulty of the tours booked.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            before = type(self)._base_manager.using(using).select_for_update().filter(
+                pk=self.pk
+            ).values_list('difficulty_level', 'seats_taken').first()
+            if before is not None:
+                self.seats_taken = before[1]
+            if before is not None and before[0] != self.difficulty_level and before[1]:
+                apply_occupancy_deltas(HotelOccupancy, difficulty_deltas(
+                    TourHotel, self.pk, before[1], self.difficulty_level - before[0], using=using
+                ), using=using)
+            super().save(*args, **kwargs)
+
 
 class Booking(models.Model):
     STATUS_CHOICES = [
@@ -63,9 +110,9 @@ class Booking(models.Model):
     ]
 
     booking_id = models.AutoField(primary_key=True)
-    client = models.ForeignKey(Client, on_delete=models.CASCADE)
-    tour = models.ForeignKey(Tour, on_delete=models.CASCADE)
-    employee = models.ForeignKey(Employee, on_delete=models.SET_NULL, null=True)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, db_index=False)
+    tour = models.ForeignKey(Tour, on_delete=models.CASCADE, db_index=False)
+    employee = models.ForeignKey(Employee, on_delete=models.SET_NULL, null=True, db_index=False)
     booking_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -73,9 +120,52 @@ class Booking(models.Model):
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='Unpaid')
     special_requests = models.TextField(blank=True, null=True)
 
+    class Meta:
+        # The composite indexes lead with the foreign keys, so those need no
+        # index of their own.
+        indexes = [
+            # last booking per client, bookings of a client by date
+            models.Index(fields=['client', 'booking_date'], name='booking_client_date_idx'),
+            # per-agent totals and confirmed counts
+            models.Index(fields=['employee', 'status'], name='booking_employee_status_idx'),
+            # non-cancelled bookings per tour
+            models.Index(fields=['tour', 'status'], name='booking_tour_status_idx'),
+            # keyset pagination by booking date
+            models.Index(fields=['booking_date', 'booking_id'], name='booking_date_idx'),
+        ]
+
     def __str__(self):
         return f"Booking {self.booking_id} by {self.client}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        watched = {'client', 'client_id', 'tour', 'tour_id', 'status', 'total_price'}
+        if update_fields is not None and not watched & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        # Take or give back the seat in the transaction that writes the row,
+        # reading the stored state under a row lock.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            before = None
+            if not self._state.adding:
+                before = type(self)._base_manager.using(using).select_for_update().filter(
+                    pk=self.pk
+                ).values_list('client_id', 'tour_id', 'status', 'total_price').first()
+            after = (self.client_id, self.tour_id, self.status, self.total_price)
+            deltas = seat_deltas([(before and before[1:3], after[1:3])])
+            apply_seat_deltas(Tour, deltas, using=using)
+            apply_occupancy_deltas(HotelOccupancy, booking_deltas(TourHotel, deltas, using=using), using=using)
+            apply_pair_deltas(
+                CoTraveller, pair_deltas(type(self), [(before and before[:3], after[:3])], using=using), using=using
+            )
+            apply_stat_deltas(TourStats, booking_stat_deltas([(before and before[1:], after[1:])]), using=using)
+            super().save(*args, **kwargs)
+            if before is None:
+                record_booking(ClientSummary, Review, self, using=using)
+            elif before[:2] != after[:2]:
+                refresh_summaries(ClientSummary, type(self), Review, {before[0], self.client_id}, using=using)
+
 
 class VisaType(models.Model):
     visa_type_id = models.AutoField(primary_key=True)
@@ -206,13 +296,45 @@ class Insurance(models.Model):
 
 class Review(models.Model):
     review_id = models.AutoField(primary_key=True)
-    client = models.ForeignKey(Client, on_delete=models.CASCADE)
-    tour = models.ForeignKey(Tour, on_delete=models.CASCADE)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, db_index=False)
+    tour = models.ForeignKey(Tour, on_delete=models.CASCADE, db_index=False)
     rating = models.IntegerField()
     comment = models.TextField()
     review_date = models.DateField()
     is_approved = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # last review per client
+            models.Index(fields=['client', 'review_date'], name='review_client_date_idx'),
+            # average rating per tour, answered from the index alone
+            models.Index(fields=['tour', 'rating'], name='review_tour_rating_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        watched = {'client', 'client_id', 'review_date', 'tour', 'tour_id', 'rating'}
+        if update_fields is not None and not watched & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        # Keep the client summaries' last review and the tour's rating in the
+        # same transaction.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            before = None
+            if not self._state.adding:
+                before = type(self)._base_manager.using(using).select_for_update().filter(
+                    pk=self.pk
+                ).values_list('client_id', 'review_date', 'tour_id', 'rating').first()
+            apply_stat_deltas(
+                TourStats, review_stat_deltas([(before and before[2:], (self.tour_id, self.rating))]), using=using
+            )
+            super().save(*args, **kwargs)
+            if before is None:
+                record_review(ClientSummary, self, using=using)
+            elif before[:2] != (self.client_id, self.review_date):
+                refresh_summaries(ClientSummary, Booking, type(self), {before[0], self.client_id}, using=using)
+
     def __str__(self):
         return f"Review {self.review_id} by {self.client}"
 
@@ -245,6 +367,13 @@ class Payment(models.Model):
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
     is_deposit = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Payment analytics scan a payment_date range and read only
+            # is_deposit and amount, so this index covers the whole query.
+            models.Index(fields=['payment_date', 'is_deposit', 'amount'], name='payment_date_deposit_idx'),
+        ]
+
     def __str__(self):
         return f"Payment {self.payment_id} for booking {self.booking}"
 
@@ -259,15 +388,40 @@ class BookingsVisa(models.Model):
 
 class TourExcursion(models.Model):
     tour_excursion_id = models.AutoField(primary_key=True)
-    tour = models.ForeignKey(Tour, on_delete=models.CASCADE)
+    tour = models.ForeignKey(Tour, on_delete=models.CASCADE, db_index=False)
     excursion = models.ForeignKey(Excursion, on_delete=models.CASCADE)
     guide = models.ForeignKey(ChineseGuide, on_delete=models.CASCADE)
     schedule_datetime = models.DateTimeField()
     included_in_price = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # paid vs included excursions per tour
+            models.Index(fields=['tour', 'included_in_price'], name='tourexcursion_tour_paid_idx'),
+            # a guide's schedule, for conflict checks
+            models.Index(fields=['guide', 'schedule_datetime'], name='tourexcursion_guide_time_idx'),
+        ]
+
     def __str__(self):
         return f"{self.tour.name} - {self.excursion.name}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'tour', 'tour_id', 'included_in_price'} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        # Paid vs included excursion counts of the tour stats.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            before = None
+            if not self._state.adding:
+                before = type(self)._base_manager.using(using).select_for_update().filter(
+                    pk=self.pk
+                ).values_list('tour_id', 'included_in_price').first()
+            after = (self.tour_id, self.included_in_price)
+            apply_stat_deltas(TourStats, excursion_stat_deltas([(before, after)]), using=using)
+            super().save(*args, **kwargs)
+
 
 class TourFestival(models.Model):
     tour = models.ForeignKey(Tour, on_delete=models.CASCADE)
@@ -300,6 +454,23 @@ class TourHotel(models.Model):
     def __str__(self):
         return f"{self.tour.name} - {self.hotel.name}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        stay_fields = {'tour', 'tour_id', 'hotel', 'hotel_id', 'check_in_date'}
+        if update_fields is not None and not stay_fields & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            before = None
+            if not self._state.adding:
+                before = type(self)._base_manager.using(using).select_for_update().filter(
+                    pk=self.pk
+                ).values_list('tour_id', 'hotel_id', 'check_in_date').first()
+            after = (self.tour_id, self.hotel_id, self.check_in_date)
+            apply_occupancy_deltas(HotelOccupancy, stay_deltas(Tour, [(before, after)], using=using), using=using)
+            super().save(*args, **kwargs)
+
 
 class TourRegion(models.Model):
     tour = models.ForeignKey(Tour, on_delete=models.CASCADE)
@@ -342,12 +513,87 @@ class TourTransport(models.Model):
 
 
 class HotelOccupancy(models.Model):
+    """
+    Bookings per hotel and month (of check-in), from the stays of the tours
+    booked. Kept up to date by tours.occupancy as bookings, stays and tour
+    difficulty change; ``rebuild_occupancy`` recomputes it.
+    """
     hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE)
-    month = models.CharField(max_length=7)
-    season = models.CharField(max_length=50)
-    bookings = models.IntegerField()
-    avg_tour_difficulty = models.DecimalField(max_digits=5, decimal_places=2)
+    month = models.CharField(max_length=7)  # YYYY-MM
+    calendar_season = models.CharField(max_length=50)  # of the month, see tours.occupancy
+    bookings = models.IntegerField(default=0)
+    difficulty_total = models.IntegerField(default=0)
+    avg_tour_difficulty = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = (('hotel', 'month'),)
+        indexes = [
+            # occupancy of every hotel over a range of months
+            models.Index(fields=['month', 'hotel'], name='hoteloccupancy_month_idx'),
+        ]
+
+
+class CoTraveller(models.Model):
+    """
+    Adjacency index of the co-traveller graph: one row per ordered pair of
+    clients holding a seat on at least one common tour. Kept up to date by
+    tours.cotravel as bookings change; ``rebuild_co_travellers`` recomputes it.
+    """
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='co_travellers')
+    other = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='+')
+    shared_tours = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = (('client', 'other'),)
+
+
+class TourSimilarity(models.Model):
+    """
+    Tours most often booked and liked by the same clients: the ``TOP_K``
+    nearest neighbours of each tour by item-item cosine similarity.
+    Precomputed in a batch by ``rebuild_recommendations``.
+    """
+    tour = models.ForeignKey(Tour, on_delete=models.CASCADE, related_name='similar_tours')
+    other = models.ForeignKey(Tour, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = (('tour', 'other'),)
+
+
+class ClientSummary(models.Model):
+    """
+    Last activity of every client with bookings, kept up to date by
+    tours.summary as bookings and reviews change; ``rebuild_client_summaries``
+    recomputes it. The last rating and comment are read through
+    ``last_review``.
+    """
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    total_bookings = models.PositiveIntegerField()
+    last_booking_date = models.DateTimeField()
+    last_tour = models.ForeignKey(Tour, on_delete=models.SET_NULL, null=True, related_name='+')
+    last_review = models.ForeignKey(Review, on_delete=models.SET_NULL, null=True, related_name='+')
+    last_review_date = models.DateField(null=True)
 
     class Meta:
-        managed = False
-        db_table = 'HotelOccupancy'
\ No newline at end of file
+        indexes = [
+            # client list sort keys, keyset order
+            models.Index(fields=['last_booking_date', 'client'], name='clientsummary_last_booking_idx'),
+            models.Index(fields=['total_bookings', 'client'], name='clientsummary_bookings_idx'),
+        ]
+
+
+class TourStats(models.Model):
+    """
+    Per-tour counters behind the tour reports: seat-holding bookings and
+    their revenue, reviews and their rating total, excursions and the paid
+    ones. Moved by ``F()`` deltas by tours.tourstats as bookings, reviews
+    and excursions change; ``rebuild_tour_stats`` checks or recomputes them.
+    """
+    tour = models.OneToOneField(Tour, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    bookings = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    reviews = models.PositiveIntegerField(default=0)
+    rating_total = models.IntegerField(default=0)
+    total_excursions = models.PositiveIntegerField(default=0)
+    paid_excursions = models.PositiveIntegerField(default=0)
@@ -0,0 +1,171 @@
+# tours/occupancy.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from .cache import bump_versions
+from .capacity import SEAT_STATUSES
+
+
+# Season of the calendar month, not Tour.season (the app's own High/Low/...).
+CALENDAR_SEASONS = {
+    12: 'Winter', 1: 'Winter', 2: 'Winter',
+    3: 'Spring', 4: 'Spring', 5: 'Spring',
+    6: 'Summer', 7: 'Summer', 8: 'Summer',
+    9: 'Autumn', 10: 'Autumn', 11: 'Autumn',
+}
+
+
+def month_of(day):
+    return f'{day.year:04d}-{day.month:02d}'
+
+
+def calendar_season_of(month):
+    return CALENDAR_SEASONS[int(month[5:7])]
+
+
+def average(difficulty_total, bookings):
+    return (Decimal(difficulty_total) / bookings).quantize(Decimal('0.01')) if bookings else Decimal('0.00')
+
+
+def booking_deltas(tour_hotel_model, seat_deltas, using=None):
+    """
+    Occupancy deltas ``{(hotel_id, month): [bookings, difficulty total]}``
+    for ``{tour_id: change in seats taken}``: each stay of the tour gains or
+    loses that many bookings in the month of its check-in.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    if not seat_deltas:
+        return deltas
+    for tour_id, hotel_id, check_in, difficulty in tour_hotel_model._base_manager.using(using).filter(
+        tour_id__in=list(seat_deltas)
+    ).values_list('tour_id', 'hotel_id', 'check_in_date', 'tour__difficulty_level'):
+        delta = deltas[hotel_id, month_of(check_in)]
+        delta[0] += seat_deltas[tour_id]
+        delta[1] += seat_deltas[tour_id] * difficulty
+    return deltas
+
+
+def stay_deltas(tour_model, changes, using=None):
+    """
+    Occupancy deltas for ``(before, after)`` pairs of ``(tour_id, hotel_id,
+    check_in_date)`` stay states, ``None`` for a missing side. A stay counts
+    the seats taken on its tour.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    tour_ids = {state[0] for change in changes for state in change if state is not None}
+    if not tour_ids:
+        return deltas
+    tours = {
+        tour_id: (seats, difficulty)
+        for tour_id, seats, difficulty in tour_model._base_manager.using(using).filter(
+            pk__in=tour_ids
+        ).values_list('pk', 'seats_taken', 'difficulty_level')
+    }
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None or state[0] not in tours:
+                continue
+            tour_id, hotel_id, check_in = state
+            seats, difficulty = tours[tour_id]
+            delta = deltas[hotel_id, month_of(check_in)]
+            delta[0] += sign * seats
+            delta[1] += sign * seats * difficulty
+    return deltas
+
+
+def difficulty_deltas(tour_hotel_model, tour_id, seats, change, using=None):
+    """Occupancy deltas for the difficulty of a tour with ``seats`` taken moving by ``change``."""
+    deltas = defaultdict(lambda: [0, 0])
+    for hotel_id, check_in in tour_hotel_model._base_manager.using(using).filter(
+        tour_id=tour_id
+    ).values_list('hotel_id', 'check_in_date'):
+        deltas[hotel_id, month_of(check_in)][1] += seats * change
+    return deltas
+
+
+def apply_occupancy_deltas(occupancy_model, deltas, using=None):
+    """
+    Move the rollup rows by ``deltas`` with one ``UPDATE`` of the counters
+    per (hotel, month), creating the rows a positive delta needs and dropping
+    the ones left without bookings. Call it inside the transaction that
+    makes the change.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    rows = occupancy_model._base_manager.using(using)
+    emptied = set()
+    for hotel_id, month in sorted(deltas):
+        bookings, difficulty = deltas[hotel_id, month]
+        if not _add(rows, hotel_id, month, bookings, difficulty) and bookings > 0:
+            # A stay removed together with its hotel has no row left to
+            # update; only positive deltas create rows.
+            try:
+                with transaction.atomic(using=using):
+                    rows.create(
+                        hotel_id=hotel_id, month=month, calendar_season=calendar_season_of(month), bookings=bookings,
+                        difficulty_total=difficulty, avg_tour_difficulty=average(difficulty, bookings),
+                    )
+            except IntegrityError:
+                # created concurrently: add to it instead
+                _add(rows, hotel_id, month, bookings, difficulty)
+        if bookings < 0:
+            emptied.add(hotel_id)
+    if emptied:
+        rows.filter(hotel_id__in=emptied, bookings__lte=0).delete()
+
+    # QuerySet.update() sends no post_save.
+    bump_versions(occupancy_model)
+    transaction.on_commit(lambda: bump_versions(occupancy_model), using=using)
+
+
+def _add(rows, hotel_id, month, bookings, difficulty):
+    new_bookings = F('bookings') + bookings
+    new_total = F('difficulty_total') + difficulty
+    return rows.filter(hotel_id=hotel_id, month=month).update(
+        bookings=new_bookings,
+        difficulty_total=new_total,
+        avg_tour_difficulty=Case(
+            When(bookings__gt=-bookings, then=Cast(new_total, FloatField()) / new_bookings),
+            default=Value(0), output_field=DecimalField(max_digits=5, decimal_places=2),
+        ),
+    )
+
+
+def rebuild_occupancy(occupancy_model, tour_hotel_model, using=None):
+    """
+    Recompute every rollup row from the stays and the bookings holding a seat
+    on their tour, in one grouped query. Returns the number of rows.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    seats = Q(tour__booking__status__in=SEAT_STATUSES)
+    for hotel_id, check_in, bookings, difficulty in tour_hotel_model._base_manager.using(using).values_list(
+        'hotel_id', 'check_in_date'
+    ).annotate(
+        bookings=Count('tour__booking', filter=seats),
+        difficulty=Sum('tour__difficulty_level', filter=seats),
+    ).order_by():
+        total = totals[hotel_id, month_of(check_in)]
+        total[0] += bookings
+        total[1] += difficulty or 0
+
+    rows = [
+        occupancy_model(
+            hotel_id=hotel_id, month=month, calendar_season=calendar_season_of(month), bookings=bookings,
+            difficulty_total=difficulty, avg_tour_difficulty=average(difficulty, bookings),
+        )
+        for (hotel_id, month), (bookings, difficulty) in sorted(totals.items()) if bookings
+    ]
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    with transaction.atomic(using=using):
+        # one statement, without loading the rows for delete signals
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(occupancy_model._meta.db_table)}')
+        occupancy_model._base_manager.using(using).bulk_create(rows, batch_size=1000)
+        bump_versions(occupancy_model)
+        transaction.on_commit(lambda: bump_versions(occupancy_model), using=using)
+    return len(rows)
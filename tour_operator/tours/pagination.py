@@ -0,0 +1,226 @@
+# tours/pagination.py
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination keyed on the primary key.
+
+    A viewset may declare ``ordering`` (default sort keys, e.g.
+    ``('-booking_date',)``) and ``ordering_fields`` (keys a client may pick
+    with ``?ordering=``). The primary key is always appended as the last key,
+    so every row has a unique position and the cursor is simply the sort-key
+    values of the last row served. Pages are fetched with a
+    ``WHERE (keys) > (cursor)`` filter and no COUNT(*), so a deep page costs
+    the same as the first one.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', None)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [self._get_field(queryset.model, key) for key in self.ordering]
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        ordering = self._flip(self.ordering) if reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self._seek_filter(ordering, cursor['values']))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+        if getattr(view, 'ordering_fields', None):
+            parameters.append({
+                'name': self.ordering_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Sort key: one of {}, optionally prefixed with "-".'.format(
+                    ', '.join(view.ordering_fields)
+                ),
+                'schema': {'type': 'string'},
+            })
+        return parameters
+
+    def get_page_size(self, request):
+        page_size = self.page_size
+        if self.page_size_query_param in request.query_params:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except (TypeError, ValueError):
+                pass
+            else:
+                page_size = max(page_size, 1)
+        if page_size and self.max_page_size:
+            page_size = min(page_size, self.max_page_size)
+        return page_size
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(getattr(view, 'ordering', None) or ())
+        requested = request.query_params.get(self.ordering_query_param)
+        if requested:
+            allowed = getattr(view, 'ordering_fields', None) or ()
+            if requested.lstrip('-') in allowed:
+                ordering = [requested]
+
+        pk_name = queryset.model._meta.pk.name
+        ordering = [key for key in ordering if key.lstrip('-') != pk_name]
+        descending = bool(ordering) and ordering[0].startswith('-')
+        ordering.append('-' + pk_name if descending else pk_name)
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            return self.encode_cursor(self.page[-1], reverse=False)
+        return None
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            return self.encode_cursor(self.page[0], reverse=True)
+        return None
+
+    def encode_cursor(self, row, reverse):
+        payload = {
+            'o': self.ordering,
+            'v': [self._cursor_value(row, field) for field in self.fields],
+        }
+        if reverse:
+            payload['r'] = 1
+        token = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        ).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+            if payload['o'] != self.ordering or len(payload['v']) != len(self.fields):
+                raise ValueError
+            values = [
+                field.to_python(value)
+                for field, value in zip(self.fields, payload['v'])
+            ]
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return {'values': values, 'reverse': bool(payload.get('r'))}
+
+    @staticmethod
+    def _cursor_value(row, field):
+        # Pages hold model instances or, on the fast list path, values() dicts.
+        if isinstance(row, dict):
+            value = row[field.attname]
+        else:
+            value = field.value_from_object(row)
+        return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+    @staticmethod
+    def _flip(ordering):
+        return [key[1:] if key.startswith('-') else '-' + key for key in ordering]
+
+    @staticmethod
+    def _seek_filter(ordering, values):
+        # (a, b, pk) > (x, y, z)  <=>  a > x OR (a = x AND b > y) OR (a = x AND b = y AND pk > z)
+        condition = Q()
+        equal = {}
+        for key, value in zip(ordering, values):
+            name = key.lstrip('-')
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    @staticmethod
+    def _get_field(model, key):
+        name = key.lstrip('-')
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(
+                f'Cannot paginate {model.__name__} by "{name}": no such field.'
+            )
+        if not field.concrete or field.null:
+            raise ImproperlyConfigured(
+                f'Cannot paginate {model.__name__} by "{name}": '
+                'keyset ordering needs a concrete, non-nullable column.'
+            )
+        return field
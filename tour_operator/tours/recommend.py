@@ -0,0 +1,115 @@
+# tours/recommend.py
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Avg
+
+from .cache import bump_versions
+from .capacity import SEAT_STATUSES
+
+
+# Similar tours kept per tour.
+TOP_K = 20
+
+# A seat-holding booking weighs BOOKED_WEIGHT; a review moves it by half a
+# point per star away from NEUTRAL_RATING, so a 1-star tour weighs nothing.
+BOOKED_WEIGHT = 1.0
+NEUTRAL_RATING = 3
+
+
+def interactions(booking_model, review_model, client_ids=None, using=None):
+    """
+    Sparse client x tour matrix ``{client_id: {tour_id: weight}}`` from the
+    seat-holding bookings and the average rating of each client's reviews,
+    in two queries. Zero weights are left out.
+    """
+    bookings = booking_model._base_manager.using(using).filter(status__in=SEAT_STATUSES)
+    reviews = review_model._base_manager.using(using).all()
+    if client_ids is not None:
+        bookings = bookings.filter(client_id__in=client_ids)
+        reviews = reviews.filter(client_id__in=client_ids)
+
+    matrix = defaultdict(dict)
+    for client_id, tour_id in bookings.values_list('client_id', 'tour_id').distinct().order_by():
+        matrix[client_id][tour_id] = BOOKED_WEIGHT
+    for client_id, tour_id, rating in reviews.values_list('client_id', 'tour_id').annotate(
+        rating=Avg('rating')
+    ).order_by():
+        # a review means the client travelled, booked here or not
+        matrix[client_id][tour_id] = BOOKED_WEIGHT + (rating - NEUTRAL_RATING) / 2
+
+    return {
+        client_id: {tour_id: weight for tour_id, weight in tours.items() if weight > 0}
+        for client_id, tours in matrix.items()
+    }
+
+
+def similar_tours(matrix, top_k=TOP_K):
+    """
+    Cosine similarity between the tour columns of ``matrix``, as
+    ``{tour_id: [(other_id, score), ...]}`` best first, ``top_k`` per tour.
+
+    Only co-occurring pairs are visited: each client row adds its weight
+    products to the dot products of the tours it holds, so the cost is the
+    sum of the squared row lengths rather than tours squared.
+    """
+    norms = defaultdict(float)
+    dots = defaultdict(float)
+    for tours in matrix.values():
+        row = sorted(tours.items())
+        for index, (tour_id, weight) in enumerate(row):
+            norms[tour_id] += weight * weight
+            for other_id, other_weight in row[index + 1:]:
+                dots[tour_id, other_id] += weight * other_weight
+
+    neighbours = defaultdict(list)
+    for (tour_id, other_id), dot in dots.items():
+        score = round(dot / math.sqrt(norms[tour_id] * norms[other_id]), 6)
+        neighbours[tour_id].append((other_id, score))
+        neighbours[other_id].append((tour_id, score))
+    return {
+        tour_id: heapq.nsmallest(top_k, rows, key=lambda row: (-row[1], row[0]))
+        for tour_id, rows in neighbours.items()
+    }
+
+
+def rebuild_recommendations(similarity_model, booking_model, review_model, using=DEFAULT_DB_ALIAS):
+    """
+    Recompute the similar-tours table from every booking and review. Returns
+    the number of rows.
+    """
+    neighbours = similar_tours(interactions(booking_model, review_model, using=using))
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        # one statement, without loading the rows for delete signals
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(similarity_model._meta.db_table)}')
+        rows = similarity_model._base_manager.using(using).bulk_create((
+            similarity_model(tour_id=tour_id, other_id=other_id, score=score)
+            for tour_id, row in sorted(neighbours.items())
+            for other_id, score in row
+        ), batch_size=1000)
+        bump_versions(similarity_model)
+        transaction.on_commit(lambda: bump_versions(similarity_model), using=using)
+    return len(rows)
+
+
+def recommend(similarity_model, history, limit, using=None):
+    """
+    Active tours for a client who has the ``{tour_id: weight}`` ``history``,
+    as ``[(tour_id, score), ...]`` best first: each tour scores the sum of
+    its similarities to the tours of the history, weighted. Tours already
+    in the history are left out. One query.
+    """
+    scores = defaultdict(float)
+    for tour_id, other_id, score in similarity_model._base_manager.using(using).filter(
+        tour_id__in=list(history), other__is_active=True
+    ).values_list('tour_id', 'other_id', 'score'):
+        if other_id not in history:
+            scores[other_id] += history[tour_id] * score
+    return heapq.nsmallest(
+        limit, ((tour_id, round(score, 6)) for tour_id, score in scores.items()),
+        key=lambda row: (-row[1], row[0])
+    )
@@ -1,417 +1,473 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
 from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
 from ..serializers import (
     TourExcursionStatsSerializer,
     EmployeeRatingSerializer,
     TourPriceComparisonSerializer,
     ClientPavelSerializer,
     MonthlyPaymentStatsSerializer,
+    PaymentAnalyticsQuerySerializer,
+    PaymentBucketSerializer,
     EmployeePerformanceSerializer,
     ClientDetailSerializer,
     TourThemeStatsSerializer
 )
 from django.db.models.functions import (
-    Round, Coalesce, Concat, TruncMonth)
+    Round, Coalesce, Concat, RowNumber, Cast)
 from django.db.models import (
-    Subquery, OuterRef, Count,
+    Count,
     Avg, Sum, Case, When, IntegerField,
-    F, Value, Q, Min, Max, FloatField, CharField
+    F, Value, Q, Min, Max, FloatField, CharField, Window, OuterRef, Subquery
 )
+from django.utils.duration import duration_microseconds
+from .payments import payment_buckets
+from ..cotravel import co_travellers
+from ..cache import cached_report
+from ..fastpath import render_rows
 from ..models import (
     Client, Booking, Tour, TourExcursion, Review, Employee,
-    Excursion, TourFestival, Payment, TourTransport, TransportProvider, TourHotel
+    Excursion, TourFestival, Payment, TourTransport, TransportProvider, TourHotel,
+    Festival, Visa, CoTraveller, ClientSummary, TourStats
 )
 
 
+# The report views run module-level functions, shared with their async
+# versions in async_views.py.
+
+def pavel_friends():
+    # Kept for old clients; /api/clients/{id}/co-travellers/ is the general form.
+    neighbours = [client_id for client_id, _, _ in co_travellers(CoTraveller, 1)]
+    clients = Client.objects.in_bulk(neighbours)
+    friends = [clients[client_id] for client_id in neighbours if client_id in clients]
+
+    return ClientPavelSerializer(friends, many=True).data
+
+
 class PavelFriendsView(APIView):
     permission_classes = [AllowAny]
+    @cached_report(Client, CoTraveller)
     def get(self, request):
-        client_tours = Booking.objects.filter(client_id=1).values('tour_id')
+        return Response(pavel_friends())
 
-        friends = Client.objects.filter(
-            booking__tour_id__in=Subquery(client_tours)
-        ).exclude(client_id=1).distinct().values(
-            'client_id', 'first_name', 'last_name', 'email', 'phone'
+
+def tours_with_paid_excursions():
+    tours = TourStats.objects.filter(
+        paid_excursions__gt=0
+    ).annotate(
+        paid_percent=Round(
+            (100.0 * F('paid_excursions') / F('total_excursions')),
+            2
         )
+    ).filter(
+        paid_percent__gt=30
+    ).order_by('-paid_percent', 'tour_id').values(
+        'tour_id', 'total_excursions', 'paid_excursions', 'paid_percent', name=F('tour__name')
+    )
 
-        serializer = ClientPavelSerializer(friends, many=True)
-        return Response(serializer.data)
+    return render_rows(TourExcursionStatsSerializer, tours)
 
 
 class TourWithPaidExcursionsView(APIView):
     permission_classes = [AllowAny]
 
+    @cached_report(Tour, TourStats)
     def get(self, request):
-        tours = Tour.objects.annotate(
-            total_excursions=Count('tourexcursion'),
-            paid_excursions=Sum(
-                Case(
-                    When(tourexcursion__included_in_price=False, then=1),
-                    default=0,
-                    output_field=FloatField()
-                )
-            )
-        ).annotate(
-            paid_percent=Round(
-                (100.0 * F('paid_excursions') / F('total_excursions')),
-                2
-            )
-        ).filter(
-            paid_excursions__gt=0,
-            paid_percent__gt=30
-        ).order_by('-paid_percent')
-
-        serializer = TourExcursionStatsSerializer(tours, many=True)
-        return Response(serializer.data)
+        return Response(tours_with_paid_excursions())
+
+
+# The employee ratings are aggregated in two stages instead of one GROUP BY
+# over bookings x the clients' reviews, which counts each booking once per
+# review and each review once per booking: the bookings are aggregated per
+# employee and the reviews per client, each in one pass, then combined per
+# employee over its distinct clients. The three queries are independent.
+
+def employee_booking_stats():
+    return {
+        row['employee_id']: row
+        for row in Booking.objects.filter(employee__isnull=False).values('employee_id').annotate(
+            total_bookings=Count('pk'),
+            confirmed_bookings=Count('pk', filter=Q(status='Confirmed')),
+            high_season_tours=Count('tour_id', filter=Q(tour__season='High'), distinct=True),
+        ).order_by()
+    }
+
+
+def client_review_totals():
+    return {
+        client_id: (total, count)
+        for client_id, total, count in Review.objects.values_list('client_id').annotate(
+            total=Sum('rating'), count=Count('pk')
+        ).order_by()
+    }
+
+
+def employee_clients():
+    return list(Booking.objects.filter(
+        employee__isnull=False
+    ).values_list('employee_id', 'client_id').distinct().order_by())
+
+
+def rank_employees(bookings, reviews, pairs):
+    """Employees with confirmed bookings, best ``efficiency_score`` first."""
+    ratings = defaultdict(lambda: [0, 0])
+    for employee_id, client_id in pairs:
+        if client_id in reviews:
+            rating = ratings[employee_id]
+            rating[0] += reviews[client_id][0]
+            rating[1] += reviews[client_id][1]
+
+    employees = []
+    for employee in Employee.objects.filter(pk__in=[
+        employee_id for employee_id, row in bookings.items() if row['confirmed_bookings']
+    ]).annotate(full_name=Concat('first_name', Value(' '), 'last_name', output_field=CharField())):
+        row = bookings[employee.pk]
+        total, count = ratings.get(employee.pk, (0, 0))
+        employee.total_bookings = row['total_bookings']
+        employee.confirmed_bookings = row['confirmed_bookings']
+        employee.high_season_tours = row['high_season_tours']
+        employee.avg_rating = total / count if count else None
+        employee.efficiency_score = None if employee.avg_rating is None else (
+                employee.confirmed_bookings * 0.4 +
+                employee.high_season_tours * 0.3 +
+                employee.avg_rating * 0.3
+        )
+        employees.append(employee)
+    # best first, employees without rated clients last
+    employees.sort(key=lambda employee: (
+        employee.efficiency_score is None, -(employee.efficiency_score or 0), employee.pk
+    ))
+    return employees
 
 
 class EmployeeRatingsView(APIView):
     permission_classes = [AllowAny]
 
+    @cached_report(Employee, Booking, Tour, Review)
     def get(self, request):
-        employees = Employee.objects.annotate(
-            full_name=Concat(
-                'first_name',
-                Value(' '),
-                'last_name',
-                output_field=CharField()
-            ),
-            total_bookings=Count('booking'),
-            confirmed_bookings=Sum(
-                Case(
-                    When(booking__status='Confirmed', then=1),
-                    default=0,
-                    output_field=IntegerField()
-                )
-            ),
-            avg_rating=Avg('booking__client__review__rating')
-        ).annotate(
-            high_season_tours=Coalesce(
-                Count(
-                    Case(
-                        When(booking__tour__season='High', then='booking__tour'),
-                        distinct=True,
-                        output_field=IntegerField()
-                    )
-                ),
-                0
-            ),
-            efficiency_score=(
-                    F('confirmed_bookings') * 0.4 +
-                    F('high_season_tours') * 0.3 +
-                    F('avg_rating') * 0.3
-            )
-        ).filter(
-            confirmed_bookings__gt=0
-        ).order_by('-efficiency_score')
+        employees = rank_employees(employee_booking_stats(), client_review_totals(), employee_clients())
 
         serializer = EmployeeRatingSerializer(employees, many=True)
         return Response(serializer.data)
 
 
+def festival_tours_stats():
+    return Tour.objects.filter(
+        tourfestival__festival__popularity__gte=4
+    ).annotate(
+        avg_popularity=Avg('tourfestival__festival__popularity')
+    ).filter(
+        avg_popularity__gte=4
+    ).aggregate(
+        tour_count=Count('tour_id'),
+        avg_price=Round(Avg('price'), 2)
+    )
+
+
+def non_festival_tours_stats():
+    return Tour.objects.exclude(
+        tour_id__in=TourFestival.objects.values('tour__tour_id')
+    ).aggregate(
+        tour_count=Count('tour_id'),
+        avg_price=Round(Avg('price'), 2)
+    )
+
+
+def festival_price_comparison(festival_tours_stats, non_festival_tours_stats):
+    return [
+        {
+            'category': 'Festival Tours',
+            'tour_count': festival_tours_stats['tour_count'] or 0,
+            'avg_price': festival_tours_stats['avg_price'] or 0
+        },
+        {
+            'category': 'Non-Festival Tours',
+            'tour_count': non_festival_tours_stats['tour_count'] or 0,
+            'avg_price': non_festival_tours_stats['avg_price'] or 0
+        }
+    ]
+
+
 class FestivalTourPriceComparisonView(APIView):
     permission_classes = [AllowAny]
 
+    @cached_report(Tour, TourFestival, Festival)
     def get(self, request):
-        festival_tours_stats = Tour.objects.filter(
-            tourfestival__festival__popularity__gte=4
-        ).annotate(
-            avg_popularity=Avg('tourfestival__festival__popularity')
-        ).filter(
-            avg_popularity__gte=4
-        ).aggregate(
-            tour_count=Count('tour_id'),
-            avg_price=Round(Avg('price'), 2)
-        )
+        results = festival_price_comparison(festival_tours_stats(), non_festival_tours_stats())
 
-        non_festival_tours_stats = Tour.objects.exclude(
-            tour_id__in=TourFestival.objects.values('tour__tour_id')
-        ).aggregate(
-            tour_count=Count('tour_id'),
-            avg_price=Round(Avg('price'), 2)
-        )
+        return Response(results)
 
-        results = [
-            {
-                'category': 'Festival Tours',
-                'tour_count': festival_tours_stats['tour_count'] or 0,
-                'avg_price': festival_tours_stats['avg_price'] or 0
-            },
-            {
-                'category': 'Non-Festival Tours',
-                'tour_count': non_festival_tours_stats['tour_count'] or 0,
-                'avg_price': non_festival_tours_stats['avg_price'] or 0
-            }
-        ]
 
-        return Response(results)
+def monthly_payment_stats():
+    return [
+        {
+            'month': bucket['period'],
+            'deposits': bucket['deposits'],
+            'full_payments': bucket['full_payments'],
+            'total_income': bucket['total_income']
+        }
+        for bucket in payment_buckets('month', fill_gaps=False)
+    ]
 
 
 class MonthlyPaymentStatsView(APIView):
     permission_classes = [AllowAny]
     http_method_names = ['get']
 
+    @cached_report(Payment)
     def get(self, request):
-        monthly_deposits = Payment.objects.filter(
-            is_deposit=True
-        ).annotate(
-            month=TruncMonth('payment_date')
-        ).values('month').annotate(
-            deposit_amount=Sum('amount')
-        ).order_by('month')
-
-        monthly_full_payments = Payment.objects.filter(
-            is_deposit=False
-        ).annotate(
-            month=TruncMonth('payment_date')
-        ).values('month').annotate(
-            full_payment_amount=Sum('amount')
-        ).order_by('month')
-
-        all_months = Payment.objects.annotate(
-            month=TruncMonth('payment_date')
-        ).values_list('month', flat=True).distinct().order_by('month')
-
-        results = []
-        for month in all_months:
-            deposit = next(
-                (item['deposit_amount'] for item in monthly_deposits if item['month'] == month),
-                0
-            )
-            full_payment = next(
-                (item['full_payment_amount'] for item in monthly_full_payments if item['month'] == month),
-                0
-            )
+        return Response(render_rows(MonthlyPaymentStatsSerializer, monthly_payment_stats()))
+
+
+def payment_analytics_query(query_params):
+    """The validated parameters of a payment analytics request; ValidationError if bad."""
+    query = PaymentAnalyticsQuerySerializer(data={
+        key: value for key, value in (
+            ('granularity', query_params.get('granularity')),
+            ('date_from', query_params.get('from')),
+            ('date_to', query_params.get('to')),
+            ('breakdown', query_params.get('breakdown')),
+        ) if value
+    })
+    query.is_valid(raise_exception=True)
+    return query.validated_data
+
+
+def payment_analytics(params):
+    try:
+        results = payment_buckets(
+            params['granularity'],
+            date_from=params.get('date_from'),
+            date_to=params.get('date_to'),
+            by_method=params.get('breakdown') == 'method'
+        )
+    except ValueError as exc:
+        raise ValidationError({'detail': str(exc)})
 
-            results.append({
-                'month': month.strftime('%Y-%m'),
-                'deposits': deposit,
-                'full_payments': full_payment,
-                'total_income': deposit + full_payment
-            })
+    return render_rows(PaymentBucketSerializer, results)
 
-        serializer = MonthlyPaymentStatsSerializer(results, many=True)
-        return Response(serializer.data)
 
-
-class EmployeePerformanceView(APIView):
+class PaymentAnalyticsView(APIView):
     permission_classes = [AllowAny]
+    http_method_names = ['get']
 
+    @cached_report(Payment)
     def get(self, request):
-        employees = Employee.objects.filter(
-            position="Agent"
-        ).annotate(
-            employee_name=Concat('first_name', Value(' '), 'last_name'),
-            total_bookings=Count('booking'),
-            total_sales=Sum('booking__total_price'),
-            avg_check=Avg('booking__total_price'),
-            confirmation_rate=100.0 * Sum(
-                Case(
-                    When(booking__status='Confirmed', then=1),
-                    default=0,
-                    output_field=FloatField()
-                )
-            ) / Count('booking'),
-            avg_processing_time=Avg(
-                F('booking__booking_date') - F('booking__client__visa__application_date')
+        return Response(payment_analytics(payment_analytics_query(request.query_params)))
+
+
+def agent_performance():
+    """Agents with bookings and their aggregates, best sales first."""
+    employees = Employee.objects.filter(
+        position="Agent"
+    ).annotate(
+        employee_name=Concat('first_name', Value(' '), 'last_name'),
+        total_bookings=Count('booking'),
+        total_sales=Sum('booking__total_price'),
+        avg_check=Avg('booking__total_price'),
+        confirmation_rate=100.0 * Sum(
+            Case(
+                When(booking__status='Confirmed', then=1),
+                default=0,
+                output_field=FloatField()
             )
-        ).filter(
-            total_bookings__gt=0
+        ) / Count('booking'),
+        # the average as the database computes it, the value the other
+        # agents' were compared with (see rank_agents())
+        processing_time=Avg(
+            F('booking__booking_date') - F('booking__client__visa__application_date'),
+            output_field=FloatField()
         )
-
-        ranked_employees = []
-        for emp in employees.order_by('-total_sales'):
-            emp_data = {
-                'employee_name': emp.employee_name,
-                'total_bookings': emp.total_bookings,
-                'total_sales': float(emp.total_sales or 0),
-                'avg_check': round(float(emp.avg_check or 0), 2),
-                'confirmation_rate': round(float(emp.confirmation_rate or 0), 2),
-            }
-
-            emp_data['sales_rank'] = Employee.objects.filter(
-                position="Agent",
-                booking__isnull=False
-            ).annotate(
-                total_sales=Sum('booking__total_price')
-            ).filter(
-                total_sales__gt=emp.total_sales
-            ).count() + 1
-
-            emp_data['check_rank'] = Employee.objects.filter(
-                position="Agent",
-                booking__isnull=False
-            ).annotate(
-                avg_check=Avg('booking__total_price')
-            ).filter(
-                avg_check__gt=emp.avg_check
-            ).count() + 1
-
-            emp_data['rate_rank'] = Employee.objects.filter(
-                position="Agent",
-                booking__isnull=False
-            ).annotate(
-                rate=100.0 * Sum(
-                    Case(
-                        When(booking__status='Confirmed', then=1),
-                        default=0,
-                        output_field=FloatField()
-                    )
-                ) / Count('booking')
-            ).filter(
-                rate__gt=emp.confirmation_rate
-            ).count() + 1
-
-            emp_data['time_rank'] = Employee.objects.filter(
-                position="Agent",
-                booking__isnull=False
-            ).annotate(
-                proc_time=Avg(
-                    F('booking__booking_date') - F('booking__client__visa__application_date')
-                )
-            ).filter(
-                proc_time__lt=emp.avg_processing_time
-            ).count() + 1
-
-            emp_data['composite_rank'] = (
-                    emp_data['sales_rank'] +
-                    emp_data['check_rank'] +
-                    emp_data['rate_rank'] +
-                    emp_data['time_rank']
+    ).filter(
+        total_bookings__gt=0
+    )
+
+    # Processing time is ranked over this same per-agent aggregate. Sales,
+    # check and rate ranks compare against each agent's bookings-only
+    # aggregates (no visa join), which one grouped pass over Booking
+    # provides for the whole team.
+    return list(employees.order_by('-total_sales'))
+
+
+def agent_population():
+    """Per-agent aggregates over the bookings alone, the population the ranks compare against."""
+    return list(Booking.objects.filter(
+        employee__position="Agent"
+    ).values('employee_id').annotate(
+        total_sales=Sum('total_price'),
+        # the same output field as agent_performance()'s, so that the ranks
+        # bisect Decimals into Decimals
+        avg_check=Avg('total_price'),
+        rate=100.0 * Sum(
+            Case(
+                When(status='Confirmed', then=1),
+                default=0,
+                output_field=FloatField()
             )
+        ) / Count('booking_id')
+    ))
+
+
+def rank_agents(employees, population):
+    """The performance report of ``agent_performance()`` ranked against ``agent_population()``."""
+    sales = sorted(row['total_sales'] for row in population)
+    checks = sorted(row['avg_check'] for row in population)
+    rates = sorted(row['rate'] for row in population)
+    times = sorted(emp.processing_time for emp in employees if emp.processing_time is not None)
+
+    ranked_employees = []
+    for emp in employees:
+        emp_data = {
+            'employee_name': emp.employee_name,
+            'total_bookings': emp.total_bookings,
+            'total_sales': float(emp.total_sales or 0),
+            'avg_check': round(float(emp.avg_check or 0), 2),
+            'confirmation_rate': round(float(emp.confirmation_rate or 0), 2),
+        }
+
+        emp_data['sales_rank'] = len(sales) - bisect_right(sales, emp.total_sales) + 1
+        emp_data['check_rank'] = len(checks) - bisect_right(checks, emp.avg_check) + 1
+        emp_data['rate_rank'] = len(rates) - bisect_right(rates, emp.confirmation_rate) + 1
+        # The agent's own average was read back as a DurationField, whole
+        # microseconds, before the others' were compared with it. An agent
+        # without one ranks last.
+        if emp.processing_time is None:
+            emp_data['time_rank'] = len(times) + 1
+        else:
+            own = duration_microseconds(timedelta(microseconds=emp.processing_time))
+            emp_data['time_rank'] = bisect_left(times, own) + 1
+
+        emp_data['composite_rank'] = (
+                emp_data['sales_rank'] +
+                emp_data['check_rank'] +
+                emp_data['rate_rank'] +
+                emp_data['time_rank']
+        )
 
-            if emp_data['composite_rank'] <= 10:
-                emp_data['performance_category'] = 'Top Performer'
-            elif emp_data['composite_rank'] <= 20:
-                emp_data['performance_category'] = 'High Performer'
-            elif emp_data['composite_rank'] <= 30:
-                emp_data['performance_category'] = 'Average Performer'
-            else:
-                emp_data['performance_category'] = 'Needs Improvement'
-
-            ranked_employees.append(emp_data)
+        if emp_data['composite_rank'] <= 10:
+            emp_data['performance_category'] = 'Top Performer'
+        elif emp_data['composite_rank'] <= 20:
+            emp_data['performance_category'] = 'High Performer'
+        elif emp_data['composite_rank'] <= 30:
+            emp_data['performance_category'] = 'Average Performer'
+        else:
+            emp_data['performance_category'] = 'Needs Improvement'
 
+        ranked_employees.append(emp_data)
 
-        ranked_employees.sort(key=lambda x: x['composite_rank'])
+    ranked_employees.sort(key=lambda x: x['composite_rank'])
 
-        serializer = EmployeePerformanceSerializer(ranked_employees, many=True)
-        return Response(serializer.data)
+    return render_rows(EmployeePerformanceSerializer, ranked_employees)
 
 
-class ClientListWithDetailsView(APIView):
+class EmployeePerformanceView(APIView):
     permission_classes = [AllowAny]
 
+    @cached_report(Employee, Booking, Client, Visa)
     def get(self, request):
-        last_booking_subquery = Booking.objects.filter(
-            client_id=OuterRef('pk')
-        ).order_by('-booking_date').values('booking_date')[:1]
-
-        last_tour_subquery = Tour.objects.filter(
-            booking__client_id=OuterRef('pk')
-        ).order_by('-booking__booking_date').values('name')[:1]
-
-        last_rating_subquery = Review.objects.filter(
-            client_id=OuterRef('pk')
-        ).order_by('-review_date').values('rating')[:1]
-
-        last_comment_subquery = Review.objects.filter(
-            client_id=OuterRef('pk')
-        ).order_by('-review_date').values('comment')[:1]
-
-        clients = Client.objects.annotate(
-            client_name=Concat('first_name', Value(' '), 'last_name'),
-            total_bookings=Count('booking'),
-            last_booking_date=Coalesce(
-                Subquery(last_booking_subquery),
-                Value('Нет бронирований', output_field=CharField()),
-                output_field=CharField()
-            ),
-            last_tour=Coalesce(
-                Subquery(last_tour_subquery),
-                Value('Не бронировал', output_field=CharField()),
-                output_field=CharField()
-            ),
-            last_rating=Coalesce(
-                Subquery(last_rating_subquery),
-                Value('Нет оценки', output_field=CharField()),
-                output_field=CharField()
-            ),
-            last_comment=Coalesce(
-                Subquery(last_comment_subquery),
-                Value('Нет отзыва', output_field=CharField()),
-                output_field=CharField()
-            )
-        ).filter(
-            booking__isnull=False
-        ).order_by(
-            '-booking__booking_date'
-        ).distinct()[:5]
-
-        serializer = ClientDetailSerializer(clients, many=True)
-        return Response(serializer.data)
+        return Response(rank_agents(agent_performance(), agent_population()))
+
+
+def client_details(request, view):
+    """The page of the client list ``request`` asks for, in an order ``view`` allows."""
+    clients = ClientSummary.objects.values(
+        'client_id', 'total_bookings', 'last_booking_date',
+        client_name=Concat('client__first_name', Value(' '), 'client__last_name'),
+        email=F('client__email'),
+        phone=F('client__phone'),
+        last_tour_name=Coalesce('last_tour__name', Value('Не бронировал'), output_field=CharField()),
+        last_rating=Coalesce(
+            Cast('last_review__rating', CharField()), Value('Нет оценки'), output_field=CharField()
+        ),
+        last_comment=Coalesce('last_review__comment', Value('Нет отзыва'), output_field=CharField()),
+    )
+
+    paginator = view.pagination_class()
+    page = paginator.paginate_queryset(clients, request, view=view)
+    if page is None:
+        return render_rows(ClientDetailSerializer, clients.order_by(*view.ordering, 'client_id'))
+    return paginator.get_paginated_response(render_rows(ClientDetailSerializer, page)).data
 
 
-class TourThemeAnalysisView(APIView):
+class ClientListWithDetailsView(APIView):
+    """
+    Every client with bookings and their last activity, from the client
+    summaries joined to the client, tour and review they point at. Keyset
+    paginated, most recent booking first unless ``?ordering=`` says otherwise.
+    """
     permission_classes = [AllowAny]
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+    ordering = ('-last_booking_date',)
+    ordering_fields = ('last_booking_date', 'total_bookings')
 
+    @cached_report(ClientSummary, Client, Tour, Review)
     def get(self, request):
-        most_popular_subquery = Tour.objects.filter(
-            theme=OuterRef('theme')
-        ).annotate(
-            bookings_count=Count('booking')
-        ).order_by('-bookings_count').values('name')[:1]
-
-        theme_stats = Tour.objects.filter(
-            theme__isnull=False
-        ).values('theme').annotate(
-            tours_count=Count('tour_id', distinct=True),
-            avg_price=Avg('price'),
-            avg_difficulty=Avg('difficulty_level'),
-            cheapest_tour=Min('price'),
-            most_expensive_tour=Max('price'),
-            total_revenue=Sum(
-                'booking__total_price',
-                filter=~Q(booking__status='Cancelled')
-            ),
-            bookings_count=Coalesce(
-                Count(
-                    'booking',
-                    filter=~Q(booking__status='Cancelled'),
-                    distinct=True
-                ),
-                0
+        return Response(client_details(request, self))
+
+
+def theme_analysis():
+    # One pass over the tours joined to their stats row (one per tour, so
+    # nothing fans out): per-theme totals as window aggregates, and the
+    # tour that ranks first by bookings stands for its theme. That rank
+    # counts every booking, cancelled ones too, as the report always has;
+    # the stats only count seat-holding ones.
+    by_theme = {'partition_by': F('theme')}
+    all_bookings = Booking.objects.filter(
+        tour=OuterRef('pk')
+    ).order_by().values('tour').annotate(count=Count('*')).values('count')
+    theme_stats = Tour.objects.filter(
+        theme__isnull=False
+    ).annotate(
+        tours_count=Window(Count('tour_id'), **by_theme),
+        avg_price=Window(Avg('price'), **by_theme),
+        avg_difficulty=Window(Avg('difficulty_level'), **by_theme),
+        cheapest_tour=Window(Min('price'), **by_theme),
+        most_expensive_tour=Window(Max('price'), **by_theme),
+        total_revenue=Window(Sum('stats__revenue'), **by_theme),
+        bookings_count=Window(Sum(Coalesce('stats__bookings', 0)), **by_theme),
+        reviews=Window(Sum('stats__reviews'), **by_theme),
+        rating_total=Window(Sum('stats__rating_total'), **by_theme),
+        popularity=Window(
+            RowNumber(),
+            order_by=[Coalesce(Subquery(all_bookings), 0).desc(), F('tour_id').asc()],
+            **by_theme
+        ),
+    ).filter(popularity=1).values(
+        'theme', 'tours_count', 'avg_price', 'avg_difficulty', 'cheapest_tour', 'most_expensive_tour',
+        'total_revenue', 'bookings_count', 'reviews', 'rating_total', 'name',
+    ).order_by('-bookings_count', 'theme')
+
+    results = []
+    for stat in theme_stats:
+        results.append({
+            'theme': stat['theme'],
+            'tours_count': stat['tours_count'],
+            'avg_price': round(float(stat['avg_price'] or 0), 2),
+            'avg_difficulty': round(float(stat['avg_difficulty'] or 0), 1),
+            'cheapest_tour': round(float(stat['cheapest_tour'] or 0), 2),
+            'most_expensive_tour': round(float(stat['most_expensive_tour'] or 0), 2),
+            'total_revenue': round(float(stat['total_revenue'] or 0), 2),
+            'bookings_count': stat['bookings_count'],
+            # rounded half up, as SQL ROUND() did
+            'avg_rating': (
+                str((Decimal(stat['rating_total']) / stat['reviews']).quantize(Decimal('0.1'), ROUND_HALF_UP))
+                if stat['reviews'] else "Нет рейтинга"
             ),
-            avg_rating=Coalesce(
-                Round(Avg('review__rating'), 1, output_field=CharField()),
-                Value("Нет рейтинга", output_field=CharField())
-            ),
-            most_popular_tour=Coalesce(
-                Subquery(most_popular_subquery),
-                Value("Нет данных", output_field=CharField())
-            )
-        ).order_by('-bookings_count')
-
-        results = []
-        for stat in theme_stats:
-
-            results.append({
-                'theme': stat['theme'],
-                'tours_count': stat['tours_count'],
-                'avg_price': round(float(stat['avg_price'] or 0), 2),
-                'avg_difficulty': round(float(stat['avg_difficulty'] or 0), 1),
-                'cheapest_tour': round(float(stat['cheapest_tour'] or 0), 2),
-                'most_expensive_tour': round(float(stat['most_expensive_tour'] or 0), 2),
-                'total_revenue': round(float(stat['total_revenue'] or 0), 2),
-                'bookings_count': stat['bookings_count'],
-                'avg_rating': stat['avg_rating'],
-                'most_popular_tour': stat['most_popular_tour']
-            })
-
-        serializer = TourThemeStatsSerializer(results, many=True)
-        return Response(serializer.data)
+            'most_popular_tour': stat['name']
+        })
 
+    return render_rows(TourThemeStatsSerializer, results)
 
 
+class TourThemeAnalysisView(APIView):
+    permission_classes = [AllowAny]
 
+    @cached_report(Tour, TourStats)
+    def get(self, request):
+        return Response(theme_analysis())
@@ -0,0 +1,160 @@
+# tours/reports/async_views.py
+import asyncio
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from ..cache import async_cached_report
+from ..fastpath import render_rows
+from ..models import (
+    Booking, Client, ClientSummary, CoTraveller, Employee, Festival, Payment, Review, Tour, TourFestival,
+    TourStats, Visa,
+)
+from ..serializers import EmployeeRatingSerializer, MonthlyPaymentStatsSerializer
+from .api_views import (
+    ClientListWithDetailsView, agent_performance, agent_population, client_details, client_review_totals,
+    employee_booking_stats, employee_clients, festival_price_comparison, festival_tours_stats,
+    monthly_payment_stats, non_festival_tours_stats, pavel_friends, payment_analytics, payment_analytics_query,
+    rank_agents, rank_employees, theme_analysis, tours_with_paid_excursions,
+)
+
+
+async def gather_queries(*calls):
+    """
+    Run independent, read-only ORM ``calls`` at the same time and return
+    their results in order.
+
+    Django's async ORM (``aaggregate()`` and the like) hands every query of
+    a request to the same thread, so awaiting several at once still runs
+    them one after another. Here each call gets a worker thread and a
+    connection of its own, released as a request's would be, and the
+    request's query wrappers (see tours/instrumentation.py). Inside a
+    transaction the calls run in turn on the request's connection instead:
+    other connections would not see its uncommitted rows.
+    """
+    in_transaction, wrappers = await sync_to_async(_request_connections)()
+    if in_transaction:
+        return [await sync_to_async(call)() for call in calls]
+
+    loop = asyncio.get_running_loop()
+    # run_in_executor() leaves the request's context behind, so the worker's
+    # connections are its own
+    return await asyncio.gather(*(
+        loop.run_in_executor(None, _on_own_connection, call, wrappers) for call in calls
+    ))
+
+
+def _request_connections():
+    request_connections = connections.all()
+    return (
+        any(connection.in_atomic_block for connection in request_connections),
+        {connection.alias: list(connection.execute_wrappers) for connection in request_connections},
+    )
+
+
+def _on_own_connection(call, wrappers):
+    try:
+        with ExitStack() as stack:
+            for alias, alias_wrappers in wrappers.items():
+                for wrapper in alias_wrappers:
+                    stack.enter_context(connections[alias].execute_wrapper(wrapper))
+            return call()
+    finally:
+        # as at the end of a request: closed unless CONN_MAX_AGE keeps it
+        close_old_connections()
+
+
+def json_response(data, status=200):
+    """The body DRF's default JSON renderer would give ``data``."""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+class AsyncReportView(View):
+    """
+    GET-only async report. DRF errors raised by the report (bad query
+    parameters, a stale cursor) are answered as the DRF views answer them.
+    """
+    http_method_names = ['get']
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            response = exception_handler(exc, {'view': self, 'request': request})
+            return json_response(response.data, status=response.status_code)
+
+
+class AsyncPavelFriendsView(AsyncReportView):
+    @async_cached_report(Client, CoTraveller)
+    async def get(self, request):
+        return json_response(await sync_to_async(pavel_friends)())
+
+
+class AsyncTourWithPaidExcursionsView(AsyncReportView):
+    @async_cached_report(Tour, TourStats)
+    async def get(self, request):
+        return json_response(await sync_to_async(tours_with_paid_excursions)())
+
+
+class AsyncFestivalTourPriceComparisonView(AsyncReportView):
+    @async_cached_report(Tour, TourFestival, Festival)
+    async def get(self, request):
+        festival, non_festival = await gather_queries(festival_tours_stats, non_festival_tours_stats)
+        return json_response(festival_price_comparison(festival, non_festival))
+
+
+class AsyncEmployeeRatingsView(AsyncReportView):
+    @async_cached_report(Employee, Booking, Tour, Review)
+    async def get(self, request):
+        bookings, reviews, pairs = await gather_queries(
+            employee_booking_stats, client_review_totals, employee_clients
+        )
+        employees = await sync_to_async(rank_employees)(bookings, reviews, pairs)
+        return json_response(EmployeeRatingSerializer(employees, many=True).data)
+
+
+class AsyncMonthlyPaymentStatsView(AsyncReportView):
+    @async_cached_report(Payment)
+    async def get(self, request):
+        # one grouped query: nothing to run alongside it, but the request no
+        # longer holds a thread while it waits
+        results = await sync_to_async(monthly_payment_stats)()
+        return json_response(render_rows(MonthlyPaymentStatsSerializer, results))
+
+
+class AsyncPaymentAnalyticsView(AsyncReportView):
+    @async_cached_report(Payment)
+    async def get(self, request):
+        params = payment_analytics_query(request.GET)
+        return json_response(await sync_to_async(payment_analytics)(params))
+
+
+class AsyncEmployeePerformanceView(AsyncReportView):
+    @async_cached_report(Employee, Booking, Client, Visa)
+    async def get(self, request):
+        employees, population = await gather_queries(agent_performance, agent_population)
+        return json_response(rank_agents(employees, population))
+
+
+class AsyncClientListWithDetailsView(AsyncReportView):
+    pagination_class = ClientListWithDetailsView.pagination_class
+    ordering = ClientListWithDetailsView.ordering
+    ordering_fields = ClientListWithDetailsView.ordering_fields
+
+    @async_cached_report(ClientSummary, Client, Tour, Review)
+    async def get(self, request):
+        # the paginator reads DRF's query_params
+        return json_response(await sync_to_async(client_details)(Request(request), self))
+
+
+class AsyncTourThemeAnalysisView(AsyncReportView):
+    @async_cached_report(Tour, TourStats)
+    async def get(self, request):
+        return json_response(await sync_to_async(theme_analysis)())
@@ -0,0 +1,117 @@
+# tours/reports/payments.py
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import DateField, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek
+from django.utils import timezone
+
+from ..models import Payment
+
+
+TRUNC_FUNCTIONS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+
+# Upper bound on the number of periods a single request may fill in.
+MAX_BUCKETS = 5000
+
+
+def bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+def next_bucket(start, granularity):
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    months = 3 if granularity == 'quarter' else 1
+    month = start.month - 1 + months
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def bucket_label(start, granularity):
+    if granularity == 'month':
+        return start.strftime('%Y-%m')
+    if granularity == 'quarter':
+        return f'{start.year}-Q{(start.month - 1) // 3 + 1}'
+    return start.isoformat()
+
+
+def payment_buckets(granularity='month', date_from=None, date_to=None, by_method=False, fill_gaps=True):
+    """
+    Deposit / full-payment / total income per period in one grouped query.
+
+    ``date_from`` and ``date_to`` are inclusive dates. With ``fill_gaps`` every
+    period of the range (or of the span of the data when no range is given)
+    is returned, periods without payments reporting zero; with ``by_method``
+    there is one row per period and payment method.
+    """
+    payments = Payment.objects.all()
+    if date_from is not None:
+        payments = payments.filter(
+            payment_date__gte=timezone.make_aware(datetime.combine(date_from, time.min))
+        )
+    if date_to is not None:
+        payments = payments.filter(
+            payment_date__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        )
+
+    group_by = ['period_start', 'method'] if by_method else ['period_start']
+    rows = payments.annotate(
+        period_start=TRUNC_FUNCTIONS[granularity]('payment_date', output_field=DateField())
+    ).values(*group_by).annotate(
+        deposits=Sum('amount', filter=Q(is_deposit=True)),
+        full_payments=Sum('amount', filter=Q(is_deposit=False)),
+    ).order_by(*group_by)
+
+    totals = {tuple(row[key] for key in group_by): row for row in rows}
+
+    if not fill_gaps:
+        keys = sorted(totals)
+    else:
+        starts = [key[0] for key in totals]
+        first = bucket_start(date_from, granularity) if date_from else min(starts, default=None)
+        last = bucket_start(date_to, granularity) if date_to else max(starts, default=None)
+        periods = []
+        current = first if last is not None else None
+        while current is not None and current <= last:
+            periods.append(current)
+            if len(periods) > MAX_BUCKETS:
+                raise ValueError(f'The requested range spans more than {MAX_BUCKETS} periods.')
+            current = next_bucket(current, granularity)
+
+        if by_method:
+            methods = [method for method, _ in Payment.PAYMENT_METHODS]
+            methods += sorted({key[1] for key in totals} - set(methods))
+            keys = [(period, method) for period in periods for method in methods]
+        else:
+            keys = [(period,) for period in periods]
+
+    results = []
+    for key in keys:
+        row = totals.get(key, {})
+        deposits = row.get('deposits') or Decimal('0')
+        full_payments = row.get('full_payments') or Decimal('0')
+        result = {
+            'period': bucket_label(key[0], granularity),
+            'period_start': key[0],
+            'deposits': deposits,
+            'full_payments': full_payments,
+            'total_income': deposits + full_payments,
+        }
+        if by_method:
+            result['method'] = key[1]
+        results.append(result)
+
+    return results
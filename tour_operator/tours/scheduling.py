@@ -0,0 +1,145 @@
+# tours/scheduling.py
+import heapq
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from .cache import get_versions
+from .models import ChineseGuide, Excursion, TourExcursion
+
+
+SCHEDULE_MODELS = (ChineseGuide, TourExcursion, Excursion)
+
+
+def excursion_end(start, duration_hours):
+    return start + timedelta(hours=duration_hours)
+
+
+def merge_intervals(intervals):
+    """
+    Sweep ``(start, end)`` pairs sorted by start into the disjoint busy
+    blocks they cover, as two sorted lists ``(starts, ends)``.
+    """
+    starts, ends = [], []
+    for start, end in intervals:
+        if ends and start < ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def is_free(blocks, start, end):
+    """Whether ``[start, end)`` misses every block of ``merge_intervals()``."""
+    starts, ends = blocks
+    # first block ending after ``start``
+    index = bisect_right(ends, start)
+    return index == len(ends) or starts[index] >= end
+
+
+def speaks(languages, language):
+    return language.casefold() in {item.strip().casefold() for item in languages.split(',')}
+
+
+class GuideAvailability:
+    """
+    The guides of one city with the merged busy blocks of each, so that
+    finding the guides free over a period is a bisect per guide instead of a
+    scan of the excursions.
+    """
+
+    def __init__(self, guides, busy):
+        self.guides = guides
+        self.busy = busy
+
+    @classmethod
+    def build(cls, city_id):
+        """One query for the guides of the city, one for their excursions sorted by start."""
+        guides = list(
+            ChineseGuide.objects.filter(city_id=city_id).order_by('guide_id')
+            .values('guide_id', 'first_name', 'last_name', 'languages', 'city_id', 'hourly_rate')
+        )
+        intervals = defaultdict(list)
+        for guide_id, start, hours in TourExcursion.objects.filter(guide__city_id=city_id).order_by(
+            'guide_id', 'schedule_datetime'
+        ).values_list('guide_id', 'schedule_datetime', 'excursion__duration_hours'):
+            intervals[guide_id].append((start, excursion_end(start, hours)))
+        return cls(guides, {guide_id: merge_intervals(rows) for guide_id, rows in intervals.items()})
+
+    def free_guides(self, start, end, language=None):
+        empty = ([], [])
+        return [
+            guide for guide in self.guides
+            if (language is None or speaks(guide['languages'], language))
+            and is_free(self.busy.get(guide['guide_id'], empty), start, end)
+        ]
+
+
+def guide_availability(city_id):
+    """``GuideAvailability`` of a city, cached until a guide, excursion or schedule changes."""
+    versions = '.'.join(str(version) for version in get_versions(SCHEDULE_MODELS))
+    key = f'guide-availability:{city_id}:{versions}'
+    index = cache.get(key)
+    if index is None:
+        index = GuideAvailability.build(city_id)
+        cache.set(key, index, getattr(settings, 'REPORT_CACHE_TIMEOUT', 3600))
+    return index
+
+
+def find_conflicts(tour_excursions):
+    """
+    ``{position: [message, ...]}`` for the unsaved or changed TourExcursion
+    rows of ``tour_excursions`` whose guide is busy at the time, with another
+    stored excursion or with another row of the list.
+
+    The stored excursions that may overlap are read in one query over the
+    guides and time span involved; each guide's intervals are then swept in
+    start order with a heap of the ones still running.
+    """
+    proposed = [
+        (position, item.guide_id, item.schedule_datetime,
+         excursion_end(item.schedule_datetime, item.excursion.duration_hours))
+        for position, item in enumerate(tour_excursions)
+    ]
+    if not proposed:
+        return {}
+
+    longest = Excursion.objects.aggregate(hours=Max('duration_hours'))['hours'] or 0
+    stored = TourExcursion.objects.filter(
+        guide_id__in={guide_id for _, guide_id, _, _ in proposed},
+        schedule_datetime__lt=max(end for *_, end in proposed),
+        schedule_datetime__gt=min(start for _, _, start, _ in proposed) - timedelta(hours=longest),
+    ).exclude(
+        pk__in=[item.pk for item in tour_excursions if item.pk is not None]
+    ).values_list('pk', 'guide_id', 'schedule_datetime', 'excursion__duration_hours')
+
+    intervals = defaultdict(list)
+    for position, guide_id, start, end in proposed:
+        intervals[guide_id].append((start, end, position, None))
+    for pk, guide_id, start, hours in stored:
+        intervals[guide_id].append((start, excursion_end(start, hours), None, pk))
+
+    conflicts = defaultdict(list)
+    for guide_id, rows in intervals.items():
+        rows.sort(key=lambda row: row[:2])
+        running = []
+        for order, (start, end, position, pk) in enumerate(rows):
+            while running and running[0][0] <= start:
+                heapq.heappop(running)
+            for _, _, other_start, other_position, other_pk in running:
+                if position is not None:
+                    conflicts[position].append(_clash(guide_id, other_start, other_pk))
+                if other_position is not None:
+                    conflicts[other_position].append(_clash(guide_id, start, pk))
+            heapq.heappush(running, (end, order, start, position, pk))
+    return dict(conflicts)
+
+
+def _clash(guide_id, start, pk):
+    other = f'tour excursion {pk}' if pk is not None else 'another item of this write'
+    return f'Guide {guide_id} is already booked from {start.isoformat()} ({other}).'
@@ -1,5 +1,14 @@
 # tours/serializers.py
+import copy
+from datetime import timezone
+
 from rest_framework import serializers
+from .cotravel import MAX_DEPTH
+from .fulltext import SOURCES
+from .occupancy import CALENDAR_SEASONS
+from .recommend import TOP_K
+from .scheduling import find_conflicts
+from .sparse import DynamicFieldsModelSerializer
 from .models import (
     Client,
     Employee,
@@ -29,157 +38,250 @@ from .models import (
 )
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Client
         fields = '__all__'
 
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Employee
         fields = '__all__'
 
 
-class TourSerializer(serializers.ModelSerializer):
+class TourSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Tour
         fields = '__all__'
 
+    def validate_max_participants(self, value):
+        if self.instance is not None and value < self.instance.seats_taken:
+            raise serializers.ValidationError(
+                f'{self.instance.seats_taken} seats are already booked.'
+            )
+        return value
+
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Booking
         fields = '__all__'
 
 
-class VisaTypeSerializer(serializers.ModelSerializer):
+class VisaTypeSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = VisaType
         fields = '__all__'
 
 
-class VisaSerializer(serializers.ModelSerializer):
+class VisaSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Visa
         fields = '__all__'
 
 
-class ChinaRegionSerializer(serializers.ModelSerializer):
+class ChinaRegionSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = ChinaRegion
         fields = '__all__'
 
 
-class ChinaCitySerializer(serializers.ModelSerializer):
+class ChinaCitySerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = ChinaCity
         fields = '__all__'
 
 
-class HotelSerializer(serializers.ModelSerializer):
+class HotelSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Hotel
         fields = '__all__'
 
 
-class ExcursionSerializer(serializers.ModelSerializer):
+class ExcursionSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Excursion
         fields = '__all__'
 
 
-class ChineseGuideSerializer(serializers.ModelSerializer):
+class ChineseGuideSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = ChineseGuide
         fields = '__all__'
 
 
-class FestivalSerializer(serializers.ModelSerializer):
+class FestivalSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Festival
         fields = '__all__'
 
 
-class TransportProviderSerializer(serializers.ModelSerializer):
+class TransportProviderSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TransportProvider
         fields = '__all__'
 
 
-class InsuranceSerializer(serializers.ModelSerializer):
+class InsuranceSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Insurance
         fields = '__all__'
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Review
         fields = '__all__'
 
 
-class TourAgencySerializer(serializers.ModelSerializer):
+class TourAgencySerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TourAgency
         fields = '__all__'
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
 
 
-class BookingsVisaSerializer(serializers.ModelSerializer):
+class BookingsVisaSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = BookingsVisa
         fields = '__all__'
 
 
-class TourExcursionSerializer(serializers.ModelSerializer):
+class TourExcursionSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TourExcursion
         fields = '__all__'
 
-
-class TourFestivalSerializer(serializers.ModelSerializer):
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        # Bulk writes check the whole batch in before_bulk_write().
+        if self.context.get('bulk') or not {'guide', 'excursion', 'schedule_datetime'} & set(attrs):
+            return attrs
+        item = copy.copy(self.instance) if self.instance is not None else TourExcursion()
+        for name, value in attrs.items():
+            setattr(item, name, value)
+        conflicts = find_conflicts([item])
+        if conflicts:
+            raise serializers.ValidationError({'guide': conflicts[0]})
+        return attrs
+
+
+class TourFestivalSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TourFestival
         fields = '__all__'
 
 
-class TourHotelSerializer(serializers.ModelSerializer):
+class TourHotelSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TourHotel
         fields = '__all__'
 
 
-class TourRegionSerializer(serializers.ModelSerializer):
+class TourRegionSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TourRegion
         fields = '__all__'
 
 
-class TourToAgencySerializer(serializers.ModelSerializer):
+class TourToAgencySerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TourToAgency
         fields = '__all__'
 
 
-class TourTransportSerializer(serializers.ModelSerializer):
+class TourTransportSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = TourTransport
         fields = '__all__'
 
 
-class HotelOccupancySerializer(serializers.Serializer):
-    hotel_id = serializers.IntegerField()
-    hotel_name = serializers.CharField()
-    month = serializers.CharField()
-    season = serializers.CharField()
-    bookings = serializers.IntegerField()
-    avg_tour_difficulty = serializers.DecimalField(max_digits=5, decimal_places=2)
+class ItineraryHotelSerializer(HotelSerializer):
+    city = ChinaCitySerializer(read_only=True)
+
+
+class ItineraryExcursionSerializer(ExcursionSerializer):
+    location = ChinaCitySerializer(read_only=True)
+
+
+class ItineraryGuideSerializer(ChineseGuideSerializer):
+    city = ChinaCitySerializer(read_only=True)
+
+
+class ItineraryTourHotelSerializer(serializers.ModelSerializer):
+    hotel = ItineraryHotelSerializer(read_only=True)
+
+    class Meta:
+        model = TourHotel
+        exclude = ['tour']
+
+
+class ItineraryTourExcursionSerializer(serializers.ModelSerializer):
+    excursion = ItineraryExcursionSerializer(read_only=True)
+    guide = ItineraryGuideSerializer(read_only=True)
+
+    class Meta:
+        model = TourExcursion
+        exclude = ['tour']
+
+
+class ItineraryTourTransportSerializer(serializers.ModelSerializer):
+    company = TransportProviderSerializer(read_only=True)
+    departure_city = ChinaCitySerializer(read_only=True)
+    arrival_city = ChinaCitySerializer(read_only=True)
+
+    class Meta:
+        model = TourTransport
+        exclude = ['tour']
+
+
+class ItineraryTourRegionSerializer(serializers.ModelSerializer):
+    region = ChinaRegionSerializer(read_only=True)
+
+    class Meta:
+        model = TourRegion
+        exclude = ['tour']
+
+
+class ItineraryTourFestivalSerializer(serializers.ModelSerializer):
+    festival = FestivalSerializer(read_only=True)
+
+    class Meta:
+        model = TourFestival
+        exclude = ['tour']
+
+
+class TourItinerarySerializer(TourSerializer):
+    hotels = ItineraryTourHotelSerializer(source='tourhotel_set', many=True, read_only=True)
+    excursions = ItineraryTourExcursionSerializer(source='tourexcursion_set', many=True, read_only=True)
+    transports = ItineraryTourTransportSerializer(source='tourtransport_set', many=True, read_only=True)
+    regions = ItineraryTourRegionSerializer(source='tourregion_set', many=True, read_only=True)
+    festivals = ItineraryTourFestivalSerializer(source='tourfestival_set', many=True, read_only=True)
+
+
+class TourAvailabilitySerializer(serializers.Serializer):
+    tour_id = serializers.IntegerField()
+    name = serializers.CharField()
+    start_date = serializers.DateField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    max_participants = serializers.IntegerField()
+    seats_taken = serializers.IntegerField()
+    seats_available = serializers.IntegerField()
+
+
+class HotelOccupancySerializer(DynamicFieldsModelSerializer):
+    hotel_name = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = HotelOccupancy
+        fields = ['id', 'hotel', 'hotel_name', 'month', 'calendar_season', 'bookings', 'avg_tour_difficulty']
+
 
 class ClientPavelSerializer(serializers.Serializer):
     client_id = serializers.IntegerField()
@@ -189,6 +291,16 @@ class ClientPavelSerializer(serializers.Serializer):
     phone = serializers.CharField()
 
 
+class CoTravellerSerializer(serializers.Serializer):
+    client_id = serializers.IntegerField(source='client.client_id')
+    first_name = serializers.CharField(source='client.first_name')
+    last_name = serializers.CharField(source='client.last_name')
+    email = serializers.EmailField(source='client.email')
+    phone = serializers.CharField(source='client.phone')
+    depth = serializers.IntegerField(help_text='Hops from the client.')
+    shared_tours = serializers.IntegerField(help_text='Tours shared with the co-travellers one hop closer.')
+
+
 class TourExcursionStatsSerializer(serializers.ModelSerializer):
     total_excursions = serializers.IntegerField()
     paid_excursions = serializers.IntegerField()
@@ -236,6 +348,130 @@ class MonthlyPaymentStatsSerializer(serializers.Serializer):
     full_payments = serializers.DecimalField(max_digits=10, decimal_places=2)
     total_income = serializers.DecimalField(max_digits=10, decimal_places=2)
 
+
+class PaymentAnalyticsQuerySerializer(serializers.Serializer):
+    granularity = serializers.ChoiceField(
+        choices=['day', 'week', 'month', 'quarter'], default='month'
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    breakdown = serializers.ChoiceField(choices=['method'], required=False)
+
+    def validate(self, attrs):
+        if 'date_from' in attrs and 'date_to' in attrs and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('"from" must not be later than "to".')
+        return attrs
+
+
+class CommaSeparatedListField(serializers.ListField):
+    """ListField read from ``?key=a,b`` as well as ``?key=a&key=b``."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [data]
+        if isinstance(data, list):
+            data = [item.strip() for value in data for item in str(value).split(',') if item.strip()]
+        return super().to_internal_value(data)
+
+
+class TourSearchQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False, help_text='Tours starting on or after this day.')
+    date_to = serializers.DateField(required=False, help_text='Tours ending on or before this day.')
+    price_min = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    price_max = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    category = CommaSeparatedListField(child=serializers.CharField(), required=False)
+    season = CommaSeparatedListField(child=serializers.CharField(), required=False)
+    theme = CommaSeparatedListField(child=serializers.CharField(), required=False)
+    difficulty = CommaSeparatedListField(child=serializers.IntegerField(), required=False)
+    region = CommaSeparatedListField(child=serializers.IntegerField(), required=False)
+    available = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        if 'date_from' in attrs and 'date_to' in attrs and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('"date_from" must not be later than "date_to".')
+        if 'price_min' in attrs and 'price_max' in attrs and attrs['price_min'] > attrs['price_max']:
+            raise serializers.ValidationError('"price_min" must not be greater than "price_max".')
+        return attrs
+
+
+class HotelOccupancyQuerySerializer(serializers.Serializer):
+    hotel = CommaSeparatedListField(child=serializers.IntegerField(), required=False)
+    city = serializers.IntegerField(required=False)
+    month_from = serializers.RegexField(r'^\d{4}-(0[1-9]|1[0-2])$', required=False, help_text='YYYY-MM')
+    month_to = serializers.RegexField(r'^\d{4}-(0[1-9]|1[0-2])$', required=False, help_text='YYYY-MM')
+    calendar_season = serializers.ChoiceField(choices=sorted(set(CALENDAR_SEASONS.values())), required=False)
+    min_bookings = serializers.IntegerField(min_value=0, required=False)
+
+
+class GuideAvailabilityQuerySerializer(serializers.Serializer):
+    city = serializers.IntegerField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    language = serializers.CharField(required=False, help_text='Only guides speaking this language.')
+
+    def validate(self, attrs):
+        if attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError('"start" must be earlier than "end".')
+        return attrs
+
+
+class AvailableGuideSerializer(serializers.Serializer):
+    guide_id = serializers.IntegerField()
+    first_name = serializers.CharField()
+    last_name = serializers.CharField()
+    languages = serializers.CharField()
+    city = serializers.IntegerField(source='city_id')
+    hourly_rate = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class CoTravellerQuerySerializer(serializers.Serializer):
+    depth = serializers.IntegerField(min_value=1, max_value=MAX_DEPTH, default=1)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+    offset = serializers.IntegerField(min_value=0, default=0)
+
+
+class RecommendationQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=TOP_K, default=10)
+
+
+class RecommendedTourSerializer(serializers.Serializer):
+    tour_id = serializers.IntegerField(source='tour.tour_id')
+    name = serializers.CharField(source='tour.name')
+    category = serializers.CharField(source='tour.category')
+    start_date = serializers.DateField(source='tour.start_date')
+    end_date = serializers.DateField(source='tour.end_date')
+    price = serializers.DecimalField(source='tour.price', max_digits=10, decimal_places=2)
+    score = serializers.FloatField(help_text='Higher is closer.')
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200, help_text='Words to look for; the last one may be a prefix.')
+    type = CommaSeparatedListField(
+        child=serializers.ChoiceField(choices=list(SOURCES)), required=False,
+        help_text='Only these result types.'
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+    offset = serializers.IntegerField(min_value=0, max_value=1000, default=0)
+
+
+class SearchResultSerializer(serializers.Serializer):
+    type = serializers.CharField()
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    snippet = serializers.CharField()
+    score = serializers.FloatField()
+    url = serializers.URLField()
+
+
+class PaymentBucketSerializer(serializers.Serializer):
+    period = serializers.CharField()
+    period_start = serializers.DateField()
+    method = serializers.CharField(required=False)
+    deposits = serializers.DecimalField(max_digits=14, decimal_places=2)
+    full_payments = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total_income = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
 class EmployeePerformanceSerializer(serializers.Serializer):
     employee_name = serializers.CharField()
     total_bookings = serializers.IntegerField()
@@ -246,27 +482,27 @@ class EmployeePerformanceSerializer(serializers.Serializer):
     performance_category = serializers.CharField()
 
 
-class ClientDetailSerializer(serializers.ModelSerializer):
-    client_name = serializers.CharField(read_only=True)
-    total_bookings = serializers.IntegerField(read_only=True)
-    last_booking_date = serializers.CharField(read_only=True)
-    last_tour = serializers.CharField(read_only=True)
-    last_rating = serializers.CharField(read_only=True)
-    last_comment = serializers.CharField(read_only=True)
+class StoredDateTimeField(serializers.DateTimeField):
+    """
+    A datetime written as the database stores it, "YYYY-MM-DD HH:MM:SS" in
+    UTC with microseconds when there are any: the text the client list
+    answered when it selected the raw column.
+    """
 
-    class Meta:
-        model = Client
-        fields = [
-            'client_id',
-            'client_name',
-            'email',
-            'phone',
-            'total_bookings',
-            'last_booking_date',
-            'last_tour',
-            'last_rating',
-            'last_comment'
-        ]
+    def to_representation(self, value):
+        return value.astimezone(timezone.utc).replace(tzinfo=None).isoformat(sep=' ')
+
+
+class ClientDetailSerializer(serializers.Serializer):
+    client_id = serializers.IntegerField()
+    client_name = serializers.CharField()
+    email = serializers.EmailField()
+    phone = serializers.CharField()
+    total_bookings = serializers.IntegerField()
+    last_booking_date = StoredDateTimeField()
+    last_tour = serializers.CharField(source='last_tour_name')
+    last_rating = serializers.CharField()
+    last_comment = serializers.CharField()
 
 
 class TourThemeStatsSerializer(serializers.Serializer):
@@ -0,0 +1,54 @@
+# tours/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_versions
+from .capacity import apply_seat_deltas, seat_deltas
+from .cotravel import refresh_clients
+from .models import (
+    Booking, ClientSummary, CoTraveller, HotelOccupancy, Review, Tour, TourExcursion, TourHotel, TourStats,
+)
+from .occupancy import apply_occupancy_deltas, booking_deltas, stay_deltas
+from .summary import refresh_summaries
+from .tourstats import apply_stat_deltas, booking_stat_deltas, excursion_stat_deltas, review_stat_deltas
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_version(sender, using=None, **kwargs):
+    if sender._meta.app_label == 'tours':
+        # Bump again on commit: a reader that computed a response between the
+        # write and the commit may have cached pre-write data under the first
+        # bump.
+        bump_versions(sender)
+        transaction.on_commit(lambda: bump_versions(sender), using=using)
+
+
+@receiver(post_delete, sender=Booking)
+def release_seat(sender, instance, using=None, **kwargs):
+    deltas = seat_deltas([((instance.tour_id, instance.status), None)])
+    apply_seat_deltas(Tour, deltas, using=using)
+    apply_occupancy_deltas(HotelOccupancy, booking_deltas(TourHotel, deltas, using=using), using=using)
+    refresh_clients(CoTraveller, Booking, [instance.client_id], using=using)
+    refresh_summaries(ClientSummary, Booking, Review, [instance.client_id], using=using)
+    before = (instance.tour_id, instance.status, instance.total_price)
+    apply_stat_deltas(TourStats, booking_stat_deltas([(before, None)]), using=using)
+
+
+@receiver(post_delete, sender=Review)
+def forget_review(sender, instance, using=None, **kwargs):
+    refresh_summaries(ClientSummary, Booking, Review, [instance.client_id], using=using)
+    apply_stat_deltas(TourStats, review_stat_deltas([((instance.tour_id, instance.rating), None)]), using=using)
+
+
+@receiver(post_delete, sender=TourExcursion)
+def drop_excursion(sender, instance, using=None, **kwargs):
+    before = (instance.tour_id, instance.included_in_price)
+    apply_stat_deltas(TourStats, excursion_stat_deltas([(before, None)]), using=using)
+
+
+@receiver(post_delete, sender=TourHotel)
+def release_stay(sender, instance, using=None, **kwargs):
+    before = (instance.tour_id, instance.hotel_id, instance.check_in_date)
+    apply_occupancy_deltas(HotelOccupancy, stay_deltas(Tour, [(before, None)], using=using), using=using)
@@ -0,0 +1,107 @@
+# tours/sparse.py
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+# Model -> the DynamicFieldsModelSerializer used to render it when expanded.
+expandable_serializers = {}
+
+
+def sparse_params(request):
+    """``(fields, expand)`` requested on a GET, as lists of names."""
+    if request is None or request.method != 'GET':
+        return [], []
+    return [
+        [name.strip() for name in request.query_params.get(param, '').split(',') if name.strip()]
+        for param in (FIELDS_PARAM, EXPAND_PARAM)
+    ]
+
+
+def _foreign_key(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.many_to_one and field.concrete else None
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer honouring ``?fields=a,b`` and ``?expand=fk`` on GET.
+
+    ``fields`` keeps only the named fields, ``expand`` renders the named
+    foreign keys as nested objects instead of ids. Nested serializers are
+    built without a request, so the parameters only shape the top level.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        meta = getattr(cls, 'Meta', None)
+        if meta is not None and hasattr(meta, 'model'):
+            expandable_serializers.setdefault(meta.model, cls)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, expand = sparse_params(self._context.get('request'))
+        if not fields and not expand:
+            return
+
+        model = self.Meta.model
+        for name in expand:
+            field = _foreign_key(model, name)
+            nested = expandable_serializers.get(field.related_model) if field else None
+            if nested is not None and name in self.fields:
+                self.fields[name] = nested(read_only=True)
+
+        if fields:
+            keep = set(fields) | set(expand)
+            for name in [name for name in self.fields if name not in keep]:
+                self.fields.pop(name)
+
+
+class SparseFieldsMixin:
+    """
+    Narrows a viewset's queryset to what ``?fields=`` / ``?expand=`` ask for:
+    ``only()`` the requested columns and ``select_related()`` the expanded
+    foreign keys, so the database reads no more than the serializer writes.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, expand = sparse_params(self.request)
+        if not fields and not expand:
+            return queryset
+
+        model = queryset.model
+        relations = [name for name in expand if _foreign_key(model, name)]
+        if relations:
+            queryset = queryset.select_related(*relations)
+
+        if fields:
+            columns = {model._meta.pk.name}
+            # Keyset pagination reads the sort keys of every row.
+            for key in list(getattr(self, 'ordering', None) or ()) + list(getattr(self, 'ordering_fields', None) or ()):
+                columns.add(key.lstrip('-'))
+            for name in fields:
+                try:
+                    if model._meta.get_field(name).concrete:
+                        columns.add(name)
+                except FieldDoesNotExist:
+                    pass
+            for name in relations:
+                columns.add(name)
+                related = _foreign_key(model, name).related_model
+                columns.update(f'{name}__{field.name}' for field in related._meta.concrete_fields)
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_etag_models(self):
+        models = tuple(super().get_etag_models())
+        _, expand = sparse_params(self.request)
+        model = self.get_queryset().model
+        return models + tuple(
+            _foreign_key(model, name).related_model for name in expand if _foreign_key(model, name)
+        )
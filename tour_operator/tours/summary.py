@@ -0,0 +1,124 @@
+# tours/summary.py
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from .cache import bump_versions
+
+
+SUMMARY_FIELDS = ('total_bookings', 'last_booking_date', 'last_tour', 'last_review', 'last_review_date')
+
+
+def record_booking(summary_model, review_model, booking, using=None):
+    """
+    Count a new booking in the summary row of its client with one
+    conditional ``UPDATE``; the first booking of a client creates the row.
+    Call it once the booking is saved.
+    """
+    rows = summary_model._base_manager.using(using)
+    newer = Q(last_booking_date__lte=booking.booking_date)
+    updated = rows.filter(client_id=booking.client_id).update(
+        total_bookings=F('total_bookings') + 1,
+        last_booking_date=Case(When(newer, then=Value(booking.booking_date)), default=F('last_booking_date')),
+        last_tour_id=Case(
+            When(newer, then=Value(booking.tour_id)), default=F('last_tour_id'), output_field=IntegerField()
+        ),
+    )
+    if not updated:
+        review = review_model._base_manager.using(using).filter(client_id=booking.client_id).order_by(
+            '-review_date', '-pk'
+        ).values_list('pk', 'review_date').first() or (None, None)
+        try:
+            with transaction.atomic(using=using):
+                rows.create(
+                    client_id=booking.client_id, total_bookings=1, last_booking_date=booking.booking_date,
+                    last_tour_id=booking.tour_id, last_review_id=review[0], last_review_date=review[1],
+                )
+        except IntegrityError:
+            # created concurrently: count from the stored bookings instead
+            refresh_summaries(summary_model, type(booking), review_model, [booking.client_id], using)
+            return
+    _bump(summary_model, using)
+
+
+def record_review(summary_model, review, using=None):
+    """Make a new review the last one of its client's summary row, if it is the latest."""
+    newer = Q(last_review_date__isnull=True) | Q(last_review_date__lte=review.review_date)
+    summary_model._base_manager.using(using).filter(client_id=review.client_id).update(
+        last_review_id=Case(
+            When(newer, then=Value(review.pk)), default=F('last_review_id'), output_field=IntegerField()
+        ),
+        last_review_date=Case(When(newer, then=Value(review.review_date)), default=F('last_review_date')),
+    )
+    _bump(summary_model, using)
+
+
+def _summaries(summary_model, booking_model, review_model, client_ids=None, using=None):
+    """
+    Summary rows recomputed from the stored bookings and reviews of
+    ``client_ids`` (every client if ``None``), one ordered scan of each.
+    Clients without bookings get no row.
+    """
+    bookings = booking_model._base_manager.using(using).all()
+    reviews = review_model._base_manager.using(using).all()
+    if client_ids is not None:
+        bookings = bookings.filter(client_id__in=client_ids)
+        reviews = reviews.filter(client_id__in=client_ids)
+
+    rows = {}
+    for client_id, booking_date, tour_id in bookings.order_by('client_id', '-booking_date', '-pk').values_list(
+        'client_id', 'booking_date', 'tour_id'
+    ):
+        row = rows.get(client_id)
+        if row is None:
+            rows[client_id] = summary_model(
+                client_id=client_id, total_bookings=1, last_booking_date=booking_date, last_tour_id=tour_id,
+            )
+        else:
+            row.total_bookings += 1
+    for client_id, review_id, review_date in reviews.order_by('client_id', '-review_date', '-pk').values_list(
+        'client_id', 'pk', 'review_date'
+    ):
+        row = rows.get(client_id)
+        if row is not None and row.last_review_id is None:
+            row.last_review_id = review_id
+            row.last_review_date = review_date
+    return [rows[client_id] for client_id in sorted(rows)]
+
+
+def refresh_summaries(summary_model, booking_model, review_model, client_ids, using=None):
+    """
+    Bring the summary rows of ``client_ids`` back in line with the stored
+    bookings and reviews, for the changes ``record_booking()`` and
+    ``record_review()`` cannot apply: moves and deletes.
+    """
+    client_ids = set(client_ids)
+    if not client_ids:
+        return
+    rows = _summaries(summary_model, booking_model, review_model, client_ids, using)
+    manager = summary_model._base_manager.using(using)
+    emptied = client_ids - {row.client_id for row in rows}
+    if emptied:
+        manager.filter(client_id__in=emptied).delete()
+    manager.bulk_create(
+        rows, update_conflicts=True, unique_fields=['client'], update_fields=list(SUMMARY_FIELDS)
+    )
+    _bump(summary_model, using)
+
+
+def rebuild_summaries(summary_model, booking_model, review_model, using=DEFAULT_DB_ALIAS):
+    """Recompute every summary row. Returns the number of rows."""
+    rows = _summaries(summary_model, booking_model, review_model, using=using)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        # one statement, without loading the rows for delete signals
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(summary_model._meta.db_table)}')
+        summary_model._base_manager.using(using).bulk_create(rows, batch_size=1000)
+        _bump(summary_model, using)
+    return len(rows)
+
+
+def _bump(summary_model, using):
+    # QuerySet.update() and bulk_create() send no post_save.
+    bump_versions(summary_model)
+    transaction.on_commit(lambda: bump_versions(summary_model), using=using)
@@ -1,3 +1,1665 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import Avg, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from .models import (
+    Booking, ChinaCity, ChinaRegion, ChineseGuide, Client, ClientSummary, CoTraveller, Employee, Excursion, Festival, Hotel,
+    HotelOccupancy, Payment, Review, Tour, TourExcursion, TourFestival, TourHotel, TourRegion, TourTransport,
+    TourSimilarity, TourStats, TransportProvider, Visa, VisaType,
+)
+from .benchmark import endpoints, row_counts, run_endpoints, seed
+from .bulk import explicit_auto_dates
+from .cache import bump_versions
+from .capacity import TourFullError, recount_seats
+from .facets import search_tours
+from .fastpath import render_rows
+from .instrumentation import normalize_sql
+from .reports.api_views import monthly_payment_stats
+from .serializers import (
+    BookingSerializer, ClientDetailSerializer, MonthlyPaymentStatsSerializer, PaymentSerializer, TourSerializer,
+)
+
+
+def make_client(n=1, **fields):
+    defaults = {
+        'first_name': f'Client{n}', 'last_name': 'Test', 'email': f'client{n}@example.com',
+        'phone': '+70000000000', 'passport_data': f'0000 {n:06d}',
+    }
+    defaults.update(fields)
+    return Client.objects.create(**defaults)
+
+
+def make_employee(n=1, **fields):
+    defaults = {
+        'first_name': f'Employee{n}', 'last_name': 'Test', 'position': 'Agent',
+        'email': f'employee{n}@example.com', 'phone': '+70000000000', 'hire_date': date(2023, 1, 1),
+    }
+    defaults.update(fields)
+    return Employee.objects.create(**defaults)
+
+
+def make_tour(n=1, **fields):
+    defaults = {
+        'name': f'Tour {n}', 'description': 'Test tour', 'start_date': date(2024, 5, 1),
+        'end_date': date(2024, 5, 10), 'duration_days': 10, 'max_participants': 20,
+        'price': Decimal('1000.00'), 'category': 'Cultural', 'season': 'High',
+        'difficulty_level': 2, 'theme': 'History',
+    }
+    defaults.update(fields)
+    return Tour.objects.create(**defaults)
+
+
+class ReportTestCase(TestCase):
+    """Report responses are cached across requests; start every test cold."""
+
+    def setUp(self):
+        cache.clear()
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        client = make_client()
+        tour = make_tour()
+        employee = make_employee()
+        Booking.objects.bulk_create([
+            Booking(client=client, tour=tour, employee=employee, total_price=Decimal('100.00'))
+            for _ in range(20)
+        ])
+        self.booking_ids = list(Booking.objects.order_by('booking_id').values_list('booking_id', flat=True))
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['booking_id'] for row in response.json()['results'])
+            url = response.json()['next']
+        return seen
+
+    def test_walks_every_row_once_in_pk_order(self):
+        self.assertEqual(self.walk('/api/bookings/?page_size=7'), self.booking_ids)
+
+    def test_secondary_sort_key(self):
+        expected = list(
+            Booking.objects.order_by('-booking_date', '-booking_id').values_list('booking_id', flat=True)
+        )
+        self.assertEqual(self.walk('/api/bookings/?page_size=4&ordering=-booking_date'), expected)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get('/api/bookings/?page_size=5').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertIsNone(first['previous'])
+        self.assertEqual(back['results'], first['results'])
+
+    def test_no_count_query(self):
+        first = self.client.get('/api/bookings/?page_size=5').json()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first['next'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_page_size_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=3):
+            response = self.client.get('/api/bookings/?page_size=100')
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/bookings/?cursor=garbage').status_code, 404)
+
+
+class EmployeePerformanceTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        visa_type = VisaType.objects.create(
+            name='Tourist', processing_days=10, validity_months=3, entries_allowed=1, price=Decimal('50.00')
+        )
+        clients = [make_client(n) for n in range(1, 4)]
+        # Two visas for the first client fan the booking x visa join out.
+        for client, year in ((clients[0], 2021), (clients[0], 2022), (clients[1], 2023)):
+            Visa.objects.create(
+                client=client, visa_type=visa_type, status='Approved', application_date=date(year, 3, 1)
+            )
+        agents = [make_employee(n) for n in range(1, 5)]
+        manager = make_employee(5, position='Manager')
+        tour = make_tour()
+
+        bookings = [
+            (agents[0], clients[0], '1200.00', 'Confirmed'),
+            (agents[0], clients[2], '800.00', 'Pending'),
+            (agents[1], clients[1], '3000.00', 'Confirmed'),
+            (agents[1], clients[1], '500.00', 'Cancelled'),
+            (agents[1], clients[2], '700.00', 'Confirmed'),
+            (agents[2], clients[0], '2500.00', 'Pending'),
+            (agents[3], clients[1], '900.00', 'Confirmed'),
+            (agents[3], clients[1], '900.00', 'Confirmed'),
+            (manager, clients[0], '9999.00', 'Confirmed'),
+        ]
+        for employee, client, price, status in bookings:
+            Booking.objects.create(
+                employee=employee, client=client, tour=tour, total_price=Decimal(price), status=status
+            )
+        Booking.objects.update(booking_date=datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc))
+
+    def test_matches_previous_per_agent_ranking(self):
+        # Captured from the per-agent ranking queries this view used to run.
+        expected = [
+            ('Employee2 Test', 3, '4200.00', '1400.00', '66.67', 6),
+            ('Employee3 Test', 2, '5000.00', '2500.00', '0.00', 9),
+            ('Employee1 Test', 3, '3200.00', '1066.67', '66.67', 10),
+            ('Employee4 Test', 2, '1800.00', '900.00', '100.00', 10),
+        ]
+        response = self.client.get('/api/employees-performance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                (row['employee_name'], row['total_bookings'], row['total_sales'], row['avg_check'],
+                 row['confirmation_rate'], row['composite_rank'])
+                for row in response.json()
+            ],
+            expected,
+        )
+        self.assertEqual({row['performance_category'] for row in response.json()}, {'Top Performer'})
+
+    def vary_dates(self):
+        # processing times of 2.5, 2.0, 0.5 and 3.0 across agents 1-4
+        years = [2024, 2023, 2025, 2023, 2024, 2022, 2024, 2026]
+        for booking, year in zip(Booking.objects.order_by('booking_id'), years):
+            Booking.objects.filter(pk=booking.pk).update(booking_date=datetime(year, 6, 1, 12, 0, tzinfo=timezone.utc))
+        Visa.objects.filter(application_date__year=2023).update(application_date=date(2022, 3, 1))
+
+    def test_time_rank_matches_previous_comparison(self):
+        self.vary_dates()
+        # Captured from the per-agent queries this view used to run.
+        expected = [
+            ('Employee3 Test', 7, 'Top Performer'),
+            ('Employee2 Test', 7, 'Top Performer'),
+            ('Employee1 Test', 9, 'Top Performer'),
+            ('Employee4 Test', 13, 'High Performer'),
+        ]
+        response = self.client.get('/api/employees-performance/')
+        self.assertEqual(
+            [(row['employee_name'], row['composite_rank'], row['performance_category']) for row in response.json()],
+            expected,
+        )
+
+    def test_check_rank_ties_on_rounded_averages(self):
+        # 100.33 on both sides: check rank 5 (four agents above, the two
+        # tied), not 7 as when 100.33 was bisected into floats of 100.333...
+        tour, client = Tour.objects.get(), Client.objects.get(first_name='Client3')
+        for n in (6, 7):
+            agent = make_employee(n)
+            for price in ('100.00', '100.00', '101.00'):
+                Booking.objects.create(employee=agent, client=client, tour=tour, total_price=Decimal(price))
+        rows = {row['employee_name']: row for row in self.client.get('/api/employees-performance/').json()}
+        self.assertEqual([rows[f'Employee{n} Test']['avg_check'] for n in (6, 7)], ['100.33', '100.33'])
+        self.assertEqual([rows[f'Employee{n} Test']['composite_rank'] for n in (6, 7)], [19, 19])
+
+    def test_query_count_does_not_grow_with_agents(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/employees-performance/')
+        baseline = len(queries)
+
+        tour = Tour.objects.get()
+        client = Client.objects.first()
+        for n in range(10, 20):
+            Booking.objects.create(employee=make_employee(n), client=client, tour=tour, total_price=Decimal('10.00'))
+
+        with self.assertNumQueries(baseline):
+            self.client.get('/api/employees-performance/')
+
+
+class PaymentAnalyticsTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        booking = Booking.objects.create(
+            client=make_client(), tour=make_tour(), employee=make_employee(), total_price=Decimal('900.00')
+        )
+        for day, amount, is_deposit, method in (
+            (date(2024, 1, 10), '100.00', True, 'Card'),
+            (date(2024, 1, 20), '250.00', False, 'Card'),
+            (date(2024, 1, 21), '50.00', False, 'Cash'),
+            (date(2024, 3, 5), '500.00', False, 'Bank Transfer'),
+        ):
+            Payment.objects.create(
+                booking=booking, amount=Decimal(amount), is_deposit=is_deposit, method=method,
+                payment_date=datetime(day.year, day.month, day.day, 9, 30, tzinfo=timezone.utc)
+            )
+
+    def test_monthly_stats_lists_months_with_payments(self):
+        response = self.client.get('/api/monthly-stats/')
+        self.assertEqual(response.json(), [
+            {'month': '2024-01', 'deposits': '100.00', 'full_payments': '300.00', 'total_income': '400.00'},
+            {'month': '2024-03', 'deposits': '0.00', 'full_payments': '500.00', 'total_income': '500.00'},
+        ])
+
+    def test_fills_empty_buckets_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/payment-analytics/?granularity=month&from=2023-12-15&to=2024-03-31')
+        self.assertEqual(
+            [(row['period'], row['total_income']) for row in response.json()],
+            [('2023-12', '0.00'), ('2024-01', '400.00'), ('2024-02', '0.00'), ('2024-03', '500.00')],
+        )
+
+    def test_week_and_quarter_granularity(self):
+        weeks = self.client.get('/api/payment-analytics/?granularity=week&from=2024-01-15&to=2024-01-21').json()
+        self.assertEqual(
+            [(row['period_start'], row['total_income']) for row in weeks],
+            [('2024-01-15', '300.00')],
+        )
+        quarters = self.client.get('/api/payment-analytics/?granularity=quarter').json()
+        self.assertEqual([(row['period'], row['total_income']) for row in quarters], [('2024-Q1', '900.00')])
+
+    def test_breakdown_by_method(self):
+        rows = self.client.get('/api/payment-analytics/?from=2024-01-01&to=2024-01-31&breakdown=method').json()
+        self.assertEqual(
+            {row['method']: row['total_income'] for row in rows},
+            {'Bank Transfer': '0.00', 'Card': '350.00', 'Online Payment': '0.00', 'Cash': '50.00'},
+        )
+
+    def test_rejects_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/payment-analytics/?granularity=year').status_code, 400)
+        self.assertEqual(self.client.get('/api/payment-analytics/?from=2024-05-01&to=2024-01-01').status_code, 400)
+
+
+class ReportCacheTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.booking = Booking.objects.create(
+            client=make_client(), tour=make_tour(), employee=make_employee(), total_price=Decimal('900.00')
+        )
+        Payment.objects.create(
+            booking=cls.booking, amount=Decimal('100.00'), method='Card',
+            payment_date=datetime(2024, 1, 10, tzinfo=timezone.utc)
+        )
+
+    def test_repeated_request_is_served_from_cache(self):
+        first = self.client.get('/api/monthly-stats/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/monthly-stats/')
+        self.assertEqual(first.json(), second.json())
+
+    def test_write_to_a_read_model_invalidates(self):
+        self.client.get('/api/monthly-stats/')
+        Payment.objects.create(
+            booking=self.booking, amount=Decimal('50.00'), method='Cash',
+            payment_date=datetime(2024, 1, 11, tzinfo=timezone.utc)
+        )
+        response = self.client.get('/api/monthly-stats/')
+        self.assertEqual(response.json()[0]['total_income'], '150.00')
+
+    def test_unrelated_write_keeps_cache(self):
+        self.client.get('/api/monthly-stats/')
+        make_tour(2)
+        with self.assertNumQueries(0):
+            self.client.get('/api/monthly-stats/')
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get('/api/payment-analytics/?granularity=month')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/payment-analytics/?granularity=day')
+        self.assertEqual(response.json()[0]['period'], '2024-01-10')
+
+
+class ConditionalGetTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tour = make_tour()
+
+    def test_list_revalidates_with_304(self):
+        response = self.client.get('/api/tours/')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tours/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get(f'/api/tours/{self.tour.pk}/')['ETag']
+        self.client.patch(f'/api/tours/{self.tour.pk}/', {'price': '1200.00'}, content_type='application/json')
+        response = self.client.get(f'/api/tours/{self.tour.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['price'], '1200.00')
+
+    def test_etag_depends_on_query_string(self):
+        first = self.client.get('/api/tours/')['ETag']
+        self.assertNotEqual(self.client.get('/api/tours/?page_size=1')['ETag'], first)
+
+    def test_report_revalidates_with_304(self):
+        etag = self.client.get('/api/tour-theme-analysis/')['ETag']
+        response = self.client.get('/api/tour-theme-analysis/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        make_tour(2)
+        response = self.client.get('/api/tour-theme-analysis/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class BulkWriteTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.clients = [make_client(n) for n in range(1, 4)]
+        cls.tour = make_tour(max_participants=100)
+        cls.employee = make_employee()
+
+    def post(self, url, payload):
+        return self.client.post(url, payload, content_type='application/json')
+
+    def test_creates_in_constant_number_of_queries(self):
+        def payload(size):
+            return [
+                {'client': self.clients[n % 3].pk, 'tour': self.tour.pk, 'employee': self.employee.pk,
+                 'total_price': '500.00'}
+                for n in range(size)
+            ]
+
+        # the first bookings also link the clients as co-travellers
+        self.assertEqual(self.post('/api/bookings/bulk/', payload(3)).status_code, 200)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.post('/api/bookings/bulk/', payload(3)).status_code, 200)
+        with CaptureQueriesContext(connection) as large:
+            response = self.post('/api/bookings/bulk/', payload(60))
+        self.assertEqual(response.json()['created'], 60)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(Booking.objects.count(), 66)
+
+    def test_upsert_updates_items_with_pk(self):
+        booking = Booking.objects.create(
+            client=self.clients[0], tour=self.tour, employee=self.employee, total_price=Decimal('100.00')
+        )
+        response = self.post('/api/bookings/bulk/', [
+            {'booking_id': booking.pk, 'status': 'Confirmed'},
+            {'client': self.clients[1].pk, 'tour': self.tour.pk, 'total_price': '700.00'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['created'], response.json()['updated']), (1, 1))
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.total_price), ('Confirmed', Decimal('100.00')))
+
+    def test_reports_errors_per_item_and_writes_nothing(self):
+        response = self.post('/api/bookings/bulk/', [
+            {'client': self.clients[0].pk, 'tour': self.tour.pk, 'total_price': '100.00'},
+            {'client': 9999, 'tour': self.tour.pk, 'total_price': '100.00'},
+            {'booking_id': 9999, 'status': 'Confirmed'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('client', errors[1])
+        self.assertIn('booking_id', errors[2])
+        self.assertFalse(Booking.objects.exists())
+
+    def test_unique_together_checked_in_batch(self):
+        festival = Festival.objects.create(
+            name='Lantern', date_start=date(2024, 2, 1), date_end=date(2024, 2, 3),
+            location='Beijing', popularity=5, description='Lanterns'
+        )
+        other = make_tour(2)
+        TourFestival.objects.create(tour=self.tour, festival=festival)
+        response = self.post('/api/tour-festivals/bulk/', [
+            {'tour': self.tour.pk, 'festival': festival.pk},
+            {'tour': other.pk, 'festival': festival.pk},
+            {'tour': other.pk, 'festival': festival.pk},
+        ])
+        errors = response.json()['errors']
+        self.assertIn('non_field_errors', errors[0])
+        self.assertEqual(errors[1], {})
+        self.assertIn('non_field_errors', errors[2])
+
+    def test_bulk_write_invalidates_reports(self):
+        etag = self.client.get('/api/bookings/')['ETag']
+        self.post('/api/bookings/bulk/', [{'client': self.clients[0].pk, 'tour': self.tour.pk, 'total_price': '1.00'}])
+        self.assertEqual(self.client.get('/api/bookings/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'checks SQLite query plans')
+class IndexUsageTests(TestCase):
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_booking_indexes(self):
+        self.assertUsesIndex(
+            Booking.objects.filter(client_id=1).order_by('-booking_date').values('booking_date')[:1],
+            'booking_client_date_idx',
+        )
+        self.assertUsesIndex(
+            Booking.objects.filter(employee_id=1, status='Confirmed'), 'booking_employee_status_idx'
+        )
+        self.assertUsesIndex(
+            Booking.objects.filter(tour_id=1).exclude(status='Cancelled'), 'booking_tour_status_idx'
+        )
+        self.assertUsesIndex(
+            Booking.objects.filter(booking_date__gt=datetime(2024, 1, 1, tzinfo=timezone.utc))
+            .order_by('booking_date', 'booking_id')[:50],
+            'booking_date_idx',
+        )
+
+    def test_payment_analytics_index_covers_query(self):
+        plan = Payment.objects.filter(
+            payment_date__gte=datetime(2024, 1, 1, tzinfo=timezone.utc)
+        ).values('is_deposit').annotate(total=Sum('amount')).explain()
+        self.assertIn('COVERING INDEX payment_date_deposit_idx', plan)
+
+    def test_review_indexes(self):
+        self.assertUsesIndex(
+            Review.objects.filter(client_id=1).order_by('-review_date').values('rating')[:1],
+            'review_client_date_idx',
+        )
+        self.assertUsesIndex(
+            Review.objects.filter(tour_id=1).values('tour_id').annotate(avg=Avg('rating')),
+            'review_tour_rating_idx',
+        )
+
+    def test_tour_indexes(self):
+        self.assertUsesIndex(Tour.objects.filter(theme='History'), 'tour_theme_idx')
+        self.assertUsesIndex(
+            TourExcursion.objects.filter(tour_id=1, included_in_price=False), 'tourexcursion_tour_paid_idx'
+        )
+
+
+class TourItineraryTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tour = make_tour()
+        region = ChinaRegion.objects.create(name='Sichuan')
+        cls.city = ChinaCity.objects.create(name='Chengdu', region=region)
+        cls.region = region
+
+    def add_stops(self, count):
+        provider = TransportProvider.objects.create(
+            name='Rail', contact_person='Li', contact_phone='1', contact_email='rail@example.com', service_type='Train'
+        )
+        for n in range(count):
+            day = date(2024, 5, 1 + n)
+            hotel = Hotel.objects.create(
+                name=f'Hotel {n}', address='Street', city=self.city, star_rating=4,
+                contact_phone='1', email=f'hotel{n}@example.com'
+            )
+            TourHotel.objects.create(
+                tour=self.tour, hotel=hotel, check_in_date=day, check_out_date=day,
+                room_type='Standard', meals_included='Breakfast'
+            )
+            excursion = Excursion.objects.create(
+                name=f'Excursion {n}', description='Walk', duration_hours=2, guide_language='English',
+                price=Decimal('30.00'), location=self.city
+            )
+            guide = ChineseGuide.objects.create(
+                first_name='Wang', last_name=str(n), languages='English', city=self.city, hourly_rate=Decimal('20.00')
+            )
+            TourExcursion.objects.create(
+                tour=self.tour, excursion=excursion, guide=guide,
+                schedule_datetime=datetime(2024, 5, 10 - n, 9, tzinfo=timezone.utc)
+            )
+            TourTransport.objects.create(
+                tour=self.tour, company=provider, direction_type='Intercity', departure_city=self.city,
+                arrival_city=self.city, departure_datetime=datetime(2024, 5, 1 + n, 8, tzinfo=timezone.utc),
+                arrival_datetime=datetime(2024, 5, 1 + n, 12, tzinfo=timezone.utc)
+            )
+            festival = Festival.objects.create(
+                name=f'Festival {n}', date_start=day, date_end=day, location='Chengdu', popularity=3,
+                description='Fest'
+            )
+            TourFestival.objects.create(tour=self.tour, festival=festival)
+        TourRegion.objects.update_or_create(tour=self.tour, region=self.region, defaults={'days_spent': count})
+
+    def test_nested_and_sorted_by_date(self):
+        self.add_stops(3)
+        data = self.client.get(f'/api/tours/{self.tour.pk}/itinerary/').json()
+        self.assertEqual([row['hotel']['name'] for row in data['hotels']], ['Hotel 0', 'Hotel 1', 'Hotel 2'])
+        self.assertEqual(
+            [row['excursion']['name'] for row in data['excursions']],
+            ['Excursion 2', 'Excursion 1', 'Excursion 0'],
+        )
+        self.assertEqual(data['excursions'][0]['guide']['city']['name'], 'Chengdu')
+        self.assertEqual(data['transports'][0]['arrival_city']['name'], 'Chengdu')
+        self.assertEqual(data['regions'][0]['region']['name'], 'Sichuan')
+        self.assertEqual(len(data['festivals']), 3)
+
+    def test_query_count_is_independent_of_itinerary_size(self):
+        self.add_stops(1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(f'/api/tours/{self.tour.pk}/itinerary/')
+        self.add_stops(8)
+        cache.clear()
+        with self.assertNumQueries(len(small)):
+            self.client.get(f'/api/tours/{self.tour.pk}/itinerary/')
+
+    def test_unknown_tour(self):
+        self.assertEqual(self.client.get('/api/tours/999/itinerary/').status_code, 404)
+
+
+class SparseFieldsTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_obj = make_client()
+        cls.tour = make_tour()
+        for _ in range(3):
+            Booking.objects.create(client=cls.client_obj, tour=cls.tour, total_price=Decimal('100.00'))
+
+    def test_fields_limits_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tours/?fields=tour_id,name')
+        self.assertEqual(response.json()['results'], [{'tour_id': self.tour.pk, 'name': 'Tour 1'}])
+        self.assertNotIn('description', queries[-1]['sql'])
+
+    def test_expand_nests_foreign_key_with_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/bookings/?fields=booking_id,client&expand=client')
+        rows = response.json()['results']
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['client']['email'], 'client1@example.com')
+        self.assertEqual(set(rows[0]), {'booking_id', 'client'})
+
+    def test_retrieve_and_ordering_keep_working(self):
+        booking = Booking.objects.first()
+        response = self.client.get(f'/api/bookings/{booking.pk}/?fields=status&expand=tour')
+        self.assertEqual(response.json(), {'status': 'Pending', 'tour': response.json()['tour']})
+        self.assertEqual(response.json()['tour']['name'], 'Tour 1')
+        with self.assertNumQueries(1):
+            self.client.get('/api/bookings/?fields=status&ordering=-booking_date&page_size=2')
+
+    def test_writes_ignore_sparse_params(self):
+        response = self.client.post(
+            '/api/bookings/?fields=booking_id',
+            {'client': self.client_obj.pk, 'tour': self.tour.pk, 'total_price': '10.00'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('total_price', response.json())
+
+
+class FastListTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        client = make_client()
+        tour = make_tour()
+        cls.bookings = [
+            Booking.objects.create(
+                client=client, tour=tour, employee=make_employee(n) if n % 2 else None,
+                total_price=Decimal('1234.50') + n, status='Confirmed'
+            )
+            for n in range(5)
+        ]
+        for n, booking in enumerate(cls.bookings):
+            Payment.objects.create(
+                booking=booking, amount=Decimal('10.05'), method='Card', is_deposit=bool(n % 2),
+                payment_date=datetime(2024, 3, n + 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+                transaction_id=None if n % 2 else f'TX{n}',
+            )
+
+    def assertSameAsSerializer(self, url, serializer_class, queryset):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        self.assertEqual(JSONRenderer().render(response.json()['results']), expected)
+
+    def test_output_is_byte_identical(self):
+        self.assertSameAsSerializer('/api/bookings/', BookingSerializer, Booking.objects.order_by('booking_id'))
+        self.assertSameAsSerializer('/api/payments/', PaymentSerializer, Payment.objects.order_by('payment_id'))
+        self.assertSameAsSerializer('/api/tours/', TourSerializer, Tour.objects.order_by('tour_id'))
+
+    def test_report_rows_are_byte_identical(self):
+        rows = monthly_payment_stats()
+        detail = {
+            'client_id': 1, 'client_name': 'Client1 Test', 'email': 'client1@example.com', 'phone': '+7',
+            'total_bookings': 2, 'last_booking_date': self.bookings[0].booking_date, 'last_tour_name': 'Tour 1',
+            'last_rating': 'Нет оценки', 'last_comment': 'Нет отзыва',
+        }
+        for serializer_class, rows in ((MonthlyPaymentStatsSerializer, rows), (ClientDetailSerializer, [detail])):
+            self.assertEqual(
+                JSONRenderer().render(render_rows(serializer_class, rows)),
+                JSONRenderer().render(serializer_class(rows, many=True).data),
+            )
+
+    def test_no_model_instances_are_built(self):
+        with self.assertNumQueries(1), mock.patch.object(Booking, 'from_db') as from_db:
+            response = self.client.get('/api/bookings/?fields=booking_id,total_price&page_size=2')
+        from_db.assert_not_called()
+        self.assertEqual(response.json()['results'][0], {
+            'booking_id': self.bookings[0].pk, 'total_price': '1234.50',
+        })
+
+    def test_pagination_cursor_from_rows(self):
+        seen, url = [], '/api/payments/?page_size=2&ordering=-payment_date'
+        while url:
+            page = self.client.get(url).json()
+            seen.extend(row['payment_id'] for row in page['results'])
+            url = page['next']
+        self.assertEqual(
+            seen, list(Payment.objects.order_by('-payment_date', '-payment_id').values_list('payment_id', flat=True))
+        )
+
+    def test_expand_falls_back_to_serializer(self):
+        response = self.client.get('/api/bookings/?expand=client&page_size=1')
+        self.assertEqual(response.json()['results'][0]['client']['email'], 'client1@example.com')
+
+
+class QueryInstrumentationTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_tour()
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tours/')
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=\d+\.\d;desc="{} quer(y|ies)", app;dur=\d+\.\d$'.format(len(queries))
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=1.0)
+    def test_slow_queries_are_logged_with_view_and_normalised_sql(self):
+        with self.assertLogs('tours.slow_sql', 'WARNING') as logs:
+            self.client.get('/api/tours/?ordering=price&page_size=5')
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(entry['view'], 'tour-list')
+        self.assertIn('LIMIT ?', entry['sql'])
+        self.assertNotIn('%s', entry['sql'])
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=0.0)
+    def test_sampling(self):
+        with self.assertNoLogs('tours.slow_sql'):
+            self.client.get('/api/tours/')
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT *  FROM t\n WHERE a = 'x''y' AND b IN (%s, %s, %s) AND c > 10.5"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) AND c > ?'
+        )
+
+
+class BenchmarkSuiteTests(ReportTestCase):
+    def test_seed_and_time_every_endpoint(self):
+        rows = seed(scale=0.01)
+        self.assertEqual(rows[Booking], row_counts(0.01)[Booking])
+        self.assertEqual(rows[TourRegion], TourRegion.objects.values('tour', 'region').distinct().count())
+
+        paths = endpoints()
+        self.assertIn('/api/tour-theme-analysis/', paths)
+        self.assertIn('/api/tours/search/', paths)
+        self.assertIn('/api/tours/availability/', paths)
+        self.assertTrue(any(path.endswith('/co-travellers/') for path in paths))
+        results = run_endpoints(paths, repeat=2)
+        self.assertEqual([row['endpoint'] for row in results], paths)
+        for row in results:
+            self.assertEqual(row['status'], 200, row['endpoint'])
+            self.assertGreater(row['queries'], 0, row['endpoint'])
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+
+
+class StreamingLoaderTests(TestCase):
+    def setUp(self):
+        client = make_client()
+        tour = make_tour()
+        booking = Booking.objects.create(client=client, tour=tour, total_price=Decimal('10.00'))
+        Booking.objects.filter(pk=booking.pk).update(booking_date=datetime(2020, 2, 3, 4, 5, tzinfo=timezone.utc))
+        Payment.objects.create(
+            booking=booking, amount=Decimal('5.00'), method='Card',
+            payment_date=datetime(2020, 2, 4, tzinfo=timezone.utc),
+        )
+        out = io.StringIO()
+        call_command('dumpdata', 'tours.Payment', 'tours.Booking', 'tours.Tour', 'tours.Client', stdout=out)
+        # Dependents first: the loader has to reorder them.
+        self.records = json.loads(out.getvalue())
+        self.assertEqual(self.records[0]['model'], 'tours.payment')
+        Client.objects.all().delete()
+        Tour.objects.all().delete()
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmpdir.name, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as fh:
+            fh.write(text)
+        return path
+
+    def assertLoaded(self):
+        booking = Booking.objects.get()
+        self.assertEqual(booking.booking_date, datetime(2020, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual(booking.client.email, 'client1@example.com')
+        self.assertEqual(Payment.objects.get().booking, booking)
+
+    def test_loads_in_dependency_order_across_chunk_boundaries(self):
+        path = self.write('data.json', json.dumps(self.records, indent=2))
+        out = io.StringIO()
+        with mock.patch('tours.loading.CHUNK_SIZE', 7):
+            call_command('bulkloaddata', path, stdout=out)
+        self.assertRegex(out.getvalue(), r'Installed 4 object\(s\) from 1 fixture\(s\) .* rows/sec')
+        self.assertLoaded()
+
+    def test_compressed_json_lines_and_existing_rows(self):
+        path = self.write('data.jsonl.gz', '\n'.join(json.dumps(record) for record in self.records))
+        call_command('bulkloaddata', path, '--batch-size', '1', stdout=io.StringIO())
+        Booking.objects.update(total_price=Decimal('99.00'))
+        call_command('bulkloaddata', path, stdout=io.StringIO())
+        self.assertLoaded()
+        self.assertEqual(Booking.objects.get().total_price, Decimal('10.00'))
+
+    def test_finds_fixtures_by_name_like_loaddata(self):
+        self.write('snapshot.jsonl.gz', '\n'.join(json.dumps(record) for record in self.records))
+        with override_settings(FIXTURE_DIRS=[self.tmpdir.name]):
+            call_command('bulkloaddata', 'snapshot', stdout=io.StringIO())
+            self.assertLoaded()
+            self.write('snapshot.json', json.dumps(self.records))
+            with self.assertRaisesMessage(CommandError, "Multiple fixtures named 'snapshot'"):
+                call_command('bulkloaddata', 'snapshot', stdout=io.StringIO())
+            with self.assertRaisesMessage(CommandError, "No fixture named 'missing' found."):
+                call_command('bulkloaddata', 'missing', stdout=io.StringIO())
+
+    def test_counters_and_rollups_are_rebuilt(self):
+        for record in self.records:
+            if record['model'] == 'tours.tour':
+                record['fields']['seats_taken'] = 0
+        out = io.StringIO()
+        call_command('bulkloaddata', self.write('data.json', json.dumps(self.records)), stdout=out)
+        self.assertIn('Rebuilt seats, hotel occupancy, co-travellers, client summaries, tour stats.', out.getvalue())
+        self.assertEqual(Tour.objects.get().seats_taken, 1)
+        self.assertEqual(ClientSummary.objects.get().total_bookings, 1)
+        self.assertEqual(TourStats.objects.values_list('bookings', 'revenue').get(), (1, Decimal('10.00')))
+
+        Booking.objects.update(status='Cancelled')  # bypasses the counter
+        out = io.StringIO()
+        call_command('rebuild_seats', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Recounted seats, 1 tour(s) fixed.')
+        self.assertEqual(Tour.objects.get().seats_taken, 0)
+
+    def test_bad_record_rolls_back(self):
+        records = self.records + [{'model': 'tours.nosuchmodel', 'pk': 1, 'fields': {}}]
+        path = self.write('bad.json', json.dumps(records))
+        with self.assertRaisesMessage(CommandError, 'record 4'):
+            call_command('bulkloaddata', path, stdout=io.StringIO())
+        self.assertFalse(Client.objects.exists())
+
+
+class TourCapacityTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_obj = make_client()
+        cls.tour = make_tour(max_participants=2)
+        cls.other = make_tour(2, max_participants=5)
+
+    def book(self, tour, **fields):
+        return self.client.post(
+            '/api/bookings/', {'client': self.client_obj.pk, 'tour': tour.pk, 'total_price': '10.00', **fields},
+            content_type='application/json'
+        )
+
+    def seats(self, tour):
+        tour.refresh_from_db()
+        return tour.seats_taken
+
+    def test_rejects_overbooking(self):
+        self.assertEqual(self.book(self.tour).status_code, 201)
+        self.assertEqual(self.book(self.tour, status='Cancelled').status_code, 201)
+        self.assertEqual(self.book(self.tour).status_code, 201)
+        response = self.book(self.tour)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('no seat left', response.json()['tour'][0])
+        self.assertEqual(self.seats(self.tour), 2)
+        self.assertEqual(Booking.objects.filter(tour=self.tour).count(), 3)
+
+    def test_status_change_move_and_delete_keep_counter(self):
+        booking = self.book(self.tour).json()
+        url = f'/api/bookings/{booking["booking_id"]}/'
+        self.client.patch(url, {'status': 'Cancelled'}, content_type='application/json')
+        self.assertEqual(self.seats(self.tour), 0)
+        self.client.patch(url, {'status': 'Confirmed', 'tour': self.other.pk}, content_type='application/json')
+        self.assertEqual((self.seats(self.tour), self.seats(self.other)), (0, 1))
+        self.client.delete(url)
+        self.assertEqual(self.seats(self.other), 0)
+
+    def test_bulk_create_over_capacity_writes_nothing(self):
+        response = self.client.post('/api/bookings/bulk/', [
+            {'client': self.client_obj.pk, 'tour': self.tour.pk, 'total_price': '10.00'} for _ in range(3)
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(self.seats(self.tour), 0)
+
+    def test_stale_tour_save_keeps_counter(self):
+        stale = Tour.objects.get(pk=self.other.pk)
+        self.book(self.other)
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertEqual(self.seats(self.other), 1)
+        stale.difficulty_level += 1
+        stale.save()
+        self.assertEqual((self.seats(self.other), stale.seats_taken), (1, 1))
+        self.client.patch(f'/api/tours/{self.other.pk}/', {'name': 'Again'}, content_type='application/json')
+        self.assertEqual(self.seats(self.other), 1)
+
+    def test_cannot_shrink_below_seats_taken(self):
+        self.book(self.tour)
+        self.book(self.tour)
+        response = self.client.patch(
+            f'/api/tours/{self.tour.pk}/', {'max_participants': 1}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_availability_endpoint(self):
+        self.book(self.tour)
+        self.book(self.tour)
+        with self.assertNumQueries(1):
+            rows = self.client.get('/api/tours/availability/').json()['results']
+        self.assertEqual(
+            [(row['tour_id'], row['seats_taken'], row['seats_available']) for row in rows],
+            [(self.tour.pk, 2, 0), (self.other.pk, 0, 5)]
+        )
+        rows = self.client.get('/api/tours/availability/?available=1').json()['results']
+        self.assertEqual([row['tour_id'] for row in rows], [self.other.pk])
+
+    def test_recount_repairs_drift(self):
+        self.book(self.tour)
+        Tour.objects.filter(pk=self.tour.pk).update(seats_taken=2)
+        self.assertEqual(recount_seats(Tour, Booking), [self.tour.pk])
+        self.assertEqual(self.seats(self.tour), 1)
+
+
+class TourCapacityConcurrencyTests(TransactionTestCase):
+    writers = 8
+    attempts = 5
+    capacity = 10
+
+    def test_concurrent_writers_never_oversell(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a test database shared between threads')
+        client = make_client()
+        tour = make_tour(max_participants=self.capacity)
+        outcomes = []
+        barrier = threading.Barrier(self.writers)
+
+        def writer():
+            barrier.wait()
+            try:
+                for _ in range(self.attempts):
+                    outcomes.append(self.book(client, tour))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=writer) for _ in range(self.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        tour.refresh_from_db()
+        self.assertEqual(outcomes.count('booked'), self.capacity)
+        self.assertEqual(outcomes.count('full'), self.writers * self.attempts - self.capacity)
+        self.assertEqual(tour.seats_taken, self.capacity)
+        self.assertEqual(Booking.objects.filter(tour=tour).count(), self.capacity)
+
+    @staticmethod
+    def book(client, tour):
+        # SQLite has one writer at a time and reports the others as locked.
+        while True:
+            try:
+                Booking.objects.create(client=client, tour=tour, total_price=Decimal('10.00'))
+                return 'booked'
+            except TourFullError:
+                return 'full'
+            except OperationalError as exc:
+                if 'locked' not in str(exc):
+                    raise
+                time.sleep(0.001)
+
+
+class TourSearchTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.yunnan = ChinaRegion.objects.create(name='Yunnan')
+        cls.tibet = ChinaRegion.objects.create(name='Tibet')
+        cls.tours = [
+            make_tour(1, category='Cultural', season='High', theme='History', difficulty_level=1,
+                      price=Decimal('800.00'), start_date=date(2024, 5, 1), end_date=date(2024, 5, 8)),
+            make_tour(2, category='Cultural', season='Low', theme='Food', difficulty_level=2,
+                      price=Decimal('1200.00'), start_date=date(2024, 6, 1), end_date=date(2024, 6, 8)),
+            make_tour(3, category='Adventure', season='High', theme='Nature', difficulty_level=4,
+                      price=Decimal('2500.00'), start_date=date(2024, 7, 1), end_date=date(2024, 7, 12)),
+            make_tour(4, category='Adventure', season='High', theme='Nature', difficulty_level=5,
+                      price=Decimal('3000.00'), start_date=date(2024, 8, 1), end_date=date(2024, 8, 12),
+                      is_active=False),
+        ]
+        TourRegion.objects.create(tour=cls.tours[0], region=cls.yunnan, days_spent=3)
+        TourRegion.objects.create(tour=cls.tours[2], region=cls.yunnan, days_spent=5)
+        TourRegion.objects.create(tour=cls.tours[2], region=cls.tibet, days_spent=5)
+
+    def search(self, query=''):
+        response = self.client.get(f'/api/tours/search/{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    @staticmethod
+    def counts(facet):
+        return {entry['value']: entry['count'] for entry in facet}
+
+    def test_filters_and_sorting(self):
+        data = self.search('?category=Cultural,Adventure&price_max=2500&ordering=-price')
+        self.assertEqual([row['tour_id'] for row in data['results']], [self.tours[2].pk, self.tours[1].pk, self.tours[0].pk])
+        data = self.search(f'?region={self.tibet.pk}&date_from=2024-06-15')
+        self.assertEqual([row['tour_id'] for row in data['results']], [self.tours[2].pk])
+        self.assertEqual(self.client.get('/api/tours/search/?difficulty=hard').status_code, 400)
+
+    def test_facets_exclude_their_own_filter(self):
+        facets = self.search('?category=Cultural&season=High')['facets']
+        # category counts ignore the category filter, but honour season=High
+        self.assertEqual(self.counts(facets['category']), {'Cultural': 1, 'Adventure': 1})
+        self.assertEqual(self.counts(facets['season']), {'High': 1, 'Low': 1})
+        self.assertEqual(self.counts(facets['theme']), {'History': 1})
+        self.assertEqual(self.counts(facets['region']), {self.yunnan.pk: 1})
+        self.assertEqual(facets['region'][0]['name'], 'Yunnan')
+
+    def test_facets_in_one_pass_and_cached_when_popular(self):
+        with self.assertNumQueries(3):
+            self.search('?season=High')
+        with self.assertNumQueries(3):
+            self.search('?season=High')
+        with self.assertNumQueries(1):
+            facets = self.search('?season=High')['facets']
+        self.assertEqual(self.counts(facets['difficulty_level']), {1: 1, 4: 1})
+
+        Tour.objects.filter(pk=self.tours[1].pk).update(season='High')
+        bump_versions(Tour)
+        facets = self.search('?season=High')['facets']
+        self.assertEqual(self.counts(facets['difficulty_level']), {1: 1, 2: 1, 4: 1})
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN output is backend specific')
+    def test_search_uses_index(self):
+        plan = search_tours({'date_from': date(2024, 1, 1)}).order_by('start_date', 'tour_id').explain()
+        self.assertIn('tour_active_start_idx', plan)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The search index is SQLite FTS5')
+class FullTextSearchTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        region = ChinaRegion.objects.create(name='Yunnan')
+        cls.city = ChinaCity.objects.create(name='Lijiang', region=region)
+        cls.tour = make_tour(1, name='Tea Horse Road', description='Walk the old tea caravan trail <by> Lijiang.')
+        cls.other = make_tour(2, name='Tea gardens', description='Tasting in Pu\'er.')
+        cls.hotel = Hotel.objects.create(
+            name='Old Town Inn', address='12 Tea Street, Lijiang', city=cls.city, star_rating=3,
+            contact_phone='1', email='inn@example.com'
+        )
+        cls.festival = Festival.objects.create(
+            name='Torch Festival', date_start=date(2024, 7, 1), date_end=date(2024, 7, 3),
+            location='Lijiang', popularity=9, description='Bonfires and wrestling.'
+        )
+
+    def search(self, query):
+        response = self.client.get('/api/search/', query)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_ranked_mixed_results_with_snippets(self):
+        results = self.search({'q': 'lijiang'})['results']
+        self.assertEqual({(row['type'], row['id']) for row in results}, {
+            ('tour', self.tour.pk), ('hotel', self.hotel.pk),
+        })
+        tour = next(row for row in results if row['type'] == 'tour')
+        self.assertIn('<mark>Lijiang</mark>', tour['snippet'])
+        self.assertIn('&lt;by&gt;', tour['snippet'])
+        self.assertTrue(tour['url'].endswith(f'/api/tours/{self.tour.pk}/'))
+
+        # title hits outrank body hits; the last word matches as a prefix
+        results = self.search({'q': 'te'})['results']
+        self.assertEqual(results[-1]['type'], 'hotel')
+        self.assertEqual(self.search({'q': 'tea', 'type': 'hotel'})['results'][0]['id'], self.hotel.pk)
+
+    def test_paging_and_bad_queries(self):
+        first = self.search({'q': 'tea', 'limit': 2})
+        self.assertEqual(len(first['results']), 2)
+        rest = self.client.get(first['next']).json()
+        self.assertEqual(len(rest['results']), 1)
+        self.assertIsNone(rest['next'])
+
+        self.assertEqual(self.search({'q': '"AND OR ('})['results'], [])
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'tea', 'type': 'visa'}).status_code, 400)
+
+    def test_index_follows_every_kind_of_write(self):
+        Excursion.objects.bulk_create([Excursion(
+            name='Jade Dragon', description='Glacier park', duration_hours=6,
+            guide_language='English', price=Decimal('90.00'), location=self.city,
+        )])
+        Tour.objects.filter(pk=self.other.pk).update(description='A glacier day trip')
+        Hotel.objects.filter(pk=self.hotel.pk).update(address='1 Square Lane')
+        self.festival.delete()
+        bump_versions(Tour, Excursion, Hotel)
+
+        results = self.search({'q': 'glacier'})['results']
+        self.assertEqual({row['type'] for row in results}, {'tour', 'excursion'})
+        self.assertEqual(self.search({'q': 'street'})['results'], [])
+        self.assertEqual(self.search({'q': 'torch'})['results'], [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM tours_search')
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 4 row(s).', out.getvalue())
+        cache.clear()
+        self.assertEqual(len(self.search({'q': 'torch'})['results']), 1)
+
+
+class GuideScheduleTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        region = ChinaRegion.objects.create(name='Guangxi')
+        cls.city = ChinaCity.objects.create(name='Guilin', region=region)
+        cls.tour = make_tour()
+        cls.guides = [
+            ChineseGuide.objects.create(
+                first_name=f'Guide{n}', last_name='Test', languages=languages,
+                city=cls.city, hourly_rate=Decimal('20.00')
+            )
+            for n, languages in enumerate(['English, Chinese', 'Russian', 'english'])
+        ]
+        cls.cruise = Excursion.objects.create(
+            name='Li River', description='Cruise', duration_hours=4, guide_language='English',
+            price=Decimal('50.00'), location=cls.city
+        )
+        cls.booked = TourExcursion.objects.create(
+            tour=cls.tour, excursion=cls.cruise, guide=cls.guides[0],
+            schedule_datetime=datetime(2024, 5, 2, 9, tzinfo=timezone.utc)
+        )
+
+    def item(self, hour, guide=0, **fields):
+        return {
+            'tour': self.tour.pk, 'excursion': self.cruise.pk, 'guide': self.guides[guide].pk,
+            'schedule_datetime': f'2024-05-02T{hour:02d}:00:00Z', **fields,
+        }
+
+    def test_conflicting_assignment_rejected(self):
+        response = self.client.post('/api/tour-excursions/', self.item(11), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'tour excursion {self.booked.pk}', response.json()['guide'][0])
+
+        # back to back is fine, and a row does not clash with itself
+        response = self.client.post('/api/tour-excursions/', self.item(13), content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        response = self.client.patch(
+            f'/api/tour-excursions/{self.booked.pk}/', {'schedule_datetime': '2024-05-02T08:00:00Z'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_bulk_checks_batch_against_itself_and_table(self):
+        response = self.client.post(
+            '/api/tour-excursions/bulk/', [self.item(14, guide=1), self.item(16, guide=1)],
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('another item of this write', response.json()['guide'][0])
+
+        with self.assertNumQueries(9):  # with the tour stats update
+            response = self.client.post(
+                '/api/tour-excursions/bulk/', [self.item(14, guide=1), self.item(18, guide=1), self.item(13)],
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(TourExcursion.objects.count(), 4)
+
+    def test_available_guides(self):
+        def available(start, end, **query):
+            response = self.client.get('/api/guides/available/', {
+                'city': self.city.pk, 'start': f'2024-05-02T{start}Z', 'end': f'2024-05-02T{end}Z', **query
+            })
+            self.assertEqual(response.status_code, 200, response.content)
+            return [guide['guide_id'] for guide in response.json()]
+
+        guides = [guide.pk for guide in self.guides]
+        self.assertEqual(available('10:00', '11:00'), guides[1:])
+        self.assertEqual(available('13:00', '15:00'), guides)
+        self.assertEqual(available('08:00', '09:30', language='English'), guides[2:])
+        with self.assertNumQueries(0):
+            available('06:00', '07:00')
+
+        TourExcursion.objects.create(
+            tour=self.tour, excursion=self.cruise, guide=self.guides[1],
+            schedule_datetime=datetime(2024, 5, 2, 12, tzinfo=timezone.utc)
+        )
+        self.assertEqual(available('13:00', '15:00'), [guides[0], guides[2]])
+        response = self.client.get('/api/guides/available/', {'city': self.city.pk, 'start': '2024-05-02T10:00Z',
+                                                               'end': '2024-05-02T09:00Z'})
+        self.assertEqual(response.status_code, 400)
+
+
+class HotelOccupancyTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        region = ChinaRegion.objects.create(name='Hainan')
+        cls.city = ChinaCity.objects.create(name='Sanya', region=region)
+        cls.hotels = [
+            Hotel.objects.create(
+                name=f'Beach {n}', address='Coast', city=cls.city, star_rating=5,
+                contact_phone='1', email=f'beach{n}@example.com'
+            )
+            for n in range(2)
+        ]
+        cls.easy = make_tour(1, difficulty_level=1)
+        cls.hard = make_tour(2, difficulty_level=4)
+        cls.clients = [make_client(n) for n in range(4)]
+
+    def book(self, tour, client=0, **fields):
+        return Booking.objects.create(client=self.clients[client], tour=tour, total_price=Decimal('10.00'), **fields)
+
+    def stay(self, tour, hotel=0, day=date(2024, 5, 3)):
+        return TourHotel.objects.create(
+            tour=tour, hotel=self.hotels[hotel], check_in_date=day, check_out_date=day,
+            room_type='Standard', meals_included='Breakfast'
+        )
+
+    @staticmethod
+    def snapshot():
+        return sorted(HotelOccupancy.objects.values_list(
+            'hotel_id', 'month', 'calendar_season', 'bookings', 'difficulty_total', 'avg_tour_difficulty'
+        ))
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        call_command('rebuild_hotel_occupancy', stdout=io.StringIO())
+        self.assertEqual(incremental, self.snapshot())
+        return incremental
+
+    def test_incremental_updates_match_rebuild(self):
+        self.stay(self.easy)
+        self.stay(self.hard)
+        moved = self.stay(self.hard, hotel=1, day=date(2024, 6, 1))
+        first = self.book(self.easy)
+        self.book(self.hard, client=1)
+        self.book(self.hard, client=2)
+        self.assertEqual(self.assertMatchesRebuild(), [
+            (self.hotels[0].pk, '2024-05', 'Spring', 3, 9, Decimal('3.00')),
+            (self.hotels[1].pk, '2024-06', 'Summer', 2, 8, Decimal('4.00')),
+        ])
+
+        first.status = 'Cancelled'
+        first.save()
+        moved.check_in_date = date(2024, 5, 20)
+        moved.save()
+        self.hard.difficulty_level = 2
+        self.hard.save()
+        self.book(self.easy, client=3).delete()
+        self.assertEqual(self.assertMatchesRebuild(), [
+            (self.hotels[0].pk, '2024-05', 'Spring', 2, 4, Decimal('2.00')),
+            (self.hotels[1].pk, '2024-05', 'Spring', 2, 4, Decimal('2.00')),
+        ])
+
+        self.hard.delete()
+        self.assertEqual(self.assertMatchesRebuild(), [])
+
+    def test_bulk_writes_keep_rollup(self):
+        stay = self.stay(self.easy)
+        response = self.client.post('/api/bookings/bulk/', [
+            {'client': client.pk, 'tour': self.hard.pk, 'total_price': '10.00'} for client in self.clients
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.post('/api/tour-hotels/bulk/', [
+            {'tour_hotel_id': stay.pk, 'tour': self.hard.pk},
+            {'tour': self.hard.pk, 'hotel': self.hotels[1].pk, 'check_in_date': '2024-12-30',
+             'check_out_date': '2024-12-31', 'room_type': 'Suite', 'meals_included': 'Breakfast'},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.assertMatchesRebuild(), [
+            (self.hotels[0].pk, '2024-05', 'Spring', 4, 16, Decimal('4.00')),
+            (self.hotels[1].pk, '2024-12', 'Winter', 4, 16, Decimal('4.00')),
+        ])
+
+    def test_endpoint_filters(self):
+        self.stay(self.easy)
+        self.stay(self.hard, hotel=1, day=date(2024, 7, 1))
+        self.book(self.easy)
+        self.book(self.hard, client=1)
+
+        response = self.client.get('/api/hotel-occupancy/', {'month_from': '2024-06', 'city': self.city.pk})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([
+            (row['hotel_name'], row['month'], row['calendar_season'], row['bookings'], row['avg_tour_difficulty'])
+            for row in response.json()['results']
+        ], [('Beach 1', '2024-07', 'Summer', 1, '4.00')])
+        response = self.client.get(
+            '/api/hotel-occupancy/', {'calendar_season': 'Spring', 'fields': 'hotel_name,bookings'}
+        )
+        self.assertEqual(response.json()['results'], [{'hotel_name': 'Beach 0', 'bookings': 1}])
+        self.assertEqual(self.client.get('/api/hotel-occupancy/', {'month_to': '2024-13'}).status_code, 400)
+
+
+class CoTravellerTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.clients = [make_client(n) for n in range(6)]
+        cls.tours = [make_tour(n) for n in range(3)]
+
+    def book(self, client, tour, **fields):
+        return Booking.objects.create(
+            client=self.clients[client], tour=self.tours[tour], total_price=Decimal('10.00'), **fields
+        )
+
+    @staticmethod
+    def edges():
+        return sorted(CoTraveller.objects.values_list('client_id', 'other_id', 'shared_tours'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.edges()
+        call_command('rebuild_co_travellers', stdout=io.StringIO())
+        self.assertEqual(incremental, self.edges())
+        return incremental
+
+    def test_index_follows_bookings(self):
+        c = [client.pk for client in self.clients]
+        self.book(0, 0)
+        second = self.book(0, 0)
+        self.book(1, 0)
+        self.book(1, 1)
+        moving = self.book(2, 1)
+        self.book(0, 1, status='Cancelled')
+        self.assertEqual(self.assertMatchesRebuild(), [
+            (c[0], c[1], 1), (c[1], c[0], 1), (c[1], c[2], 1), (c[2], c[1], 1),
+        ])
+
+        second.delete()  # client 0 still has a seat on tour 0
+        moving.tour = self.tours[0]
+        moving.save()
+        self.assertEqual(self.assertMatchesRebuild(), [
+            (c[0], c[1], 1), (c[0], c[2], 1), (c[1], c[0], 1), (c[1], c[2], 1), (c[2], c[0], 1), (c[2], c[1], 1),
+        ])
+
+        Booking.objects.filter(tour=self.tours[0]).delete()
+        self.assertEqual(self.assertMatchesRebuild(), [])
+
+        response = self.client.post('/api/bookings/bulk/', [
+            {'client': self.clients[n].pk, 'tour': self.tours[2].pk, 'total_price': '10.00'} for n in (3, 4, 4)
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.clients[4].delete()
+        self.assertMatchesRebuild()
+
+    def test_k_hop_traversal_with_pagination(self):
+        # 0 - 1 on two tours, 1 - 2, 2 - 3: a chain
+        for client, tour in ((0, 0), (1, 0), (0, 1), (1, 1), (1, 2), (2, 2)):
+            self.book(client, tour)
+        other = make_tour(9)
+        Booking.objects.create(client=self.clients[2], tour=other, total_price=Decimal('10.00'))
+        Booking.objects.create(client=self.clients[3], tour=other, total_price=Decimal('10.00'))
+        c = [client.pk for client in self.clients]
+
+        def travellers(client, **query):
+            response = self.client.get(f'/api/clients/{c[client]}/co-travellers/', query)
+            self.assertEqual(response.status_code, 200, response.content)
+            return response.json()
+
+        data = travellers(0)
+        self.assertEqual([(row['client_id'], row['depth'], row['shared_tours']) for row in data['results']],
+                         [(c[1], 1, 2)])
+        with self.assertNumQueries(5):  # the client, three hops, the page of clients
+            data = travellers(0, depth=3)
+        self.assertEqual([(row['client_id'], row['depth'], row['shared_tours']) for row in data['results']],
+                         [(c[1], 1, 2), (c[2], 2, 1), (c[3], 3, 1)])
+        self.assertEqual(data['results'][0]['email'], self.clients[1].email)
+
+        page = travellers(1, depth=2, limit=2)
+        self.assertEqual((page['count'], len(page['results'])), (3, 2))
+        rest = self.client.get(page['next']).json()
+        self.assertEqual([row['client_id'] for row in rest['results']], [c[3]])
+        self.assertIsNone(rest['next'])
+
+        self.assertEqual(self.client.get(f'/api/clients/{c[0]}/co-travellers/?depth=9').status_code, 400)
+        self.assertEqual(self.client.get('/api/clients/999/co-travellers/').status_code, 404)
+
+
+class RecommendationTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.clients = [make_client(n) for n in range(5)]
+        cls.tours = [make_tour(n) for n in range(4)]
+        for client, tour in ((0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 2), (3, 3)):
+            Booking.objects.create(client=cls.clients[client], tour=cls.tours[tour], total_price=Decimal('10.00'))
+        # a 1-star review takes the tour out of the client's row
+        Review.objects.create(client=cls.clients[2], tour=cls.tours[2], rating=1, comment='No',
+                              review_date=date(2024, 6, 1))
+        call_command('rebuild_recommendations', stdout=io.StringIO())
+
+    def get(self, path, status=200):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def test_similar_tours_by_cosine(self):
+        t = [tour.pk for tour in self.tours]
+        self.assertEqual(sorted(TourSimilarity.objects.values_list('tour_id', 'other_id', 'score')),
+                         [(t[0], t[1], 0.816497), (t[1], t[0], 0.816497)])  # 2 / sqrt(3 * 2)
+
+        similar = self.get(f'/api/tours/{t[0]}/similar/')
+        self.assertEqual([(row['tour_id'], row['name'], row['score']) for row in similar],
+                         [(t[1], 'Tour 1', 0.816497)])
+        self.assertEqual(self.get(f'/api/tours/{t[3]}/similar/'), [])
+
+        Tour.objects.filter(pk=t[1]).update(is_active=False)
+        bump_versions(Tour)
+        self.assertEqual(self.get(f'/api/tours/{t[0]}/similar/'), [])
+
+    def test_recommendations_skip_the_client_history(self):
+        t = [tour.pk for tour in self.tours]
+        c = [client.pk for client in self.clients]
+        Booking.objects.create(client=self.clients[4], tour=self.tours[1], total_price=Decimal('10.00'))
+        with self.assertNumQueries(5):  # the client, its bookings and reviews, neighbours, tours
+            data = self.get(f'/api/clients/{c[4]}/recommendations/')
+        self.assertEqual([(row['tour_id'], row['score']) for row in data], [(t[0], 0.816497)])
+        self.assertEqual(self.get(f'/api/clients/{c[0]}/recommendations/'), [])
+        self.assertEqual([row['tour_id'] for row in self.get(f'/api/clients/{c[2]}/recommendations/')], [t[1]])
+
+        self.get(f'/api/clients/{c[0]}/recommendations/?limit=999', status=400)
+        self.get('/api/clients/999/recommendations/', status=404)
+        self.get('/api/tours/999/similar/', status=404)
+
+
+class ClientSummaryTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.clients = [make_client(n) for n in range(4)]
+        cls.tours = [make_tour(n) for n in range(3)]
+
+    def book(self, client, tour, day=None):
+        fields = {'client': self.clients[client], 'tour': self.tours[tour], 'total_price': Decimal('10.00')}
+        if day is None:
+            return Booking.objects.create(**fields)
+        with explicit_auto_dates(Booking):
+            return Booking.objects.create(booking_date=datetime(2024, 1, day, tzinfo=timezone.utc), **fields)
+
+    def review(self, client, tour, rating, day):
+        return Review.objects.create(client=self.clients[client], tour=self.tours[tour], rating=rating,
+                                     comment=f'{rating} stars', review_date=date(2024, 2, day))
+
+    @staticmethod
+    def summaries():
+        return list(ClientSummary.objects.order_by('client_id').values_list(
+            'client_id', 'total_bookings', 'last_booking_date', 'last_tour_id', 'last_review_id'
+        ))
+
+    def assertMatchesRebuild(self):
+        incremental = self.summaries()
+        call_command('rebuild_client_summaries', stdout=io.StringIO())
+        self.assertEqual(incremental, self.summaries())
+        return incremental
+
+    def test_summaries_follow_bookings_and_reviews(self):
+        c = [client.pk for client in self.clients]
+        t = [tour.pk for tour in self.tours]
+        self.review(0, 2, 2, 1)
+        self.book(0, 0, day=10)
+        self.book(0, 1, day=5)  # older: the last tour stays
+        latest = self.review(0, 0, 5, 3)
+        previous = self.review(0, 1, 4, 2)
+        moving = self.book(1, 2, day=7)
+        self.review(2, 0, 3, 1)  # no bookings, no summary
+        self.assertEqual([row[:2] + row[3:] for row in self.assertMatchesRebuild()], [
+            (c[0], 2, t[0], latest.pk), (c[1], 1, t[2], None),
+        ])
+
+        moving.client = self.clients[0]
+        moving.save()
+        latest.delete()
+        self.assertEqual([row[:2] + row[3:] for row in self.assertMatchesRebuild()], [(c[0], 3, t[0], previous.pk)])
+
+        Booking.objects.filter(tour=self.tours[0]).delete()
+        self.assertEqual([row[:2] + row[3:] for row in self.assertMatchesRebuild()], [(c[0], 2, t[2], previous.pk)])
+
+        response = self.client.post('/api/bookings/bulk/', [
+            {'client': c[n], 'tour': t[1], 'total_price': '10.00'} for n in (0, 3, 3)
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([row[:2] + row[3:4] for row in self.assertMatchesRebuild()], [(c[0], 3, t[1]), (c[3], 2, t[1])])
+
+        self.clients[0].delete()
+        self.assertEqual([row[0] for row in self.assertMatchesRebuild()], [c[3]])
+
+    def test_list_is_paginated_from_the_summaries(self):
+        c = [client.pk for client in self.clients]
+        self.book(0, 0, day=1)
+        self.book(0, 1, day=2)
+        self.book(1, 2, day=3)
+        self.book(2, 0, day=4)
+        self.review(1, 2, 4, 1)
+
+        with self.assertNumQueries(1):
+            first = self.client.get('/api/clients-with-details/?page_size=2').json()
+        self.assertEqual([row['client_id'] for row in first['results']], [c[2], c[1]])
+        self.assertEqual(first['results'][1], {
+            'client_id': c[1], 'client_name': 'Client1 Test', 'email': 'client1@example.com',
+            'phone': '+70000000000', 'total_bookings': 1, 'last_booking_date': '2024-01-03 00:00:00',
+            'last_tour': 'Tour 2', 'last_rating': '4', 'last_comment': '4 stars',
+        })
+        self.assertEqual((first['results'][0]['last_rating'], first['results'][0]['last_comment']),
+                         ('Нет оценки', 'Нет отзыва'))
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['client_id'] for row in second['results']], [c[0]])
+        self.assertIsNone(second['next'])
+
+        by_bookings = self.client.get('/api/clients-with-details/?ordering=-total_bookings').json()
+        self.assertEqual(by_bookings['results'][0]['client_id'], c[0])
+
+
+class TourStatsTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_client()
+        cls.tours = [make_tour(0, theme='History', price=Decimal('500.00')), make_tour(1, theme='History'),
+                     make_tour(2, theme='Nature')]
+        city = ChinaCity.objects.create(name='Guilin', region=ChinaRegion.objects.create(name='Guangxi'))
+        cls.guide = ChineseGuide.objects.create(first_name='Guide', last_name='Test', languages='English',
+                                                city=city, hourly_rate=Decimal('20.00'))
+        cls.excursion = Excursion.objects.create(name='Li River', description='Cruise', duration_hours=1,
+                                                 guide_language='English', price=Decimal('50.00'), location=city)
+
+    def book(self, tour, price, **fields):
+        return Booking.objects.create(client=self.customer, tour=self.tours[tour], total_price=Decimal(price), **fields)
+
+    def review(self, tour, rating):
+        return Review.objects.create(client=self.customer, tour=self.tours[tour], rating=rating, comment='-',
+                                     review_date=date(2024, 6, 1))
+
+    def excursion_at(self, tour, hour, included=False):
+        return TourExcursion.objects.create(
+            tour=self.tours[tour], excursion=self.excursion, guide=self.guide, included_in_price=included,
+            schedule_datetime=datetime(2024, 5, 2, hour, tzinfo=timezone.utc),
+        )
+
+    def stats(self, tour):
+        return TourStats.objects.filter(tour=self.tours[tour]).values_list(
+            'bookings', 'revenue', 'reviews', 'rating_total', 'total_excursions', 'paid_excursions'
+        ).first()
+
+    def test_deltas_keep_stats_consistent(self):
+        t = [tour.pk for tour in self.tours]
+        first = self.book(0, '100.00')
+        self.book(0, '50.00', status='Cancelled')
+        moving = self.book(0, '30.00')
+        first.total_price = Decimal('120.00')
+        first.save()
+        moving.tour = self.tours[1]
+        moving.save()
+        rating = self.review(0, 4)
+        self.review(0, 2)
+        rating.rating = 5
+        rating.save()
+        self.review(1, 3).delete()
+        self.excursion_at(0, 9)
+        self.excursion_at(0, 11, included=True)
+        self.excursion_at(1, 13).delete()
+        response = self.client.post('/api/tour-excursions/bulk/', [
+            {'tour': t[2], 'excursion': self.excursion.pk, 'guide': self.guide.pk,
+             'schedule_datetime': '2024-05-03T09:00:00Z'},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertEqual(self.stats(0), (1, Decimal('120.00'), 2, 7, 2, 1))
+        self.assertEqual(self.stats(1), (1, Decimal('30.00'), 0, 0, 0, 0))
+        self.assertEqual(self.stats(2), (0, Decimal('0.00'), 0, 0, 1, 1))
+        call_command('rebuild_tour_stats', '--check', stdout=io.StringIO())
+
+        Booking.objects.filter(pk=first.pk).update(status='Cancelled')  # bypasses the deltas
+        with self.assertRaisesMessage(CommandError, f'Stats of 1 tour(s) drifted: {t[0]}.'):
+            call_command('rebuild_tour_stats', '--check', stdout=io.StringIO())
+        call_command('rebuild_tour_stats', stdout=io.StringIO())
+        call_command('rebuild_tour_stats', '--check', stdout=io.StringIO())
+        self.assertEqual(self.stats(0)[:2], (0, Decimal('0.00')))
+
+    def test_reports_read_the_stats(self):
+        self.book(0, '100.00')
+        self.book(0, '40.00', status='Cancelled')
+        self.book(0, '40.00', status='Cancelled')
+        self.book(1, '70.00')
+        self.book(1, '80.00')
+        for rating in (5, 4, 4, 4):
+            self.review(0, rating)
+        self.excursion_at(2, 9)
+        self.excursion_at(2, 11, included=True)
+        self.excursion_at(0, 13, included=True)
+
+        with self.assertNumQueries(1):
+            themes = self.client.get('/api/tour-theme-analysis/').json()
+        self.assertEqual([
+            (row['theme'], row['tours_count'], row['bookings_count'], row['total_revenue'], row['avg_rating'],
+             row['most_popular_tour'])
+            for row in themes
+        ], [
+            # Tour 0 leads on all its bookings; 4.25 rounds half up
+            ('History', 2, 3, 250.0, '4.3', 'Tour 0'),
+            ('Nature', 1, 0, 0.0, 'Нет рейтинга', 'Tour 2'),
+        ])
+
+        make_tour(3, theme='Food')
+        self.book(2, '10.00')
+        self.book(2, '10.00', status='Cancelled')
+        cheap = make_tour(4, theme='Nature', price=Decimal('10.00'))
+        Booking.objects.create(client=self.customer, tour=cheap, total_price=Decimal('10.00'))
+        themes = {row['theme']: row for row in self.client.get('/api/tour-theme-analysis/').json()}
+        # ties go to the older tour, also in a theme without stats rows
+        self.assertEqual((themes['Nature']['most_popular_tour'], themes['Nature']['bookings_count'],
+                          themes['Nature']['cheapest_tour']), ('Tour 2', 2, 10.0))
+        self.assertEqual((themes['Food']['tours_count'], themes['Food']['most_popular_tour']), (1, 'Tour 3'))
+
+        paid = self.client.get('/api/tours-with-paid-excursions/').json()
+        self.assertEqual(paid, [{
+            'tour_id': self.tours[2].pk, 'name': 'Tour 2', 'total_excursions': 2, 'paid_excursions': 1,
+            'paid_percent': 50.0,
+        }])
+
+
+class EmployeeRatingsTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.agents = [make_employee(n) for n in range(2)]
+        clients = [make_client(n) for n in range(2)]
+        tours = [make_tour(0, season='High'), make_tour(1, season='Low')]
+        for agent, client, tour, status in (
+            (0, 0, 0, 'Confirmed'), (0, 0, 0, 'Confirmed'), (0, 0, 1, 'Pending'), (0, 1, 1, 'Confirmed'),
+            (1, 1, 0, 'Cancelled'),
+        ):
+            Booking.objects.create(employee=cls.agents[agent], client=clients[client], tour=tours[tour],
+                                   total_price=Decimal('10.00'), status=status)
+        # three reviews for client 0 used to multiply each of its bookings
+        for client, rating in ((0, 5), (0, 4), (0, 3), (1, 2)):
+            Review.objects.create(client=clients[client], tour=tours[0], rating=rating, comment='-',
+                                  review_date=date(2024, 6, 1))
+
+    def test_counts_do_not_fan_out(self):
+        with self.assertNumQueries(4):  # bookings, reviews, employee x client pairs, employees
+            rows = self.client.get('/api/employee-ratings/').json()
+        self.assertEqual(len(rows), 1)  # the other agent has nothing confirmed
+        row = rows[0]
+        self.assertEqual(row['employee_id'], self.agents[0].pk)
+        self.assertEqual((row['total_bookings'], row['confirmed_bookings'], row['high_season_tours']), (4, 3, 1))
+        self.assertEqual(row['avg_rating'], 3.5)  # each review of its clients once
+        self.assertAlmostEqual(row['efficiency_score'], 3 * 0.4 + 1 * 0.3 + 3.5 * 0.3)
+
+
+def make_report_rows():
+    agent, customer = make_employee(), make_client()
+    tours = [make_tour(0, season='High', price=Decimal('800.00')), make_tour(1, price=Decimal('1200.00'))]
+    festival = Festival.objects.create(name='Lantern', date_start=date(2024, 2, 1), date_end=date(2024, 2, 3),
+                                       location='Harbin', popularity=5, description='')
+    TourFestival.objects.create(tour=tours[0], festival=festival)
+    for tour, status in ((0, 'Confirmed'), (1, 'Confirmed'), (1, 'Pending')):
+        booking = Booking.objects.create(employee=agent, client=customer, tour=tours[tour],
+                                         total_price=Decimal('100.00'), status=status)
+    Payment.objects.create(booking=booking, amount=Decimal('40.00'), method='Card', is_deposit=True,
+                           payment_date=datetime(2024, 3, 4, tzinfo=timezone.utc))
+    Review.objects.create(client=customer, tour=tours[0], rating=4, comment='-', review_date=date(2024, 6, 1))
+
+
+ASYNC_REPORTS = [
+    '/api/pavel-friends/', '/api/tours-with-paid-excursions/', '/api/festivals-tours-price-comparison',
+    '/api/employee-ratings/', '/api/monthly-stats/', '/api/payment-analytics/?granularity=week&breakdown=method',
+    '/api/employees-performance/', '/api/clients-with-details/?page_size=1', '/api/tour-theme-analysis/',
+]
+
+
+class AsyncReportTests(ReportTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_report_rows()
+
+    async def test_async_views_answer_like_the_sync_ones(self):
+        for path in ASYNC_REPORTS:
+            async_path = path.replace('/api/', '/api/async/', 1)
+            expected = await self.async_client.get(path)
+            response = await self.async_client.get(async_path)
+            self.assertEqual(response.status_code, 200, async_path)
+            # page links point back at the view that served them
+            self.assertEqual(response.content.replace(b'/api/async/', b'/api/'), expected.content, async_path)
+            self.assertIn('Server-Timing', response)
+
+            cached = await self.async_client.get(async_path)
+            self.assertEqual((cached.content, cached['ETag']), (response.content, response['ETag']))
+            response = await self.async_client.get(async_path, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(response.status_code, 304, async_path)
+
+    async def test_errors_are_answered_as_drf_does(self):
+        for query in ('granularity=hour', 'granularity=day&from=1900-01-01&to=2024-01-01'):
+            expected = await self.async_client.get(f'/api/payment-analytics/?{query}')
+            response = await self.async_client.get(f'/api/async/payment-analytics/?{query}')
+            self.assertEqual(expected.status_code, 400, query)
+            self.assertEqual((response.status_code, response.json()), (400, expected.json()))
+        response = await self.async_client.get('/api/async/clients-with-details/?cursor=nonsense')
+        self.assertEqual(response.status_code, 404)
+
+
+class AsyncConcurrentQueriesTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_independent_queries_run_on_connections_of_their_own(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a test database shared between threads')
+        make_report_rows()
+        expected = self.client.get('/api/employee-ratings/').content
+        threads = []
+
+        def record(execute, sql, params, many, context):
+            threads.append(threading.get_ident() == threading.main_thread().ident)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get('/api/async/employee-ratings/')
+        self.assertEqual(response.content, expected)
+        self.assertIn('desc="4 queries"', response['Server-Timing'])
+        # the three aggregates elsewhere, then the employees on the request's connection
+        self.assertEqual(sorted(threads), [False, False, False, True])
@@ -0,0 +1,132 @@
+# tours/tourstats.py
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .cache import bump_versions
+from .capacity import SEAT_STATUSES, holds_seat
+
+
+STAT_FIELDS = ('bookings', 'revenue', 'reviews', 'rating_total', 'total_excursions', 'paid_excursions')
+
+
+def booking_stat_deltas(changes):
+    """
+    Stats deltas ``{tour_id: {field: change}}`` for ``(before, after)`` pairs
+    of ``(tour_id, status, total_price)`` booking states, ``None`` for a
+    missing side. Cancelled bookings count for nothing.
+    """
+    deltas = defaultdict(Counter)
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None or not holds_seat(state[1]):
+                continue
+            tour_id, _, price = state
+            deltas[tour_id]['bookings'] += sign
+            deltas[tour_id]['revenue'] += sign * Decimal(str(price))
+    return deltas
+
+
+def review_stat_deltas(changes):
+    """Stats deltas for ``(before, after)`` pairs of ``(tour_id, rating)`` review states."""
+    deltas = defaultdict(Counter)
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is not None:
+                deltas[state[0]]['reviews'] += sign
+                deltas[state[0]]['rating_total'] += sign * state[1]
+    return deltas
+
+
+def excursion_stat_deltas(changes):
+    """Stats deltas for ``(before, after)`` pairs of ``(tour_id, included_in_price)`` states."""
+    deltas = defaultdict(Counter)
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is not None:
+                deltas[state[0]]['total_excursions'] += sign
+                deltas[state[0]]['paid_excursions'] += sign * (not state[1])
+    return deltas
+
+
+def apply_stat_deltas(stats_model, deltas, using=None):
+    """
+    Move the stats row of each tour by its deltas with one ``UPDATE`` of
+    ``F()`` expressions, creating the row a first positive delta needs. Call
+    it inside the transaction that makes the change.
+    """
+    deltas = {
+        tour_id: {field: value for field, value in delta.items() if value}
+        for tour_id, delta in deltas.items()
+    }
+    deltas = {tour_id: delta for tour_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = stats_model._base_manager.using(using)
+    for tour_id in sorted(deltas):
+        changes = {field: F(field) + value for field, value in deltas[tour_id].items()}
+        if rows.filter(tour_id=tour_id).update(**changes):
+            continue
+        if all(value > 0 for value in deltas[tour_id].values()):
+            # A tour deleted together with its bookings has no row left to
+            # update; only positive deltas create rows.
+            try:
+                with transaction.atomic(using=using):
+                    rows.create(tour_id=tour_id, **deltas[tour_id])
+            except IntegrityError:
+                # created concurrently: add to it instead
+                rows.filter(tour_id=tour_id).update(**changes)
+
+    # QuerySet.update() sends no post_save.
+    bump_versions(stats_model)
+    transaction.on_commit(lambda: bump_versions(stats_model), using=using)
+
+
+def expected_stats(booking_model, review_model, tour_excursion_model, using=None):
+    """``{tour_id: {field: value}}`` computed from the source tables, one grouped query each."""
+    stats = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+    for tour_id, bookings, revenue in booking_model._base_manager.using(using).filter(
+        status__in=SEAT_STATUSES
+    ).values_list('tour_id').annotate(bookings=Count('pk'), revenue=Sum('total_price')).order_by():
+        stats[tour_id].update(bookings=bookings, revenue=revenue)
+    for tour_id, reviews, rating_total in review_model._base_manager.using(using).values_list(
+        'tour_id'
+    ).annotate(reviews=Count('pk'), rating_total=Sum('rating')).order_by():
+        stats[tour_id].update(reviews=reviews, rating_total=rating_total)
+    for tour_id, total, paid in tour_excursion_model._base_manager.using(using).values_list(
+        'tour_id'
+    ).annotate(total=Count('pk'), paid=Count('pk', filter=Q(included_in_price=False))).order_by():
+        stats[tour_id].update(total_excursions=total, paid_excursions=paid)
+    return stats
+
+
+def check_tour_stats(stats_model, booking_model, review_model, tour_excursion_model, using=None):
+    """Primary keys of the tours whose stored stats differ from the source tables, sorted."""
+    expected = expected_stats(booking_model, review_model, tour_excursion_model, using)
+    stored = {
+        row.pop('tour_id'): row
+        for row in stats_model._base_manager.using(using).values('tour_id', *STAT_FIELDS)
+    }
+    zero = dict.fromkeys(STAT_FIELDS, 0)
+    return sorted(
+        tour_id for tour_id in expected.keys() | stored.keys()
+        if expected.get(tour_id, zero) != stored.get(tour_id, zero)
+    )
+
+
+def rebuild_tour_stats(stats_model, booking_model, review_model, tour_excursion_model, using=DEFAULT_DB_ALIAS):
+    """Recompute every stats row from the source tables. Returns the number of rows."""
+    expected = expected_stats(booking_model, review_model, tour_excursion_model, using)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        # one statement, without loading the rows for delete signals
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(stats_model._meta.db_table)}')
+        rows = stats_model._base_manager.using(using).bulk_create((
+            stats_model(tour_id=tour_id, **stats) for tour_id, stats in sorted(expected.items())
+        ), batch_size=1000)
+        bump_versions(stats_model)
+        transaction.on_commit(lambda: bump_versions(stats_model), using=using)
+    return len(rows)
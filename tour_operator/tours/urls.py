@@ -29,13 +29,20 @@ from .views import (
     TourToAgencyViewSet,
     TourTransportViewSet,
     HotelOccupancyViewSet,
+    SearchView,
 )
 from .reports.api_views import (
     PavelFriendsView, FestivalTourPriceComparisonView,
     EmployeeRatingsView, TourWithPaidExcursionsView,
-    MonthlyPaymentStatsView, EmployeePerformanceView,
+    MonthlyPaymentStatsView, PaymentAnalyticsView, EmployeePerformanceView,
     ClientListWithDetailsView, TourThemeAnalysisView
 )
+from .reports.async_views import (
+    AsyncPavelFriendsView, AsyncFestivalTourPriceComparisonView,
+    AsyncEmployeeRatingsView, AsyncTourWithPaidExcursionsView,
+    AsyncMonthlyPaymentStatsView, AsyncPaymentAnalyticsView, AsyncEmployeePerformanceView,
+    AsyncClientListWithDetailsView, AsyncTourThemeAnalysisView
+)
 
 router = DefaultRouter()
 router.register(r'clients', ClientViewSet)
@@ -62,16 +69,30 @@ router.register(r'tour-hotels', TourHotelViewSet)
 router.register(r'tour-regions', TourRegionViewSet)
 router.register(r'tour-agencies', TourToAgencyViewSet)
 router.register(r'tour-transports', TourTransportViewSet)
+router.register(r'hotel-occupancy', HotelOccupancyViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('search/', SearchView.as_view()),
 
     path('pavel-friends/', PavelFriendsView.as_view()),
     path('tours-with-paid-excursions/', TourWithPaidExcursionsView.as_view()),
     path('festivals-tours-price-comparison', FestivalTourPriceComparisonView.as_view()),
     path('employee-ratings/', EmployeeRatingsView.as_view()),
     path('monthly-stats/', MonthlyPaymentStatsView.as_view()),
+    path('payment-analytics/', PaymentAnalyticsView.as_view()),
     path('employees-performance/', EmployeePerformanceView.as_view()),
     path('clients-with-details/', ClientListWithDetailsView.as_view()),
-    path('tour-theme-analysis/', TourThemeAnalysisView.as_view())
+    path('tour-theme-analysis/', TourThemeAnalysisView.as_view()),
+
+    # The same reports as async views, for ASGI (tour_operator/asgi.py)
+    path('async/pavel-friends/', AsyncPavelFriendsView.as_view()),
+    path('async/tours-with-paid-excursions/', AsyncTourWithPaidExcursionsView.as_view()),
+    path('async/festivals-tours-price-comparison', AsyncFestivalTourPriceComparisonView.as_view()),
+    path('async/employee-ratings/', AsyncEmployeeRatingsView.as_view()),
+    path('async/monthly-stats/', AsyncMonthlyPaymentStatsView.as_view()),
+    path('async/payment-analytics/', AsyncPaymentAnalyticsView.as_view()),
+    path('async/employees-performance/', AsyncEmployeePerformanceView.as_view()),
+    path('async/clients-with-details/', AsyncClientListWithDetailsView.as_view()),
+    path('async/tour-theme-analysis/', AsyncTourThemeAnalysisView.as_view()),
 ]
\ No newline at end of file
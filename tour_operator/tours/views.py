@@ -1,5 +1,29 @@
 # tours/views.py
+from contextlib import contextmanager
+
+from django.db.models import F, Prefetch
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from . import fulltext
+from .bulk import BulkWriteMixin
+from .cache import ConditionalGetMixin, cached_report
+from .capacity import TourFullError, apply_seat_deltas, seat_deltas
+from .cotravel import apply_pair_deltas, co_travellers, pair_deltas
+from .facets import FACET_MODELS, cached_tour_facets, search_tours
+from .fastpath import FastListMixin
+from .occupancy import apply_occupancy_deltas, booking_deltas, stay_deltas
+from .recommend import interactions, recommend
+from .scheduling import SCHEDULE_MODELS, find_conflicts, guide_availability
+from .sparse import SparseFieldsMixin
+from .summary import refresh_summaries
+from .tourstats import apply_stat_deltas, booking_stat_deltas, excursion_stat_deltas
 from .models import (
     Client,
     Employee,
@@ -26,6 +50,10 @@ from .models import (
     TourToAgency,
     TourTransport,
     HotelOccupancy,
+    CoTraveller,
+    TourSimilarity,
+    ClientSummary,
+    TourStats,
 )
 from .serializers import (
     ClientSerializer,
@@ -54,129 +82,430 @@ from .serializers import (
     TourTransportSerializer,
     BookingsVisaSerializer,
     HotelOccupancySerializer,
+    TourItinerarySerializer,
+    TourAvailabilitySerializer,
+    TourSearchQuerySerializer,
+    SearchQuerySerializer,
+    SearchResultSerializer,
+    GuideAvailabilityQuerySerializer,
+    AvailableGuideSerializer,
+    HotelOccupancyQuerySerializer,
+    CoTravellerQuerySerializer,
+    CoTravellerSerializer,
+    RecommendationQuerySerializer,
+    RecommendedTourSerializer,
 )
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+@contextmanager
+def seat_errors():
+    """Report a booking over a tour's capacity as a validation error on ``tour``."""
+    try:
+        yield
+    except TourFullError as exc:
+        raise ValidationError({'tour': [str(exc)]})
+
+
+def recommended_tours(scored):
+    """``[(tour_id, score), ...]`` as ``RecommendedTourSerializer`` data, in one query."""
+    tours = Tour.objects.only('tour_id', 'name', 'category', 'start_date', 'end_date', 'price').in_bulk(
+        [tour_id for tour_id, _ in scored]
+    )
+    return RecommendedTourSerializer([
+        {'tour': tours[tour_id], 'score': score} for tour_id, score in scored if tour_id in tours
+    ], many=True).data
+
+
+class ClientViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
 
-
-class EmployeeViewSet(viewsets.ModelViewSet):
+    recommendation_models = (TourSimilarity, Tour, Booking, Review, Client)
+
+    @action(detail=True, methods=['get'])
+    def recommendations(self, request, pk=None):
+        return self.conditional_response(
+            self._recommendations, request, pk=pk, etag_models=self.recommendation_models
+        )
+
+    def _recommendations(self, request, pk=None):
+        query = RecommendationQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        client = get_object_or_404(Client.objects.only('pk'), pk=pk)
+        history = interactions(Booking, Review, client_ids=[client.pk]).get(client.pk, {})
+        return Response(recommended_tours(
+            recommend(TourSimilarity, history, query.validated_data['limit'])
+        ))
+
+    @action(detail=True, methods=['get'], url_path='co-travellers')
+    def co_travellers(self, request, pk=None):
+        return self.conditional_response(
+            self._co_travellers, request, pk=pk, etag_models=(CoTraveller, Client)
+        )
+
+    def _co_travellers(self, request, pk=None):
+        query = CoTravellerQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        client = get_object_or_404(Client.objects.only('pk'), pk=pk)
+
+        found = co_travellers(CoTraveller, client.pk, depth=params['depth'])
+        page = found[params['offset']:params['offset'] + params['limit']]
+        details = Client.objects.in_bulk([client_id for client_id, _, _ in page])
+        results = [
+            {'client': details[client_id], 'depth': hops, 'shared_tours': shared_tours}
+            for client_id, hops, shared_tours in page if client_id in details
+        ]
+        next_url = None
+        if params['offset'] + params['limit'] < len(found):
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'offset', params['offset'] + params['limit']
+            )
+        return Response({
+            'count': len(found),
+            'next': next_url,
+            'results': CoTravellerSerializer(results, many=True).data,
+        })
+
+
+class EmployeeViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
 
 
-class TourViewSet(viewsets.ModelViewSet):
+class TourViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Tour.objects.all()
     serializer_class = TourSerializer
-
-
-class BookingViewSet(viewsets.ModelViewSet):
+    ordering_fields = ('start_date', 'price')
+
+    itinerary_models = (
+        Tour, TourHotel, Hotel, TourExcursion, Excursion, ChineseGuide,
+        TourTransport, TransportProvider, TourRegion, ChinaRegion,
+        TourFestival, Festival, ChinaCity,
+    )
+
+    search_models = FACET_MODELS
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        return self.conditional_response(self._search, request, etag_models=self.search_models)
+
+    def _search(self, request):
+        query = TourSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        tours = search_tours(params)
+        page = self.paginate_queryset(tours)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        else:
+            response = Response({'results': self.get_serializer(tours, many=True).data})
+        response.data['facets'] = cached_tour_facets(params)
+        return response
+
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        return self.conditional_response(self._availability, request, etag_models=(Tour,))
+
+    def _availability(self, request):
+        tours = Tour.objects.filter(is_active=True).values(
+            'tour_id', 'name', 'start_date', 'price', 'max_participants', 'seats_taken'
+        ).annotate(seats_available=F('max_participants') - F('seats_taken'))
+        if request.query_params.get('available') in ('1', 'true'):
+            tours = tours.filter(seats_taken__lt=F('max_participants'))
+
+        page = self.paginate_queryset(tours)
+        if page is not None:
+            return self.get_paginated_response(TourAvailabilitySerializer(page, many=True).data)
+        return Response(TourAvailabilitySerializer(tours, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        return self.conditional_response(
+            self._similar, request, pk=pk, etag_models=(TourSimilarity, Tour)
+        )
+
+    def _similar(self, request, pk=None):
+        query = RecommendationQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        tour = get_object_or_404(Tour.objects.only('pk'), pk=pk)
+        scored = TourSimilarity.objects.filter(tour=tour, other__is_active=True).order_by(
+            '-score', 'other_id'
+        ).values_list('other_id', 'score')[:query.validated_data['limit']]
+        return Response(recommended_tours(scored))
+
+    @action(detail=True, methods=['get'])
+    def itinerary(self, request, pk=None):
+        return self.conditional_response(
+            self._itinerary, request, pk=pk, etag_models=self.itinerary_models
+        )
+
+    def _itinerary(self, request, pk=None):
+        tour = get_object_or_404(Tour.objects.prefetch_related(
+            Prefetch(
+                'tourhotel_set',
+                queryset=TourHotel.objects.select_related('hotel__city')
+                .order_by('check_in_date', 'tour_hotel_id')
+            ),
+            Prefetch(
+                'tourexcursion_set',
+                queryset=TourExcursion.objects.select_related('excursion__location', 'guide__city')
+                .order_by('schedule_datetime', 'tour_excursion_id')
+            ),
+            Prefetch(
+                'tourtransport_set',
+                queryset=TourTransport.objects.select_related('company', 'departure_city', 'arrival_city')
+                .order_by('departure_datetime', 'tour_transport_id')
+            ),
+            Prefetch(
+                'tourregion_set',
+                queryset=TourRegion.objects.select_related('region').order_by('id')
+            ),
+            Prefetch(
+                'tourfestival_set',
+                queryset=TourFestival.objects.select_related('festival')
+                .order_by('festival__date_start', 'id')
+            ),
+        ), pk=pk)
+        return Response(TourItinerarySerializer(tour).data)
+
+
+class BookingViewSet(BulkWriteMixin, SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
-
-
-class VisaTypeViewSet(viewsets.ModelViewSet):
+    ordering_fields = ('booking_date',)
+
+    def perform_create(self, serializer):
+        with seat_errors():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with seat_errors():
+            serializer.save()
+
+    def before_bulk_write(self, created, updated):
+        before = {
+            pk: (client_id, tour_id, status, total_price)
+            for pk, client_id, tour_id, status, total_price in Booking.objects.select_for_update().filter(
+                pk__in=[booking.pk for booking in updated]
+            ).values_list('pk', 'client_id', 'tour_id', 'status', 'total_price')
+        }
+        changes = [
+            (before.get(booking.pk), (booking.client_id, booking.tour_id, booking.status, booking.total_price))
+            for booking in created + updated
+        ]
+        deltas = seat_deltas([(old and old[1:3], new[1:3]) for old, new in changes])
+        with seat_errors():
+            apply_seat_deltas(Tour, deltas)
+        apply_occupancy_deltas(HotelOccupancy, booking_deltas(TourHotel, deltas))
+        apply_pair_deltas(CoTraveller, pair_deltas(Booking, [(old and old[:3], new[:3]) for old, new in changes]))
+        apply_stat_deltas(TourStats, booking_stat_deltas([(old and old[1:], new[1:]) for old, new in changes]))
+        # summaries need the booking dates, set on write
+        self._summary_clients = {
+            client_id for old, new in changes for client_id in (old and old[0], new[0]) if client_id is not None
+        }
+
+    def after_bulk_write(self, created, updated):
+        refresh_summaries(ClientSummary, Booking, Review, self._summary_clients)
+
+
+class VisaTypeViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = VisaType.objects.all()
     serializer_class = VisaTypeSerializer
 
 
-class VisaViewSet(viewsets.ModelViewSet):
+class VisaViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Visa.objects.all()
     serializer_class = VisaSerializer
 
 
-class ChinaRegionViewSet(viewsets.ModelViewSet):
+class ChinaRegionViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = ChinaRegion.objects.all()
     serializer_class = ChinaRegionSerializer
 
 
-class ChinaCityViewSet(viewsets.ModelViewSet):
+class ChinaCityViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = ChinaCity.objects.all()
     serializer_class = ChinaCitySerializer
 
 
-class HotelViewSet(viewsets.ModelViewSet):
+class HotelViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Hotel.objects.all()
     serializer_class = HotelSerializer
 
 
-class ExcursionViewSet(viewsets.ModelViewSet):
+class ExcursionViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Excursion.objects.all()
     serializer_class = ExcursionSerializer
 
 
-class ChineseGuideViewSet(viewsets.ModelViewSet):
+class ChineseGuideViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = ChineseGuide.objects.all()
     serializer_class = ChineseGuideSerializer
 
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        return self.conditional_response(self._available, request, etag_models=SCHEDULE_MODELS)
+
+    def _available(self, request):
+        query = GuideAvailabilityQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        guides = guide_availability(params['city']).free_guides(
+            params['start'], params['end'], language=params.get('language')
+        )
+        return Response(AvailableGuideSerializer(guides, many=True).data)
 
-class FestivalViewSet(viewsets.ModelViewSet):
+
+class FestivalViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Festival.objects.all()
     serializer_class = FestivalSerializer
 
 
-class TransportProviderViewSet(viewsets.ModelViewSet):
+class TransportProviderViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = TransportProvider.objects.all()
     serializer_class = TransportProviderSerializer
 
 
-class InsuranceViewSet(viewsets.ModelViewSet):
+class InsuranceViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Insurance.objects.all()
     serializer_class = InsuranceSerializer
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
+    ordering_fields = ('review_date',)
 
 
-class TourAgencyViewSet(viewsets.ModelViewSet):
+class TourAgencyViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = TourAgency.objects.all()
     serializer_class = TourAgencySerializer
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(BulkWriteMixin, SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    ordering_fields = ('payment_date',)
 
 
-class BookingsVisaViewSet(viewsets.ModelViewSet):
+class BookingsVisaViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = BookingsVisa.objects.all()
     serializer_class = BookingsVisaSerializer
 
 
-class TourExcursionViewSet(viewsets.ModelViewSet):
+class TourExcursionViewSet(BulkWriteMixin, SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = TourExcursion.objects.all()
     serializer_class = TourExcursionSerializer
 
-
-class TourFestivalViewSet(viewsets.ModelViewSet):
+    def before_bulk_write(self, created, updated):
+        conflicts = find_conflicts(created + updated)
+        if conflicts:
+            raise ValidationError({'guide': [message for messages in conflicts.values() for message in messages]})
+        before = {
+            pk: (tour_id, included)
+            for pk, tour_id, included in TourExcursion.objects.select_for_update().filter(
+                pk__in=[item.pk for item in updated]
+            ).values_list('pk', 'tour_id', 'included_in_price')
+        }
+        apply_stat_deltas(TourStats, excursion_stat_deltas([
+            (before.get(item.pk), (item.tour_id, item.included_in_price)) for item in created + updated
+        ]))
+
+
+class TourFestivalViewSet(BulkWriteMixin, SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = TourFestival.objects.all()
     serializer_class = TourFestivalSerializer
 
 
-class TourHotelViewSet(viewsets.ModelViewSet):
+class TourHotelViewSet(BulkWriteMixin, SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = TourHotel.objects.all()
     serializer_class = TourHotelSerializer
 
+    def before_bulk_write(self, created, updated):
+        before = {
+            pk: (tour_id, hotel_id, check_in)
+            for pk, tour_id, hotel_id, check_in in TourHotel.objects.select_for_update().filter(
+                pk__in=[stay.pk for stay in updated]
+            ).values_list('pk', 'tour_id', 'hotel_id', 'check_in_date')
+        }
+        changes = [(None, (stay.tour_id, stay.hotel_id, stay.check_in_date)) for stay in created]
+        changes += [(before.get(stay.pk), (stay.tour_id, stay.hotel_id, stay.check_in_date)) for stay in updated]
+        apply_occupancy_deltas(HotelOccupancy, stay_deltas(Tour, changes))
+
 
-class TourRegionViewSet(viewsets.ModelViewSet):
+class TourRegionViewSet(BulkWriteMixin, SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = TourRegion.objects.all()
     serializer_class = TourRegionSerializer
 
 
-class TourToAgencyViewSet(viewsets.ModelViewSet):
+class TourToAgencyViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = TourToAgency.objects.all()
     serializer_class = TourToAgencySerializer
 
 
-class TourTransportViewSet(viewsets.ModelViewSet):
+class TourTransportViewSet(BulkWriteMixin, SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = TourTransport.objects.all()
     serializer_class = TourTransportSerializer
 
 
-class HotelOccupancyViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = HotelOccupancy.objects.all()
-    serializer_class = HotelOccupancySerializer
\ No newline at end of file
+class HotelOccupancyViewSet(SparseFieldsMixin, ConditionalGetMixin, FastListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    The hotel occupancy rollup, filtered with ``?hotel=``, ``?city=``,
+    ``?month_from=`` / ``?month_to=`` (YYYY-MM), ``?calendar_season=`` and
+    ``?min_bookings=``.
+    """
+    queryset = HotelOccupancy.objects.annotate(hotel_name=F('hotel__name'))
+    serializer_class = HotelOccupancySerializer
+    etag_models = (HotelOccupancy, Hotel)
+    ordering_fields = ('month', 'bookings')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        query = HotelOccupancyQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        if params.get('hotel'):
+            queryset = queryset.filter(hotel_id__in=params['hotel'])
+        if params.get('city'):
+            queryset = queryset.filter(hotel__city_id=params['city'])
+        if params.get('month_from'):
+            queryset = queryset.filter(month__gte=params['month_from'])
+        if params.get('month_to'):
+            queryset = queryset.filter(month__lte=params['month_to'])
+        if params.get('calendar_season'):
+            queryset = queryset.filter(calendar_season=params['calendar_season'])
+        if params.get('min_bookings'):
+            queryset = queryset.filter(bookings__gte=params['min_bookings'])
+        return queryset
+
+
+class SearchView(APIView):
+    """Ranked full-text search over tours, excursions, festivals and hotels."""
+    permission_classes = [AllowAny]
+
+    @cached_report(Tour, Excursion, Festival, Hotel)
+    def get(self, request):
+        query = SearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        # One extra row tells whether there is a next page.
+        results = fulltext.search(
+            params['q'], kinds=params.get('type'), limit=params['limit'] + 1, offset=params['offset']
+        )
+        next_url = None
+        if len(results) > params['limit']:
+            results = results[:params['limit']]
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'offset', params['offset'] + params['limit']
+            )
+        for result in results:
+            result['url'] = reverse(f'{result["type"]}-detail', args=[result['id']], request=request)
+        return Response({
+            'next': next_url,
+            'results': SearchResultSerializer(results, many=True).data,
+        })